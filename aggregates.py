@@ -0,0 +1,375 @@
+import bisect
+from collections import deque
+from datetime import date, timedelta
+from functools import cached_property
+import pandas as pd
+from schema import compact_float
+from utils.calculations import (
+    ACTIVITY_MULTIPLIERS, calculate_bmi, calculate_bmr, calculate_body_fat_percentage,
+    calculate_daily_calories_for_goal, calculate_ideal_weight_range, calculate_tdee, get_bmi_category
+)
+
+
+def _day(value):
+    """แปลงวันที่ (str/Timestamp/date) เป็น 'YYYY-MM-DD' (None ถ้าไม่มีวันที่หรืออ่านไม่ได้)"""
+    if pd.isna(value):
+        return None
+    day = str(value)[:10]
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return None
+    return day
+
+
+def _number(value, convert=float):
+    return 0.0 if pd.isna(value) else convert(value)
+
+
+ROLLUP_COLUMNS = ['date', 'calories_burned', 'duration_minutes', 'activity_count']
+
+# ช่วงเวลาที่รวมจาก rollup รายวันได้ -> pandas period
+ROLLUP_PERIODS = {'week': 'W', 'month': 'M'}
+
+
+class DailyRollup:
+    """แคลลอรี่ นาที และจำนวนกิจกรรมรวมรายวันของผู้ใช้หนึ่งคน
+
+    อัพเดตทีละกิจกรรม การรวมเป็นสัปดาห์/เดือนหรือวาดกราฟจึงใช้เวลาตามจำนวนวัน
+    ไม่ใช่จำนวนกิจกรรม กิจกรรมที่ไม่มีวันที่ (day=None) ไม่อยู่ในวันใดจึงถูกข้าม
+    """
+
+    def __init__(self):
+        self.days = {}  # day -> [calories, minutes, count]
+
+    def add(self, day, calories, minutes):
+        if day is None:
+            return
+        totals = self.days.setdefault(day, [0.0, 0.0, 0])
+        totals[0] += calories
+        totals[1] += minutes
+        totals[2] += 1
+
+    def remove(self, day, calories, minutes):
+        if day is None:
+            return
+        totals = self.days[day]
+        totals[2] -= 1
+        if totals[2]:
+            totals[0] -= calories
+            totals[1] -= minutes
+        else:
+            del self.days[day]
+
+    def calories(self, day):
+        totals = self.days.get(day)
+        return totals[0] if totals else 0.0
+
+    def frame(self, period='day'):
+        """DataFrame (date, calories_burned, duration_minutes, activity_count) เรียงตามวันที่
+
+        period='week'/'month' รวมเป็นรายสัปดาห์/รายเดือน (date คือวันแรกของช่วง)
+        """
+        data = pd.DataFrame(
+            [(day, *totals) for day, totals in sorted(self.days.items())],
+            columns=ROLLUP_COLUMNS
+        )
+        if period == 'day' or data.empty:
+            return data
+
+        periods = pd.to_datetime(data['date']).dt.to_period(ROLLUP_PERIODS[period])
+        grouped = data.drop(columns='date').groupby(periods.to_numpy()).sum()
+        return grouped.rename_axis('date').reset_index().assign(
+            date=lambda frame: [p.start_time.strftime('%Y-%m-%d') for p in frame['date']]
+        )[ROLLUP_COLUMNS]
+
+
+# ครึ่งชีวิต (วัน) ของ EWMA น้ำหนัก และจำนวนบันทึกล่าสุดที่ใช้ fit เส้นแนวโน้ม
+TREND_HALFLIFE_DAYS = 7
+TREND_WINDOW = 14
+# พลังงานโดยประมาณต่อน้ำหนักตัว 1 กก. (เท่ากับ calculate_daily_calories_for_goal)
+KCAL_PER_KG = 7700
+# ไม่คาดการณ์วันที่ไกลกว่านี้ (วัน)
+FORECAST_HORIZON_DAYS = 3 * 365
+
+
+class WeightTrend:
+    """แนวโน้มน้ำหนักของผู้ใช้หนึ่งคน: EWMA และเส้นตรงที่ fit กับบันทึกล่าสุด window รายการ
+
+    บันทึกที่ต่อท้ายตามลำดับวันที่อัพเดตใน O(1) (ผลรวมของ regression ใน sliding window)
+    บันทึกย้อนหลังทำให้คำนวณใหม่จากบันทึกทั้งหมดหนึ่งครั้ง
+    บันทึกในวันเดียวกันนับว่าห่างกันหนึ่งวันสำหรับ EWMA
+    """
+
+    def __init__(self, halflife=TREND_HALFLIFE_DAYS, window=TREND_WINDOW):
+        self.halflife = halflife
+        self.window = window
+        self.records = []   # (day, record_id, weight) เรียงตามวันที่
+        self.smoothed = []  # EWMA หลังบันทึกแต่ละรายการ
+        self._reset()
+
+    def _reset(self):
+        self.smoothed = []
+        self._origin = None
+        self._last_x = None
+        self._points = deque()
+        self._sums = [0.0, 0.0, 0.0, 0.0]  # x, y, x*x, x*y
+
+    def add(self, record_id, day, weight):
+        """เพิ่มบันทึก (ข้ามบันทึกที่ไม่มีวันที่, ValueError ถ้าวันที่ไม่ใช่ YYYY-MM-DD)"""
+        if day is None:
+            return
+        date.fromisoformat(day)
+        record = (day, record_id, float(weight))
+        if self.records and record[:2] < self.records[-1][:2]:
+            bisect.insort(self.records, record)
+            self._rebuild()
+        else:
+            self.records.append(record)
+            self._update(record)
+
+    def _rebuild(self):
+        self._reset()
+        for record in self.records:
+            self._update(record)
+
+    def _update(self, record):
+        day, _, weight = record
+        ordinal = date.fromisoformat(day).toordinal()
+        if self._origin is None:
+            self._origin = ordinal
+        x = ordinal - self._origin
+
+        if self.smoothed:
+            alpha = 1 - 0.5 ** (max(x - self._last_x, 1) / self.halflife)
+            self.smoothed.append(self.smoothed[-1] + alpha * (weight - self.smoothed[-1]))
+        else:
+            self.smoothed.append(weight)
+        self._last_x = x
+
+        self._points.append((x, weight))
+        self._add_point(x, weight, 1)
+        if len(self._points) > self.window:
+            self._add_point(*self._points.popleft(), -1)
+
+    def _add_point(self, x, y, sign):
+        sums = self._sums
+        sums[0] += sign * x
+        sums[1] += sign * y
+        sums[2] += sign * x * x
+        sums[3] += sign * x * y
+
+    @property
+    def ewma(self):
+        return self.smoothed[-1] if self.smoothed else None
+
+    @property
+    def last_day(self):
+        return self.records[-1][0] if self.records else None
+
+    def slope(self):
+        """ความชันของเส้นแนวโน้ม (กก./วัน) None ถ้าบันทึกยังไม่พอ"""
+        n = len(self._points)
+        sx, sy, sxx, sxy = self._sums
+        denominator = n * sxx - sx * sx
+        if n < 2 or denominator <= 0:
+            return None
+        return (n * sxy - sx * sy) / denominator
+
+    def frame(self):
+        """DataFrame (date, weight, trend) เรียงตามวันที่"""
+        return pd.DataFrame({
+            'date': [record[0] for record in self.records],
+            'weight': [record[2] for record in self.records],
+            'trend': self.smoothed
+        })
+
+
+def _goal_date(start, remaining, per_day):
+    """วันที่ถึงเป้าหมายเมื่อน้ำหนักเปลี่ยนวันละ per_day (None ถ้าไม่ได้มุ่งไปทางเป้าหมายหรือไกลเกินไป)"""
+    if not per_day or remaining * per_day <= 0:
+        return None
+    days = remaining / per_day
+    if days > FORECAST_HORIZON_DAYS:
+        return None
+    return (start + timedelta(days=round(days))).isoformat()
+
+
+# ชื่อคีย์ของ TDEE แต่ละระดับกิจกรรมที่หน้า calculator ใช้
+TDEE_KEYS = {
+    'sedentary': 'tdee_sedentary',
+    'lightly_active': 'tdee_light',
+    'moderately_active': 'tdee_moderate',
+    'very_active': 'tdee_very',
+    'extremely_active': 'tdee_extreme'
+}
+
+
+class CalculatorProfile:
+    """ค่าจากเครื่องคำนวณของผู้ใช้หนึ่งคน (BMI, BMR, TDEE, น้ำหนักที่เหมาะสม, ไขมัน)
+
+    ขึ้นกับน้ำหนัก ส่วนสูง และอายุเท่านั้น คำนวณครั้งแรกที่ถูกใช้แล้วเก็บไว้
+    """
+
+    def __init__(self, weight, height, age):
+        self.weight = weight
+        self.height = height
+        self.age = age
+
+    @cached_property
+    def metrics(self):
+        """รูปแบบเดียวกับ calculations ของหน้า calculator"""
+        bmi = calculate_bmi(self.weight, self.height)
+        bmr_male = calculate_bmr(self.weight, self.height, self.age, 'male')
+        metrics = {
+            'current_weight': self.weight,
+            'bmi': bmi,
+            'bmi_category': get_bmi_category(bmi),
+            'bmr_male': bmr_male,
+            'bmr_female': calculate_bmr(self.weight, self.height, self.age, 'female'),
+            'ideal_weight': calculate_ideal_weight_range(self.height),
+            'body_fat_male': calculate_body_fat_percentage(bmi, self.age, 'male'),
+            'body_fat_female': calculate_body_fat_percentage(bmi, self.age, 'female')
+        }
+        for level in ACTIVITY_MULTIPLIERS:
+            metrics[TDEE_KEYS[level]] = calculate_tdee(bmr_male, level)
+        return metrics
+
+
+class UserStats:
+    """สถิติสะสมของผู้ใช้หนึ่งคน อัพเดตทีละรายการเมื่อข้อมูลเปลี่ยน
+
+    เก็บ rollup รายวัน (DailyRollup) ไว้ด้วย เพื่อคำนวณผลรวม 7/30 วันล่าสุดและวาดกราฟ
+    ได้โดยไม่ต้องอ่านประวัติกิจกรรมทั้งหมด
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.activities = {}       # activity_id -> (day, calories, minutes)
+        self.daily = DailyRollup()
+        self.total_calories = 0.0
+        self.initial_weight = None  # (day, record_id, weight) ของบันทึกแรกสุด
+        self.weights = WeightTrend()
+        self._profile = None
+
+    @classmethod
+    def build(cls, user, activities, weight_history):
+        """สร้างจากข้อมูลดิบของผู้ใช้"""
+        stats = cls(user)
+        if 'duration_minutes' not in activities:
+            activities = activities.assign(duration_minutes=0)
+        columns = ['activity_id', 'date', 'calories_burned', 'duration_minutes']
+        for row in activities[columns].itertuples(index=False):
+            stats.add_activity(row.activity_id, row.date, row.calories_burned, row.duration_minutes)
+        for row in weight_history[['record_id', 'date', 'weight']].itertuples(index=False):
+            stats.add_weight(row.record_id, row.date, row.weight)
+        return stats
+
+    def add_activity(self, activity_id, activity_date, calories, minutes=0):
+        day = _day(activity_date)
+        # ค่าแคลลอรี่ผ่าน compact_float ให้เท่ากับที่อ่านจากคอลัมน์ float32 (สร้างใหม่ได้ผลเดิม)
+        calories, minutes = _number(calories, compact_float), _number(minutes)
+        self.activities[activity_id] = (day, calories, minutes)
+        self.daily.add(day, calories, minutes)
+        self.total_calories += calories
+
+    def remove_activity(self, activity_id):
+        day, calories, minutes = self.activities.pop(activity_id)
+        self.daily.remove(day, calories, minutes)
+        self.total_calories -= calories
+
+    def add_weight(self, record_id, record_date, weight):
+        record = (_day(record_date), record_id, compact_float(weight))
+        self._profile = None
+        if record[0] is None:
+            return  # ไม่มีวันที่ ไม่นับเป็นน้ำหนักเริ่มต้นและไม่อยู่ในแนวโน้ม
+        if self.initial_weight is None or record[:2] < self.initial_weight[:2]:
+            self.initial_weight = record
+        self.weights.add(record_id, record[0], record[2])
+
+    def update_user(self, changes):
+        self.user = self.user.copy()
+        for key, value in changes.items():
+            self.user[key] = value
+        self._profile = None
+
+    @property
+    def profile(self):
+        """CalculatorProfile ของผู้ใช้ (สร้างใหม่หลัง update_user หรือ add_weight)"""
+        if self._profile is None:
+            user = self.user
+            self._profile = CalculatorProfile(float(user['weight']), float(user['height']), float(user['age']))
+        return self._profile
+
+    def weight_forecast(self, rate=0.5, today=None):
+        """แนวโน้มน้ำหนักและวันที่คาดว่าจะถึงเป้าหมาย (None ถ้ายังไม่มีบันทึกน้ำหนัก)
+
+        trend_date: ถ้าน้ำหนักเปลี่ยนตามเส้นแนวโน้มของบันทึกล่าสุดต่อไป
+        plan_date: ถ้ากินตาม calculate_daily_calories_for_goal (rate กก./สัปดาห์) และเผาผลาญ
+        จากกิจกรรมเท่าค่าเฉลี่ย 30 วันล่าสุด
+        """
+        trend = self.weights
+        if trend.ewma is None:
+            return None
+        today = today or date.today()
+        target = float(self.user['target_weight'])
+        remaining = target - trend.ewma
+        goal = 'maintain' if abs(remaining) < 0.1 else ('lose' if remaining < 0 else 'gain')
+
+        slope = trend.slope()
+        trend_date = None
+        if goal != 'maintain':
+            trend_date = _goal_date(date.fromisoformat(trend.last_day), remaining, slope)
+            # บันทึกเก่าจนวันที่คาดการณ์ผ่านไปแล้ว แนวโน้มนี้ใช้ไม่ได้
+            if trend_date is not None and trend_date < today.isoformat():
+                trend_date = None
+        tdee = self.profile.metrics['tdee_sedentary']
+        intake = calculate_daily_calories_for_goal(tdee, goal, rate)
+        activity_calories = self.rolling_calories(30, today) / 30
+        balance = intake - tdee - activity_calories
+
+        return {
+            'ewma': round(trend.ewma, 2),
+            'slope_per_week': round(slope * 7, 3) if slope is not None else None,
+            'goal': goal,
+            'remaining': round(remaining, 2),
+            'trend_date': trend_date,
+            'daily_calories': intake,
+            'activity_calories_per_day': round(activity_calories, 2),
+            'plan_per_week': round(balance / KCAL_PER_KG * 7, 3),
+            'plan_date': _goal_date(today, remaining, balance / KCAL_PER_KG) if goal != 'maintain' else None
+        }
+
+    def rolling_calories(self, days, today=None):
+        """แคลลอรี่รวมในช่วง days วันล่าสุด (นับรวมวันนี้)"""
+        today = today or date.today()
+        return sum(self.daily.calories((today - timedelta(days=i)).isoformat()) for i in range(days))
+
+    def to_dict(self):
+        """รูปแบบเดียวกับ FitLogDB.get_user_stats"""
+        user = self.user
+        total_activities = len(self.activities)
+        stats = {
+            'user': user,
+            'total_activities': total_activities,
+            'total_calories_burned': self.total_calories,
+            'avg_daily_calories': self.total_calories / total_activities if total_activities else 0,
+            'calories_last_7_days': self.rolling_calories(7),
+            'calories_last_30_days': self.rolling_calories(30),
+            'initial_weight': self.initial_weight[2] if self.initial_weight is not None else float(user['weight']),
+            'current_weight': float(user['weight']),
+            'target_weight': float(user['target_weight']),
+            'weight_progress': 0
+        }
+
+        # คำนวณความคืบหน้าน้ำหนัก
+        if stats['current_weight'] and stats['target_weight']:
+            initial_weight = stats['initial_weight']
+            current_weight = stats['current_weight']
+            target_weight = stats['target_weight']
+
+            if initial_weight != target_weight:
+                progress = abs(current_weight - initial_weight) / abs(target_weight - initial_weight) * 100
+                stats['weight_progress'] = round(max(0, min(100, progress)), 2)
+
+        return stats
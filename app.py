@@ -1,21 +1,320 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+import time
+# เวลาเริ่ม import โมดูลนี้ สำหรับรายงานเวลา startup (ดู startup())
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, make_response, Response, stream_with_context, g, before_render_template, template_rendered
 from models import FitLogDB
-from utils.calculations import *
-import matplotlib
-matplotlib.use('Agg')  # ใช้ backend ที่ไม่ต้องการ GUI
-import matplotlib.pyplot as plt
-plt.rcParams['font.family'] = ['DejaVu Sans']  # ตั้งค่าฟอนต์
-import io
-import base64
+from storage import TABLES, WriteError, copy_tables, open_backend
+import metrics
+import click
+from utils.calculations import calculate_profile, estimate_calories_burned
+from utils import batch_calculations, exporter, importer
+from utils.chart_cache import ChartCache, data_version
+from utils.charts import ChartRenderer, rollup_series, weight_series, bucket_series
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-import matplotlib.dates as mdates
 
 app = Flask(__name__)
 app.secret_key = 'secret-key'  # เปลี่ยนเป็น secret key ของคุณ
+# server = render กราฟเป็น PNG, client = ส่ง JSON series ให้ browser วาดเอง
+app.config['CHART_MODE'] = os.environ.get('FITLOG_CHART_MODE', 'server')
+
+# สร้าง instance ของ database (ใช้ SQLite ได้โดยตั้ง FITLOG_DB=data/fit_log.db)
+db = FitLogDB(os.environ.get('FITLOG_DB', 'data/fit_log_data.xlsx'))
+
+# cache ของกราฟที่ render แล้ว (ขนาดสูงสุดตั้งได้ด้วย FITLOG_CHART_CACHE_MB)
+chart_cache = ChartCache(int(os.environ.get('FITLOG_CHART_CACHE_MB', 32)) * 1024 * 1024)
+
+# render กราฟใน process pool ได้โดยตั้ง FITLOG_CHART_PROCESSES (0 = render ใน thread ของ request)
+chart_renderer = ChartRenderer(int(os.environ.get('FITLOG_CHART_PROCESSES', 0)))
+
+# thread สำหรับดึงข้อมูลหลายอย่างพร้อมกันภายใน request เดียว และ render กราฟล่วงหน้า
+io_pool = ThreadPoolExecutor(int(os.environ.get('FITLOG_IO_THREADS', 8)), thread_name_prefix='fitlog-io')
+
+# จำนวนแถวต่อหน้าของตารางประวัติกิจกรรม/น้ำหนัก
+PAGE_SIZE = int(os.environ.get('FITLOG_PAGE_SIZE', 20))
+
+# ขั้นตอน warm-up ก่อนรับ request ตั้งด้วย FITLOG_WARMUP คั่นด้วย , (all = ทุกขั้นตอน, none = ไม่ warm-up)
+# ค่าเริ่มต้นข้ามการโหลด matplotlib เมื่อ browser วาดกราฟเอง (CHART_MODE=client)
+WARMUP_STEPS = ('sheets', 'templates', 'charts')
+app.config['WARMUP'] = os.environ.get(
+    'FITLOG_WARMUP', 'sheets,templates' if app.config['CHART_MODE'] == 'client' else 'all')
+
+# profile request ที่มี header X-Fitlog-Profile ได้เมื่อตั้ง FITLOG_PROFILE_DIR (ไฟล์ .prof จะอยู่ในโฟลเดอร์นี้)
+if os.environ.get('FITLOG_PROFILE_DIR'):
+    app.wsgi_app = metrics.ProfilerMiddleware(app.wsgi_app, os.environ['FITLOG_PROFILE_DIR'])
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """บันทึกเวลาและจำนวน request ต่อ route"""
+    endpoint = request.endpoint or 'unmatched'
+    if 'request_start' in g:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method)
+    metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_template(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        metrics.TEMPLATE_SECONDS.observe(time.perf_counter() - starts.pop(), template=template.name or 'string')
+
+@metrics.REGISTRY.collector
+def cache_metrics():
+    """สถิติ cache ของ sheet และของกราฟ ณ เวลาที่ถูกดึง"""
+    families = []
+    sheet_cache = db.cache_info()
+    if sheet_cache:
+        families += [
+            ('fitlog_sheet_cache_hits_total', 'counter', 'Sheet reads served from the in-process cache', [({}, sheet_cache['hits'])]),
+            ('fitlog_sheet_cache_misses_total', 'counter', 'Sheet reads that loaded from storage', [({}, sheet_cache['misses'])]),
+            ('fitlog_sheet_cache_hit_ratio', 'gauge', 'Share of sheet reads served from cache', [({}, sheet_cache['hit_rate'])]),
+            ('fitlog_journal_bytes', 'gauge', 'Size of the journal not yet merged into the workbook', [({}, sheet_cache['journal_bytes'])])
+        ]
+    charts = chart_cache.info()
+    lookups = charts['hits'] + charts['misses']
+    families += [
+        ('fitlog_chart_cache_hits_total', 'counter', 'Chart images served from cache', [({}, charts['hits'])]),
+        ('fitlog_chart_cache_misses_total', 'counter', 'Chart images that had to be rendered', [({}, charts['misses'])]),
+        ('fitlog_chart_cache_hit_ratio', 'gauge', 'Share of chart images served from cache',
+         [({}, round(charts['hits'] / lookups, 4) if lookups else 0)]),
+        ('fitlog_chart_cache_bytes', 'gauge', 'Bytes of chart images held in cache', [({}, charts['bytes'])])
+    ]
+    memory = db.memory_usage(cached_only=True)
+    families += [
+        ('fitlog_sheet_memory_bytes', 'gauge', 'Memory held by each cached sheet',
+         [({'table': table}, usage['bytes']) for table, usage in sorted(memory.items())])
+    ]
+    calculator = calculate_profile.cache_info()
+    families += [
+        ('fitlog_calculator_cache_hits_total', 'counter', 'Custom calculations served from cache', [({}, calculator.hits)]),
+        ('fitlog_calculator_cache_misses_total', 'counter', 'Custom calculations that had to be computed', [({}, calculator.misses)])
+    ]
+    return families
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """ตัววัดทั้งหมดในรูปแบบ Prometheus"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def warmup_steps(value):
+    """รายการขั้นตอน warm-up จากค่า FITLOG_WARMUP"""
+    value = value.strip().lower()
+    if value in ('', 'none', '0'):
+        return ()
+    if value == 'all':
+        return WARMUP_STEPS
+    steps = tuple(step.strip() for step in value.split(',') if step.strip())
+    unknown = [step for step in steps if step not in WARMUP_STEPS]
+    if unknown:
+        raise ValueError(f"unknown FITLOG_WARMUP step(s) {', '.join(unknown)}, expected {', '.join(WARMUP_STEPS)}")
+    return steps
+
+def preload_templates():
+    """compile ทุก template ล่วงหน้า (jinja เก็บ template ที่ compile แล้วไว้ใน cache)"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+WARMUP = {
+    'sheets': lambda: db.preload(),
+    'templates': preload_templates,
+    'charts': lambda: chart_renderer.preload()
+}
+
+def warmup(steps):
+    """รันขั้นตอน warm-up ตามลำดับ คืนค่า {ขั้นตอน: วินาที}
+
+    ขั้นตอนที่ล้มเหลวถูกบันทึกเป็น error แต่ไม่หยุด worker: request แรกจะโหลดส่วนนั้นเองตามปกติ
+    """
+    report = {}
+    for step in steps:
+        started = time.perf_counter()
+        try:
+            WARMUP[step]()
+        except Exception as e:
+            metrics.report_error('startup', f'Warm-up step {step} failed: {e}')
+        report[step] = time.perf_counter() - started
+    return report
+
+_startup_report = None
+
+def startup():
+    """warm-up ตาม FITLOG_WARMUP ก่อน worker รับ request แล้วรายงานเวลาของแต่ละช่วง (เรียกครั้งเดียวต่อ process)
+
+    เวลาอยู่ใน fitlog_startup_duration_seconds{phase=...} และใน log ของ app
+    คืนค่า {ช่วง: วินาที} โดยมี import (เวลา import app), ขั้นตอน warm-up และ total
+    """
+    global _startup_report
+    if _startup_report is None:
+        report = {'import': IMPORT_DONE - IMPORT_STARTED}
+        report.update(warmup(warmup_steps(app.config['WARMUP'])))
+        report['total'] = sum(report.values())
+        for phase, seconds in report.items():
+            metrics.STARTUP_SECONDS.set(round(seconds, 4), phase=phase)
+        app.logger.info('startup ready in %.3fs (%s)', report['total'],
+                        ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in report.items() if phase != 'total'))
+        _startup_report = report
+    return _startup_report
+
+@app.cli.command('warmup')
+def warmup_command():
+    """รัน warm-up แล้วแสดงเวลาของแต่ละช่วง (flask --app app warmup)"""
+    for phase, seconds in startup().items():
+        click.echo(f'{phase}: {seconds:.3f}s')
+
+@app.cli.command('compact')
+def compact_command():
+    """รวม journal ลง workbook (flask --app app compact)"""
+    if db.compact():
+        click.echo('compact สำเร็จ')
+    else:
+        click.echo('เกิดข้อผิดพลาดในการ compact')
+
+@app.cli.command('vacuum')
+def vacuum_command():
+    """ลบข้อมูลกำพร้าของผู้ใช้ที่ถูกลบ แล้วเขียนทุกตารางใหม่ (flask --app app vacuum)"""
+    removed = db.vacuum()
+    if removed is None:
+        click.echo('เกิดข้อผิดพลาดในการ vacuum')
+        return
+    for sheet, count in removed.items():
+        click.echo(f'{sheet}: ลบ {count} แถว')
+
+@app.cli.command('memory')
+def memory_command():
+    """หน่วยความจำของแต่ละ sheet และแต่ละคอลัมน์หลังโหลดตาม schema (flask --app app memory)"""
+    for sheet, usage in db.memory_usage().items():
+        click.echo(f"{sheet}: {usage['rows']} แถว {usage['bytes'] / 1024:.1f} KB")
+        for column, size in usage['columns'].items():
+            click.echo(f"  {column:<20} {size / 1024:>10.1f} KB  {usage['dtypes'][column]}")
+
+@app.cli.command('migrate-db')
+@click.option('--from', 'source', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='ไฟล์ฐานข้อมูลต้นทาง (.xlsx หรือ .db/.sqlite)')
+@click.option('--to', 'target', required=True, type=click.Path(dir_okay=False), help='ไฟล์ฐานข้อมูลปลายทาง')
+@click.option('--overwrite', is_flag=True, help='เขียนทับแม้ปลายทางมีข้อมูลอยู่แล้ว')
+def migrate_db_command(source, target, overwrite):
+    """คัดลอกทุกตารางไปอีกฐานข้อมูล (flask --app app migrate-db --from data/fit_log_data.xlsx --to data/fit_log.db)"""
+    if os.path.abspath(source) == os.path.abspath(target):
+        click.echo('ต้นทางและปลายทางต้องเป็นคนละไฟล์')
+        return
+    source_backend, target_backend = open_backend(source), open_backend(target)
+    if not overwrite and os.path.exists(target):
+        filled = [table for table in TABLES if not target_backend.read(table).empty]
+        if filled:
+            click.echo(f"ปลายทางมีข้อมูลอยู่แล้ว ({', '.join(filled)}) ใช้ --overwrite เพื่อเขียนทับ")
+            return
+    if not copy_tables(source_backend, target_backend):
+        click.echo('เกิดข้อผิดพลาดในการย้ายข้อมูล')
+        return
+    for table in TABLES:
+        click.echo(f'{table}: {len(target_backend.read(table))} แถว')
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(importer.IMPORT_KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-id', type=int, default=None, help='ผู้ใช้สำหรับแถวที่ไม่มี user_id')
+@click.option('--strict', is_flag=True, help='ไม่นำเข้าเลยถ้ามีแถวที่ไม่ถูกต้อง')
+def import_data_command(kind, path, user_id, strict):
+    """นำเข้ากิจกรรม/น้ำหนักจากไฟล์ CSV/JSON (flask --app app import-data activities file.csv)"""
+    with open(path, 'rb') as f:
+        result = import_records(kind, f, path, user_id, strict)
+    for row, message in result['errors']:
+        click.echo(f'แถว {row}: {message}')
+    click.echo(f"นำเข้า {result['imported']} รายการ")
+
+def import_records(kind, source, filename, default_user_id=None, strict=False):
+    """อ่าน ตรวจสอบ และบันทึกข้อมูลจากไฟล์ในการเขียนครั้งเดียว"""
+    try:
+        data = importer.read_records(source, filename)
+    except ValueError as e:
+        return {'imported': 0, 'ids': [], 'errors': [(0, str(e))]}
+
+    users = db.get_all_users()
+    user_weights = dict(zip(users['user_id'], users['weight'])) if not users.empty else {}
+    rows, errors = importer.prepare(kind, data, user_weights, default_user_id)
+    if strict and errors:
+        return {'imported': 0, 'ids': [], 'errors': errors}
+
+    if kind == 'activities':
+        ids = db.add_activities(rows)
+    else:
+        ids = db.add_weight_records(rows)
+    if ids is None:
+        return {'imported': 0, 'ids': [], 'errors': errors + [(0, 'เกิดข้อผิดพลาดในการบันทึกข้อมูล')]}
+    return {'imported': len(ids), 'ids': ids, 'errors': errors}
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_upload(kind):
+    """นำเข้ากิจกรรม/น้ำหนักจากไฟล์ที่อัพโหลด (field ชื่อ file)"""
+    if kind not in importer.IMPORT_KINDS:
+        abort(404)
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'กรุณาเลือกไฟล์'}), 400
+
+    default_user_id = request.form.get('user_id', type=int) or session.get('current_user_id')
+    strict = request.form.get('strict') in ('1', 'true', 'on')
+    result = import_records(kind, upload.stream, upload.filename, default_user_id, strict)
+    result['errors'] = [{'row': row, 'message': message} for row, message in result['errors']]
+    return jsonify(result), 200 if result['imported'] or not result['errors'] else 400
+
+# sheet ที่ export ได้
+EXPORT_SHEETS = {
+    'activities': 'Activities',
+    'weights': 'Weight_History',
+    'users': 'Users'
+}
+
+def export_response(fmt, chunks, filename):
+    """ส่งข้อมูลแบบ streaming ทีละชุด ไม่ต้องสร้างไฟล์ทั้งหมดในหน่วยความจำ"""
+    response = Response(stream_with_context(exporter.stream(fmt, chunks)), mimetype=exporter.EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
 
-# สร้าง instance ของ database
-db = FitLogDB()
+@app.route('/export/<int:user_id>/<kind>.<fmt>')
+def export_user(user_id, kind, fmt):
+    """export ประวัติของผู้ใช้ (activities / weights / stats) เป็น CSV หรือ NDJSON"""
+    if fmt not in exporter.EXPORT_FORMATS or kind not in ('activities', 'weights', 'stats'):
+        abort(404)
+    if db.get_user_by_id(user_id) is None:
+        abort(404)
+
+    if kind == 'stats':
+        chunks = exporter.stats_chunks(db, [user_id])
+    else:
+        chunks = db.iter_rows(EXPORT_SHEETS[kind], user_id)
+    return export_response(fmt, chunks, f'user_{user_id}_{kind}')
+
+@app.route('/export/all/<kind>.<fmt>')
+def export_all(kind, fmt):
+    """export ข้อมูลของผู้ใช้ทุกคน (activities / weights / users / stats)"""
+    if fmt not in exporter.EXPORT_FORMATS or kind not in ('activities', 'weights', 'users', 'stats'):
+        abort(404)
+
+    if kind == 'stats':
+        user_ids = (int(user_id) for chunk in db.iter_rows('Users') for user_id in chunk['user_id'])
+        chunks = exporter.stats_chunks(db, user_ids)
+    else:
+        chunks = db.iter_rows(EXPORT_SHEETS[kind])
+    return export_response(fmt, chunks, f'all_{kind}')
+
+@app.template_filter('day')
+def day_filter(value):
+    """วันที่ (ข้อความหรือ Timestamp) เป็น YYYY-MM-DD ('-' ถ้าไม่มีค่า)"""
+    if value is None or value == '' or pd.isna(value):
+        return '-'
+    return str(value)[:10]
 
 @app.route('/test')
 def test():
@@ -34,6 +333,19 @@ def index():
     
     return render_template('index.html', users=users, current_user=current_user_id, stats=stats)
 
+@app.route('/dashboard')
+def dashboard():
+    """ภาพรวมของผู้ใช้ทุกคน: leaderboard, การออกกำลังกายต่อเนื่อง, ความคืบหน้า, กลุ่ม BMI และแนวโน้มรายสัปดาห์"""
+    weeks = min(max(request.args.get('weeks', 12, type=int), 1), 104)
+    report = db.get_cohort_report(weeks=weeks)
+    # รายงานถูก cache ร่วมกันทุก request จึงแปลงเป็นรายการ dict ใหม่ (NaN -> None) ไม่แก้ของเดิม
+    tables = {
+        name: data.astype(object).where(data.notna(), None).to_dict('records')
+        for name, data in report.items() if isinstance(data, pd.DataFrame)
+    }
+    return render_template('dashboard.html', user_count=report['users'],
+                           current_user=session.get('current_user_id'), **tables)
+
 @app.route('/set_current_user/<int:user_id>')
 def set_current_user(user_id):
     """ตั้งค่าผู้ใช้ปัจจุบัน"""
@@ -63,12 +375,16 @@ def add_user():
     age = int(request.form.get('age'))
     target_weight = float(request.form.get('target_weight'))
     
-    if db.add_user(name, weight, height, age, target_weight):
-        # เพิ่มน้ำหนักเริ่มต้นลงในประวัติ
-        users = db.get_all_users()
-        new_user_id = users['user_id'].max()
-        db.add_weight_record(new_user_id, date.today().strftime('%Y-%m-%d'), weight, 'น้ำหนักเริ่มต้น')
-        
+    # เพิ่มผู้ใช้และน้ำหนักเริ่มต้นในการเขียนครั้งเดียว
+    try:
+        with db.batch():
+            new_user_id = db.add_user(name, weight, height, age, target_weight)
+            if new_user_id is not None:
+                db.add_weight_record(new_user_id, date.today().strftime('%Y-%m-%d'), weight, 'น้ำหนักเริ่มต้น')
+    except WriteError:
+        new_user_id = None
+
+    if new_user_id is not None:
         flash('เพิ่มผู้ใช้สำเร็จ!', 'success')
     else:
         flash('เกิดข้อผิดพลาดในการเพิ่มผู้ใช้', 'error')
@@ -84,7 +400,7 @@ def update_user(user_id):
     age = int(request.form.get('age')) if request.form.get('age') else None
     target_weight = float(request.form.get('target_weight')) if request.form.get('target_weight') else None
     
-    if db.update_user(user_id, name, weight, height, age, target_weight) is not None:
+    if db.update_user(user_id, name, weight, height, age, target_weight):
         flash('อัพเดตข้อมูลผู้ใช้สำเร็จ!', 'success')
     else:
         flash('เกิดข้อผิดพลาดในการอัพเดตข้อมูล', 'error')
@@ -104,6 +420,41 @@ def delete_user(user_id):
     
     return redirect(url_for('profile'))
 
+def fetch_all(*calls):
+    """เรียก (function, *args) หลายชุดพร้อมกันใน io_pool คืนค่าผลลัพธ์ตามลำดับ
+
+    ชุดแรกทำใน thread ของ request เอง exception ของชุดใดก็ตามจะถูกส่งต่อ
+    """
+    futures = [io_pool.submit(*call) for call in calls[1:]]
+    first, *rest = calls
+    return [first[0](*first[1:])] + [future.result() for future in futures]
+
+def listing_args():
+    """หน้าและช่วงวันที่จาก query string (?page=&start=&end=) วันที่ที่ไม่ถูกต้องจะถูกละไว้"""
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name, '')
+        try:
+            dates[name] = date.fromisoformat(value).isoformat()
+        except ValueError:
+            dates[name] = None
+    return max(request.args.get('page', 1, type=int), 1), dates['start'], dates['end']
+
+def paginate(total, page, start=None, end=None):
+    """ข้อมูลการแบ่งหน้าสำหรับ template"""
+    pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    page = min(page, pages)
+    return {
+        'page': page, 'pages': pages, 'total': total,
+        'offset': (page - 1) * PAGE_SIZE, 'start': start, 'end': end
+    }
+
+def to_records(data):
+    """แปลงแถวเป็นรายการ dict ให้ template (วันที่เป็น YYYY-MM-DD)"""
+    if data.empty:
+        return []
+    return data.assign(date=pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d')).to_dict('records')
+
 @app.route('/activity')
 def activity():
     """หน้าบันทึกกิจกรรม"""
@@ -112,11 +463,16 @@ def activity():
         flash('กรุณาเลือกผู้ใช้ก่อน', 'warning')
         return redirect(url_for('profile'))
     
-    # ดึงกิจกรรมล่าสุด
-    activities = db.get_user_activities(current_user_id)
-    user = db.get_user_by_id(current_user_id)
+    # ดึงกิจกรรมล่าสุดเฉพาะหน้าที่แสดง
+    page, start, end = listing_args()
+    total, user = fetch_all(
+        (db.count_user_activities, current_user_id, start, end),
+        (db.get_user_by_id, current_user_id)
+    )
+    pagination = paginate(total, page, start, end)
+    activities = db.get_user_activities(current_user_id, start, end, limit=PAGE_SIZE, offset=pagination['offset'])
     
-    return render_template('activity.html', activities=activities, user=user, today = date.today().strftime('%Y-%m-%d'))
+    return render_template('activity.html', activities=to_records(activities), pagination=pagination, user=user, today = date.today().strftime('%Y-%m-%d'))
 
 @app.route('/add_activity', methods=['POST'])
 def add_activity():
@@ -138,7 +494,11 @@ def add_activity():
     else:
         user = db.get_user_by_id(current_user_id)
         current_weight = db.get_latest_weight(current_user_id) or user['weight']
-        calories = estimate_calories_burned(activity_name.lower().replace(' ', '_'), duration, current_weight)
+        try:
+            calories = estimate_calories_burned(activity_name, duration, current_weight)
+        except KeyError:
+            flash(f'ไม่รู้จักกิจกรรม "{activity_name}" กรุณากรอกแคลอรี่เอง', 'error')
+            return redirect(url_for('activity'))
     
     if db.add_activity(current_user_id, activity_date, activity_name, details, calories, duration):
         flash('บันทึกกิจกรรมสำเร็จ!', 'success')
@@ -166,10 +526,14 @@ def status():
         return redirect(url_for('profile'))
     
     stats = db.get_user_stats(current_user_id)
-    activities = db.get_user_activities(current_user_id)
     
-    # สร้างกราฟแคลลอรี่รายวัน
-    activity_chart = create_activity_chart(activities)
+    # กราฟแคลลอรี่รายวันโหลดแยก (/chart/... หรือ /api/series/... ตาม CHART_MODE)
+    activity_chart = None
+    if stats and stats['total_activities']:
+        activity_chart = chart_url('activity', current_user_id)
+        # เริ่ม render กราฟระหว่างที่ browser โหลดหน้า request ของรูปจะได้จาก cache
+        if app.config['CHART_MODE'] != 'client':
+            io_pool.submit(warm_chart, 'activity', current_user_id)
     
     return render_template('status.html', stats=stats, chart=activity_chart)
 
@@ -181,16 +545,30 @@ def weight():
         flash('กรุณาเลือกผู้ใช้ก่อน', 'warning')
         return redirect(url_for('profile'))
     
-    weight_history = db.get_weight_history(current_user_id)
-
-    user = db.get_user_by_id(current_user_id)
-    
-    # สร้างกราฟน้ำหนัก
+    # ประวัติน้ำหนักเฉพาะหน้าที่แสดง (ใหม่สุดก่อน)
+    page, start, end = listing_args()
+    total, first_record, user, trend = fetch_all(
+        (db.count_weight_history, current_user_id, start, end),
+        (db.get_weight_history, current_user_id, None, None, 1),
+        (db.get_user_by_id, current_user_id),
+        (db.get_weight_trend, current_user_id)
+    )
+    pagination = paginate(total, page, start, end)
+    weight_history = db.get_weight_history(
+        current_user_id, start, end, limit=PAGE_SIZE, offset=pagination['offset'], ascending=False
+    )
+    initial_weight = float(first_record['weight'].iloc[0]) if not first_record.empty else None
+    context = dict(
+        weight_history=to_records(weight_history), pagination=pagination, initial_weight=initial_weight, user=user,
+        trend=trend
+    )
+    
+    # กราฟน้ำหนักโหลดแยก (/chart/... หรือ /api/series/... ตาม CHART_MODE)
     if user is not None:
-        weight_chart = create_weight_chart(current_user_id, weight_history, user['target_weight'])
-        return render_template('weight.html', weight_history=weight_history, user=user, chart=weight_chart)
+        weight_chart = chart_url('weight', current_user_id) if initial_weight is not None else None
+        return render_template('weight.html', chart=weight_chart, **context)
     
-    return render_template('weight.html', weight_history=weight_history, user=user)
+    return render_template('weight.html', **context)
 
 @app.route('/add_weight', methods=['POST'])
 def add_weight():
@@ -204,9 +582,16 @@ def add_weight():
     weight_value = float(request.form.get('weight'))
     notes = request.form.get('notes', '')
     
-    if db.add_weight_record(current_user_id, weight_date, weight_value, notes):
-        # อัพเดตน้ำหนักปัจจุบันในโปรไฟล์
-        db.update_user(current_user_id, weight=weight_value)
+    try:
+        with db.batch():
+            added = db.add_weight_record(current_user_id, weight_date, weight_value, notes)
+            if added:
+                # อัพเดตน้ำหนักปัจจุบันในโปรไฟล์
+                db.update_user(current_user_id, weight=weight_value)
+    except WriteError:
+        added = False
+
+    if added:
         flash('บันทึกน้ำหนักสำเร็จ!', 'success')
     else:
         flash('เกิดข้อผิดพลาดในการบันทึกน้ำหนัก', 'error')
@@ -221,47 +606,26 @@ def calculator():
     calculations = {}
     
     if user is not None:
-        current_weight = user['weight']
-        
-        # คำนวณค่าต่างๆ
-        bmi = calculate_bmi(current_weight, user['height'])
-        bmi_category = get_bmi_category(bmi)
-        bmr_male = calculate_bmr(current_weight, user['height'], user['age'], 'male')
-        bmr_female = calculate_bmr(current_weight, user['height'], user['age'], 'female')
-        
-        calculations = {
-            'current_weight': current_weight,
-            'bmi': bmi,
-            'bmi_category': bmi_category,
-            'bmr_male': bmr_male,
-            'bmr_female': bmr_female,
-            'tdee_sedentary': calculate_tdee(bmr_male, 'sedentary'),
-            'tdee_light': calculate_tdee(bmr_male, 'lightly_active'),
-            'tdee_moderate': calculate_tdee(bmr_male, 'moderately_active'),
-            'tdee_very': calculate_tdee(bmr_male, 'very_active'),
-            'tdee_extreme': calculate_tdee(bmr_male, 'extremely_active'),
-            'ideal_weight': calculate_ideal_weight_range(user['height']),
-            'body_fat_male': calculate_body_fat_percentage(bmi, user['age'], 'male'),
-            'body_fat_female': calculate_body_fat_percentage(bmi, user['age'], 'female')
-        }
+        # คำนวณครั้งเดียวต่อข้อมูลผู้ใช้ชุดหนึ่ง แล้วใช้ซ้ำจนกว่าน้ำหนัก/ส่วนสูง/อายุจะเปลี่ยน
+        calculations = db.get_calculator_profile(current_user_id) or {}
     
     return render_template('calculator.html', user=user, calculations=calculations)
 
 @app.route('/calculate_custom', methods=['POST'])
 def calculate_custom():
     """คำนวณด้วยค่าที่กำหนดเอง"""
-    weight = float(request.form.get('weight'))
-    height = float(request.form.get('height'))
-    age = int(request.form.get('age'))
-    gender = request.form.get('gender', 'male')
-    activity_level = request.form.get('activity_level', 'sedentary')
-    
-    bmi = calculate_bmi(weight, height)
-    bmi_category = get_bmi_category(bmi)
-    bmr = calculate_bmr(weight, height, age, gender)
-    tdee = calculate_tdee(bmr, activity_level)
-    ideal_weight = calculate_ideal_weight_range(height, gender)
-    body_fat = calculate_body_fat_percentage(bmi, age, gender)
+    try:
+        weight = float(request.form.get('weight'))
+        height = float(request.form.get('height'))
+        age = int(request.form.get('age'))
+        gender = request.form.get('gender', 'male')
+        activity_level = request.form.get('activity_level', 'sedentary')
+        # ผลถูก cache ตามค่าที่กรอก (LRU) คำขอซ้ำจึงไม่ต้องคำนวณใหม่
+        profile = calculate_profile(weight, height, age, gender, activity_level)
+    except KeyError as e:
+        return jsonify({'error': f'ไม่รู้จักค่า {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
     calculations = {
         'weight': weight,
@@ -269,90 +633,126 @@ def calculate_custom():
         'age': age,
         'gender': gender,
         'activity_level': activity_level,
-        'bmi': bmi,
-        'bmi_category': bmi_category,
-        'bmr': bmr,
-        'tdee': tdee,
-        'ideal_weight': ideal_weight,
-        'body_fat': body_fat
+        **profile
     }
     
     return jsonify(calculations)
 
-def create_activity_chart(activities):
-    """สร้างกราฟแสดงแคลลอรี่ที่เผาผลาญรายวัน"""
-    if activities.empty:
-        return None
-    
-    # จัดกลุ่มตามวันที่
-    activities['date'] = pd.to_datetime(activities['date'])
-    daily_calories = activities.groupby('date')['calories_burned'].sum()
-    
-    # สร้างกราฟ
-    plt.figure(figsize=(12, 6))
-    plt.plot(daily_calories.index, daily_calories.values, marker='o', linewidth=2, markersize=6)
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('Calories (kcal)', fontsize=12)
-    plt.grid(True, alpha=0.3)
-    
-    if activities.size !=7:
-        ax = plt.gca()
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))  # รูปแบบวันที่
-        ax.xaxis.set_major_locator(mdates.DayLocator())  # บังคับให้แสดงทุกวัน
-        plt.xticks(rotation=45)
-    else:
-        plt.xticks(ticks=[daily_calories.index[0].strftime('%Y-%m-%d')], rotation=45)
-    plt.xticks(rotation=45)
-    
-    plt.tight_layout()
-    
-    # แปลงเป็น base64
-    img_buffer = io.BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=100, bbox_inches='tight')
-    img_buffer.seek(0)
-    chart_url = base64.b64encode(img_buffer.getvalue()).decode()
-    plt.close()
-    
-    return chart_url
+@app.route('/calculate_batch', methods=['POST'])
+def calculate_batch():
+    """คำนวณ BMI, BMR, TDEE, น้ำหนักที่เหมาะสม และไขมันสำหรับหลายคนในครั้งเดียว
+
+    รับ JSON เป็นรายการ {"people": [{"weight", "height", "age", "gender", "activity_level"}, ...]}
+    หรือแบบคอลัมน์ {"weight": [...], "height": [...], "age": [...], ...}
+    ถ้า weight, height หรือ age ของแถวใดว่างหรือไม่ใช่ตัวเลข จะตอบ 400 พร้อมลำดับแถว (row เริ่มที่ 0)
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'ต้องส่งข้อมูลเป็น JSON object'}), 400
 
-import matplotlib.dates as mdates
+    if 'people' in payload and isinstance(payload['people'], list) and not payload['people']:
+        return jsonify({'count': 0, 'results': []})
 
-def create_weight_chart(current_user_id, weight_history, target_weight):
-    if weight_history.empty:
-        return None
+    try:
+        people = pd.DataFrame(payload['people'] if 'people' in payload else payload)
+        missing = [column for column in batch_calculations.PROFILE_COLUMNS if column not in people]
+        if missing:
+            return jsonify({'error': f"ไม่มีคอลัมน์ {', '.join(missing)}"}), 400
+        # ค่าที่ว่างหรือไม่ใช่ตัวเลขจะกลายเป็น NaN ซึ่งไม่ใช่ JSON ที่ถูกต้องและทำให้จัดกลุ่ม BMI ผิด
+        invalid = batch_calculations.invalid_rows(people)
+        if invalid:
+            row, column = invalid[0]
+            return jsonify({'error': f'{column} ของแถวที่ {row} ต้องเป็นตัวเลข', 'row': row}), 400
+        results = batch_calculations.calculate_profiles(people)
+    except KeyError as e:
+        return jsonify({'error': f'ไม่รู้จักค่า {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
 
-    weight_history['date'] = pd.to_datetime(weight_history['date'])
+    return jsonify({'count': len(results), 'results': results.to_dict(orient='records')})
+
+def chart_source(kind, user_id):
+    """ข้อมูลสำหรับวาดกราฟ: (dates, values, target_weight, version)"""
+    target_weight = None
+    if kind == 'activity':
+        # แคลลอรี่รวมรายวันจาก rollup (ไม่ต้อง groupby กิจกรรมทั้งหมดทุกครั้ง)
+        data = db.get_daily_rollup(user_id)
+        if data is None:
+            abort(404)
+        dates, values = rollup_series(data)
+        version = data_version(data, ['date', 'calories_burned'])
+    elif kind == 'weight':
+        user = db.get_user_by_id(user_id)
+        if user is None:
+            abort(404)
+        target_weight = float(user['target_weight'])
+        data = db.get_weight_history(user_id)
+        dates, values = weight_series(data)
+        version = data_version(data, ['date', 'weight'], target_weight)
+    else:
+        abort(404)
 
-    plt.figure(figsize=(12, 6))
-    plt.plot(weight_history['date'], weight_history['weight'], marker='o', linewidth=2, markersize=6, label='current weight')
+    if data.empty:
+        abort(404)
+    return dates, values, target_weight, version
 
-    if target_weight:
-        plt.axhline(y=target_weight, color='r', linestyle='--', linewidth=2, label=f'target ({target_weight} kg)')
+def chart_url(kind, user_id):
+    """URL ของกราฟตามโหมด (server = รูป PNG, client = JSON series)"""
+    if app.config['CHART_MODE'] == 'client':
+        return url_for('chart_series', kind=kind, user_id=user_id)
+    return url_for('chart', kind=kind, user_id=user_id)
 
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('Weight (kg)', fontsize=12)
-    plt.grid(True, alpha=0.3)
-    plt.legend()
+def render_cached(kind, user_id, dates, values, target_weight, version):
+    """รูปกราฟจาก cache หรือ render ใหม่ (request ที่ขอกราฟเดียวกันพร้อมกันจะรอผลการ render เดียวกัน)"""
+    args = (dates, values) if kind == 'activity' else (dates, values, target_weight)
+    def render():
+        with metrics.CHART_SECONDS.time(kind=kind):
+            return chart_renderer.render(kind, *args)
+    return chart_cache.get_or_render((kind, user_id), version, render)
 
-    # Check have weight history 1 record and check date in not same data
-    if weight_history.size != 5 and weight_history['date'].nunique() != 1:
-        ax = plt.gca()
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))  # รูปแบบวันที่
-        ax.xaxis.set_major_locator(mdates.DayLocator())  # บังคับให้แสดงทุกวัน
-        plt.xticks(rotation=45)
+def warm_chart(kind, user_id):
+    """render กราฟลง cache ล่วงหน้า (ทำงานใน io_pool)"""
+    try:
+        render_cached(kind, user_id, *chart_source(kind, user_id))
+    except Exception as e:
+        # ไม่มีข้อมูล (404) หรือ render ไม่สำเร็จ: request ของรูปจะจัดการเอง
+        app.logger.debug('chart warm-up failed for %s/%s: %s', kind, user_id, e)
+
+@app.route('/chart/<kind>/<int:user_id>.png')
+def chart(kind, user_id):
+    """รูปกราฟ (ใช้ cache ตามเวอร์ชันข้อมูล และตอบ 304 ถ้า ETag ตรงกัน)"""
+    dates, values, target_weight, version = chart_source(kind, user_id)
+
+    if version in request.if_none_match:
+        response = make_response('', 304)
     else:
-        plt.xticks(ticks=[weight_history['date'][current_user_id-1].strftime('%Y-%m-%d')], rotation=45)
-        
-    plt.tight_layout()
+        image = render_cached(kind, user_id, dates, values, target_weight, version)
+        response = make_response(image)
+        response.mimetype = 'image/png'
+
+    response.set_etag(version)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/series/<kind>/<int:user_id>')
+def chart_series(kind, user_id):
+    """ข้อมูลกราฟแบบ JSON สำหรับวาดฝั่ง client (รวมเป็นวัน/สัปดาห์/เดือน ตามช่วงเวลา)"""
+    dates, values, target_weight, version = chart_source(kind, user_id)
+    max_points = max(1, request.args.get('points', 120, type=int))
 
-    img_buffer = io.BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=100, bbox_inches='tight')
-    img_buffer.seek(0)
-    chart_url = base64.b64encode(img_buffer.getvalue()).decode()
-    plt.close()
+    series = bucket_series(dates, values, how='sum' if kind == 'activity' else 'mean', max_points=max_points)
+    series['kind'] = kind
+    series['target_weight'] = target_weight
 
-    return chart_url
+    response = jsonify(series)
+    response.set_etag(f'{version}-{max_points}')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
+IMPORT_DONE = time.perf_counter()
 
 if __name__ == '__main__':
+    startup()
     app.run(host='127.0.0.12', debug=True)
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""entry point สำหรับ ASGI server (ต้องติดตั้ง asgiref และ uvicorn)
+
+    uvicorn asgi:app --workers 4
+
+event loop ของ server รับการเชื่อมต่อ ส่วนแต่ละ request ของ Flask ทำงานใน thread
+ของ executor (asgiref.wsgi.WsgiToAsgi) การอ่านไฟล์และ render กราฟจึงไม่บล็อก event loop
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app, startup
+
+startup()
+
+app = WsgiToAsgi(flask_app)
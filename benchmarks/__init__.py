@@ -0,0 +1 @@
+"""benchmark harness for the data layer, charts and routes (see benchmarks/run.py)"""
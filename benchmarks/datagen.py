@@ -0,0 +1,90 @@
+"""synthetic fit-log databases of a given size"""
+import os
+import numpy as np
+import pandas as pd
+from storage import TABLES, SQLiteBackend
+from utils.activity_catalog import CATALOG
+
+# the largest number of data rows one xlsx sheet can hold
+XLSX_MAX_ROWS = 1048575
+
+SIZES = {
+    'small': {'users': 10, 'activities_per_user': 50, 'weights_per_user': 20},
+    'medium': {'users': 1000, 'activities_per_user': 100, 'weights_per_user': 20},
+    'large': {'users': 100000, 'activities_per_user': 10, 'weights_per_user': 5},
+    'xlarge': {'users': 100000, 'activities_per_user': 30, 'weights_per_user': 10}
+}
+
+
+def generate(users, activities_per_user, weights_per_user, seed=0, days=365, end='2024-12-31'):
+    """{sheet name: DataFrame} with the columns of storage.TABLES"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=days).strftime('%Y-%m-%d').to_numpy()
+    created = '2024-01-01 00:00:00'
+
+    user_ids = np.arange(1, users + 1)
+    height = rng.normal(168, 9, users).round(1)
+    weight = rng.normal(70, 12, users).clip(40, 150).round(1)
+    tables = {'Users': pd.DataFrame({
+        'user_id': user_ids,
+        'name': [f'user{i}' for i in user_ids],
+        'weight': weight,
+        'height': height,
+        'age': rng.integers(18, 70, users),
+        'target_weight': (weight - rng.uniform(0, 8, users)).round(1),
+        'created_date': created,
+        'last_updated': created
+    })}
+
+    n = users * activities_per_user
+    names = np.array([activity.key.replace('_', ' ').title() for activity in CATALOG])
+    duration = rng.integers(10, 120, n)
+    tables['Activities'] = pd.DataFrame({
+        'activity_id': np.arange(1, n + 1),
+        'user_id': np.repeat(user_ids, activities_per_user),
+        'date': rng.choice(dates, n),
+        'activity_name': rng.choice(names, n),
+        'details': '',
+        'calories_burned': (duration * rng.uniform(3, 12, n)).round(1),
+        'duration_minutes': duration
+    })
+
+    n = users * weights_per_user
+    tables['Weight_History'] = pd.DataFrame({
+        'record_id': np.arange(1, n + 1),
+        'user_id': np.repeat(user_ids, weights_per_user),
+        'date': rng.choice(dates, n),
+        'weight': (np.repeat(weight, weights_per_user) + rng.normal(0, 1.5, n)).round(1),
+        'notes': ''
+    })
+    return tables
+
+
+def write(tables, path):
+    """write the tables as an xlsx workbook or a SQLite database (by extension)"""
+    if os.path.exists(path):
+        os.remove(path)
+    if path.endswith('.xlsx'):
+        too_big = [name for name, data in tables.items() if len(data) > XLSX_MAX_ROWS]
+        if too_big:
+            raise ValueError(f'{", ".join(too_big)} exceed the xlsx limit of {XLSX_MAX_ROWS} rows, use --backend sqlite')
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for name in TABLES:
+                tables[name].to_excel(writer, sheet_name=name, index=False)
+        return path
+
+    backend = SQLiteBackend(path)
+    for name in TABLES:
+        backend.write(name, tables[name])
+    return path
+
+
+def build(size, backend='xlsx', seed=0, directory=None):
+    """path of a database for a size preset, generated once and reused while the seed matches"""
+    directory = directory or os.path.join(os.path.dirname(__file__), 'data')
+    os.makedirs(directory, exist_ok=True)
+    extension = '.xlsx' if backend == 'xlsx' else '.db'
+    path = os.path.join(directory, f'{size}-seed{seed}{extension}')
+    if not os.path.exists(path):
+        write(generate(seed=seed, **SIZES[size]), path)
+    return path
@@ -0,0 +1,266 @@
+"""benchmark FitLogDB, chart rendering and routes on synthetic databases
+
+    python -m benchmarks.run --size small --size medium
+    python -m benchmarks.run --size large --backend sqlite --repeat 20
+    python -m benchmarks.run --size small --compare benchmarks/results/previous.json
+
+every operation is timed --repeat times against randomly chosen users (seeded, so runs
+are comparable) and reported as latency percentiles; peak memory is measured in a
+separate tracemalloc pass so it does not distort the timings. results are written as JSON
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datagen import SIZES, build
+from storage import TABLES, ExcelBackend, open_backend
+from models import FitLogDB
+from utils.charts import create_activity_chart, create_weight_chart
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples):
+    """latency summary in milliseconds"""
+    values = np.asarray(samples) * 1000
+    return {
+        'n': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'min_ms': round(float(values.min()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+def measure(operation, repeat, setup=None):
+    """time operation(*setup()) repeat times, then measure its peak memory once"""
+    setup = setup or (lambda: ())
+    samples = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        operation(*args)
+        samples.append(time.perf_counter() - start)
+
+    args = setup()
+    tracemalloc.start()
+    try:
+        operation(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return dict(percentiles(samples), peak_kb=round(peak / 1024, 1))
+
+
+class Workload:
+    """a working copy of a generated database and the operations to time against it"""
+
+    def __init__(self, source, seed):
+        self.directory = tempfile.mkdtemp(prefix='fitlog-bench-')
+        self.path = os.path.join(self.directory, os.path.basename(source))
+        shutil.copyfile(source, self.path)
+        self.rng = np.random.default_rng(seed)
+        self.db = FitLogDB(self.path)
+        self.user_count = len(self.db.get_all_users())
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def user(self):
+        return (int(self.rng.integers(1, self.user_count + 1)),)
+
+    def sheet_loads(self):
+        """uncached load of each sheet, from the xlsx and from the columnar mirror"""
+        operations = {}
+        for table in TABLES:
+            if self.path.endswith('.xlsx'):
+                operations[f'load:{table}:xlsx'] = (
+                    lambda table=table: ExcelBackend(self.path, mirror=False).read(table), None)
+                # warm the mirror once, then every fresh backend loads from it
+                open_backend(self.path).read(table)
+                operations[f'load:{table}:mirror'] = (lambda table=table: open_backend(self.path).read(table), None)
+            else:
+                operations[f'load:{table}:sqlite'] = (lambda table=table: open_backend(self.path).read(table), None)
+        return operations
+
+    def reads(self):
+        db = self.db
+        return {
+            'get_all_users': (db.get_all_users, None),
+            'get_user_by_id': (db.get_user_by_id, self.user),
+            'get_user_activities': (db.get_user_activities, self.user),
+            'get_user_activities:page': (lambda user_id: db.get_user_activities(user_id, limit=20), self.user),
+            'count_user_activities': (db.count_user_activities, self.user),
+            'get_weight_history': (db.get_weight_history, self.user),
+            'get_latest_weight': (db.get_latest_weight, self.user),
+            'get_user_stats': (db.get_user_stats, self.user),
+            'get_user_stats:cold': (lambda user_id: FitLogDB(self.path).get_user_stats(user_id), self.user),
+            'get_cohort_report': (db.get_cohort_report, None),
+            'get_cohort_report:cold': (lambda: FitLogDB(self.path).get_cohort_report(), None)
+        }
+
+    def writes(self):
+        db = self.db
+        return {
+            'add_activity': (lambda user_id: db.add_activity(user_id, '2024-12-31', 'Running', '', 300.0, 30), self.user),
+            'add_weight_record': (lambda user_id: db.add_weight_record(user_id, '2024-12-31', 70.0), self.user),
+            'update_user': (lambda user_id: db.update_user(user_id, weight=70.0), self.user),
+            'delete_activity': (db.delete_activity, lambda: (self._last_activity(),)),
+            'compact': (db.compact, None)
+        }
+
+    def _last_activity(self):
+        # add one so every delete has a row to remove
+        user_id, = self.user()
+        db = self.db
+        db.add_activity(user_id, '2024-12-31', 'Yoga', '', 100.0, 10)
+        return int(db.get_user_activities(user_id, limit=1)['activity_id'].iloc[0])
+
+    def charts(self):
+        db = self.db
+
+        def activities():
+            return (db.get_user_activities(self.user()[0]),)
+
+        def weights():
+            user_id, = self.user()
+            return db.get_weight_history(user_id), float(db.get_user_by_id(user_id)['target_weight'])
+
+        return {
+            'create_activity_chart': (create_activity_chart, activities),
+            'create_weight_chart': (create_weight_chart, weights)
+        }
+
+    def routes(self):
+        import app as web
+        web.db = self.db
+        web.chart_cache = web.ChartCache(web.chart_cache.max_bytes)
+        client = web.app.test_client()
+
+        def get(url):
+            def request(user_id):
+                with client.session_transaction() as session:
+                    session['current_user_id'] = user_id
+                response = client.get(url.format(user_id=user_id))
+                assert response.status_code in (200, 304, 404), (url, response.status_code)
+            return request
+
+        urls = ['/', '/status', '/activity', '/activity?page=2', '/weight',
+                '/chart/activity/{user_id}.png', '/chart/weight/{user_id}.png', '/api/series/activity/{user_id}',
+                '/dashboard']
+        return {f'GET {url}': (get(url), self.user) for url in urls}
+
+
+    def startup(self):
+        """cold start of a fresh interpreter: import app, then warm up with FITLOG_WARMUP"""
+        def start(warmup):
+            env = dict(os.environ, FITLOG_DB=self.path, FITLOG_WARMUP=warmup)
+            return lambda: subprocess.run([sys.executable, '-c', 'import app; app.startup()'],
+                                          cwd=ROOT, env=env, check=True)
+
+        return {f'startup:{warmup}': (start(warmup), None) for warmup in ('none', 'sheets,templates', 'all')}
+
+
+def run(sizes, backend, repeat, seed, groups):
+    results = []
+    for size in sizes:
+        started = time.perf_counter()
+        source = build(size, backend, seed)
+        print(f'[{size}] database ready in {time.perf_counter() - started:.1f}s: {source}', file=sys.stderr)
+
+        workload = Workload(source, seed)
+        try:
+            for group in groups:
+                for name, (operation, setup) in getattr(workload, group)().items():
+                    # loading whole sheets and rendering are slow, so they get fewer samples
+                    count = max(3, repeat // 5) if group in ('sheet_loads', 'charts', 'startup') or name.endswith(':cold') else repeat
+                    result = measure(operation, count, setup)
+                    results.append(dict(size=size, backend=backend, group=group, name=name, **result))
+                    print(f'[{size}] {name:<40} p50 {result["p50_ms"]:>10.3f} ms  p99 {result["p99_ms"]:>10.3f} ms',
+                          file=sys.stderr)
+        finally:
+            workload.close()
+    return results
+
+
+def metadata(sizes, backend, repeat, seed):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'backend': backend,
+        'repeat': repeat,
+        'seed': seed,
+        'sizes': {size: SIZES[size] for size in sizes}
+    }
+
+
+def compare(previous, current):
+    """p50 ratio (current / previous) for every operation present in both runs"""
+    before = {(r['size'], r['backend'], r['name']): r for r in previous['results']}
+    rows = []
+    for result in current['results']:
+        old = before.get((result['size'], result['backend'], result['name']))
+        if old and old['p50_ms']:
+            rows.append((result['size'], result['name'], old['p50_ms'], result['p50_ms'], result['p50_ms'] / old['p50_ms']))
+    return rows
+
+
+GROUPS = ('sheet_loads', 'reads', 'writes', 'charts', 'routes', 'startup')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', action='append', choices=list(SIZES), help='size preset (repeatable, default small)')
+    parser.add_argument('--backend', choices=['xlsx', 'sqlite'], default='xlsx')
+    parser.add_argument('--repeat', type=int, default=50, help='samples per operation')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--group', action='append', choices=GROUPS, help='operation group (repeatable, default all)')
+    parser.add_argument('--output', help='JSON file for the results (default benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='previous results JSON to compare p50 latencies against')
+    args = parser.parse_args(argv)
+
+    sizes = args.size or ['small']
+    report = {
+        'meta': metadata(sizes, args.backend, args.repeat, args.seed),
+        'results': run(sizes, args.backend, args.repeat, args.seed, args.group or GROUPS)
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'results written to {output}', file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        for size, name, old, new, ratio in compare(previous, report):
+            print(f'[{size}] {name:<40} {old:>10.3f} -> {new:>10.3f} ms  x{ratio:.2f}')
+
+
+if __name__ == '__main__':
+    main()
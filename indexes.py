@@ -0,0 +1,106 @@
+from bisect import bisect_left, bisect_right, insort
+import pandas as pd
+
+
+class UserIndex:
+    """index user_id -> แถวของผู้ใช้ เรียงตามคอลัมน์วันที่
+
+    เก็บแถวเป็น dict ตาม primary key และรายการ (วันที่, primary key) ที่เรียงไว้แล้ว
+    ต่อผู้ใช้ การค้นหาจึงใช้เวลาตามจำนวนแถวของผู้ใช้คนนั้นเท่านั้น
+    """
+
+    def __init__(self, key, user_column='user_id', sort_column=None):
+        self.key = key
+        self.user_column = user_column
+        self.sort_column = sort_column
+        self.rows = {}
+        self.by_user = {}
+
+    @classmethod
+    def build(cls, data, key, user_column='user_id', sort_column=None):
+        """สร้าง index จาก DataFrame ทั้งตาราง"""
+        index = cls(key, user_column, sort_column)
+        if not data.empty:
+            for row in data.to_dict('records'):
+                index.add(row)
+        return index
+
+    def _sort_key(self, row):
+        if self.sort_column is None:
+            return (0, row[self.key])
+        value = row.get(self.sort_column)
+        return ('' if pd.isna(value) else str(value), row[self.key])
+
+    def __contains__(self, user_id):
+        return user_id in self.by_user
+
+    def add(self, row):
+        """เพิ่มแถว (ข้ามถ้า primary key มีอยู่แล้ว)"""
+        pk = row[self.key]
+        if pk in self.rows:
+            return
+        self.rows[pk] = row
+        insort(self.by_user.setdefault(row[self.user_column], []), self._sort_key(row))
+
+    def remove(self, pk):
+        """ลบแถวตาม primary key"""
+        row = self.rows.pop(pk, None)
+        if row is None:
+            return
+        user_id = row[self.user_column]
+        entries = self.by_user[user_id]
+        entries.pop(bisect_left(entries, self._sort_key(row)))
+        if not entries:
+            del self.by_user[user_id]
+
+    def remove_user(self, user_id):
+        """ลบทุกแถวของผู้ใช้"""
+        for _, pk in self.by_user.pop(user_id, []):
+            del self.rows[pk]
+
+    def update(self, pk, changes):
+        """แก้ไขแถวตาม primary key"""
+        row = self.rows.get(pk)
+        if row is None:
+            return
+        self.remove(pk)
+        self.add(dict(row, **changes))
+
+    def apply(self, entry):
+        """นำ entry จาก journal มาใช้ คืนค่า False ถ้า index รองรับ entry นี้ไม่ได้"""
+        if entry['op'] == 'insert':
+            self.add(entry['row'])
+        elif entry['column'] == self.key:
+            if entry['op'] == 'delete':
+                self.remove(entry['value'])
+            else:
+                self.update(entry['value'], entry['changes'])
+        elif entry['column'] == self.user_column and entry['op'] == 'delete':
+            self.remove_user(entry['value'])
+        else:
+            return False
+        return True
+
+    def range(self, user_id, start_date=None, end_date=None, ascending=True, limit=None, offset=0):
+        """แถวของผู้ใช้ในช่วงวันที่ (รวมวันสุดท้าย) แบ่งหน้าด้วย limit/offset คืนค่า (rows, จำนวนทั้งหมดในช่วง)"""
+        entries = self.by_user.get(user_id, [])
+        low = bisect_left(entries, (start_date,)) if start_date else 0
+        high = bisect_right(entries, (end_date + '\uffff',)) if end_date else len(entries)
+        total = max(0, high - low)
+
+        if ascending:
+            first = low + offset
+            last = high if limit is None else min(high, first + limit)
+            selected = entries[first:last]
+        else:
+            last = high - offset
+            first = low if limit is None else max(low, last - limit)
+            selected = entries[first:max(first, last)][::-1]
+        return [self.rows[pk] for _, pk in selected], total
+
+    def get(self, user_id, ascending=True):
+        """แถวของผู้ใช้เรียงตามวันที่"""
+        entries = self.by_user.get(user_id, [])
+        if not ascending:
+            entries = reversed(entries)
+        return [self.rows[pk] for _, pk in entries]
@@ -0,0 +1,109 @@
+import json
+import os
+import pandas as pd
+from metrics import JOURNAL_APPEND_BYTES, JOURNAL_APPENDS
+from schema import align, assign
+
+
+class Journal:
+    """บันทึกการเปลี่ยนแปลง (insert/update/delete) แบบต่อท้ายไฟล์ JSON-lines
+
+    แต่ละบรรทัดคือหนึ่ง entry เช่น
+    {"op": "insert", "table": "Activities", "row": {...}}
+    {"op": "update", "table": "Users", "column": "user_id", "value": 1, "changes": {...}}
+    {"op": "delete", "table": "Activities", "column": "activity_id", "value": 3}
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def size(self):
+        """ขนาดไฟล์ journal (ไบต์)"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, *entries):
+        """เขียน entry ต่อท้าย journal ในการเขียนครั้งเดียว และ fsync ทันที"""
+        lines = ''.join(json.dumps(entry, ensure_ascii=False, default=_json_default) + '\n' for entry in entries)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        JOURNAL_APPENDS.inc()
+        JOURNAL_APPEND_BYTES.inc(len(lines.encode('utf-8')))
+
+    def read(self, offset=0):
+        """อ่าน entry ตั้งแต่ offset คืนค่า (entries, offset ใหม่)
+
+        บรรทัดสุดท้ายที่ยังเขียนไม่เสร็จ (ไม่มี newline) จะถูกข้ามไว้อ่านครั้งถัดไป
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except OSError:
+            return [], offset
+
+        end = chunk.rfind(b'\n') + 1
+        entries = [json.loads(line) for line in chunk[:end].decode('utf-8').splitlines() if line.strip()]
+        return entries, offset + end
+
+    def clear(self):
+        """ล้าง journal หลังจาก compact ลง workbook แล้ว"""
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+
+
+def apply_entries(data, entries, key):
+    """นำ entry ของตารางเดียวมาใช้กับ DataFrame ตามลำดับ
+
+    insert ที่ primary key มีอยู่แล้วจะถูกข้าม ทำให้ replay ซ้ำได้อย่างปลอดภัย
+    (เช่นกรณี compact เขียน workbook สำเร็จแต่ยังไม่ได้ล้าง journal)
+    """
+    pending = []
+    for entry in entries:
+        if entry['op'] == 'insert':
+            pending.append(entry['row'])
+            continue
+
+        data = _append_rows(data, pending, key)
+        pending = []
+        if data.empty:
+            continue
+
+        mask = data[entry['column']] == entry['value']
+        if entry['op'] == 'delete':
+            data = data[~mask]
+        elif entry['op'] == 'update' and mask.any():
+            data = data.copy()
+            for column, value in entry['changes'].items():
+                assign(data, mask, column, value)
+
+    return _append_rows(data, pending, key)
+
+
+def _append_rows(data, rows, key):
+    if not rows:
+        return data
+    if not data.empty and key in data:
+        existing = set(data[key].tolist())
+        rows = [row for row in rows if row.get(key) not in existing]
+        if not rows:
+            return data
+    new_rows = pd.DataFrame(rows)
+    if data.empty:
+        return new_rows.reindex(columns=data.columns.union(new_rows.columns, sort=False))
+    # แถวใหม่ได้ชนิดข้อมูลเดียวกับตาราง ตารางจึงไม่ต้องแปลงชนิดทั้งคอลัมน์ใหม่หลังทุก insert
+    data, new_rows = align(new_rows, data)
+    return pd.concat([data, new_rows], ignore_index=True)
+
+
+def _json_default(value):
+    """แปลงค่า numpy/pandas ให้ json เขียนได้"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
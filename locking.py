@@ -0,0 +1,82 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """lock ระหว่าง process (ผ่านไฟล์ lock) และระหว่าง thread ใน process เดียวกัน
+
+    ใช้ซ้อนกันใน thread เดียวกันได้ (re-entrant) ไฟล์ lock จะถูกเปิดใหม่ทุกครั้งที่ได้ lock
+    เพื่อไม่ให้ process ที่ fork ออกมาใช้ file descriptor ร่วมกัน
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = _lock_file(self.path)
+            except Exception:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_file(self._file)
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _lock_file(path):
+    f = open(path, 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK เลิกรอหลังประมาณ 10 วินาที
+                    continue
+    except Exception:
+        f.close()
+        raise
+    return f
+
+
+def _unlock_file(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+def lock_path(path):
+    """ไฟล์ lock ของไฟล์ข้อมูล เช่น data/fit_log_data.xlsx -> data/fit_log_data.lock"""
+    return os.path.splitext(path)[0] + '.lock'
@@ -0,0 +1,267 @@
+"""ตัววัดเวลาและตัวนับของแอป ส่งออกในรูปแบบ Prometheus text (ดู /metrics)"""
+import cProfile
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('fitlog')
+
+# ช่วงเวลา (วินาที) มาตรฐานของ Prometheus client
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """ค่าของตัววัดแยกตาม label"""
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, **extra):
+        return dict(zip(self.labelnames, key), **extra)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """จับเวลา block แล้วบันทึกลง histogram (บันทึกแม้เกิด exception)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry['buckets']):
+                    samples.append((self.name + '_bucket', self._labels(key, le=_number(bound)), count))
+                samples.append((self.name + '_bucket', self._labels(key, le='+Inf'), entry['count']))
+                samples.append((self.name + '_sum', self._labels(key), entry['sum']))
+                samples.append((self.name + '_count', self._labels(key), entry['count']))
+        return samples
+
+
+class Registry:
+    """รวมตัววัดทั้งหมด และ collector ที่คำนวณค่าตอนถูกดึง (เช่นสถิติ cache)"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """collect() คืนค่ารายการ (name, type, help, [(labels, value), ...])"""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        """ตัววัดทั้งหมดในรูปแบบ Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines += _header(metric.name, metric.type, metric.help)
+            lines += [_sample(name, labels, value) for name, labels, value in metric.samples()]
+        for collect in self.collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                report_error('metrics', f'Error collecting metrics: {e}')
+                continue
+            for name, type, help, samples in families:
+                lines += _header(name, type, help)
+                lines += [_sample(name, labels, value) for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _header(name, type, help):
+    return [f'# HELP {name} {_escape(help)}', f'# TYPE {name} {type}']
+
+
+def _sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        return f'{name}{{{label_text}}} {_number(value)}'
+    return f'{name} {_number(value)}'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'fitlog_request_duration_seconds', 'Time spent handling a request', ('endpoint', 'method'))
+REQUESTS = REGISTRY.counter(
+    'fitlog_requests_total', 'Requests handled', ('endpoint', 'method', 'status'))
+TEMPLATE_SECONDS = REGISTRY.histogram(
+    'fitlog_template_render_duration_seconds', 'Time spent rendering a template', ('template',))
+CHART_SECONDS = REGISTRY.histogram(
+    'fitlog_chart_render_duration_seconds', 'Time spent rendering a chart image', ('kind',))
+DB_SECONDS = REGISTRY.histogram(
+    'fitlog_db_call_duration_seconds', 'Time spent in FitLogDB methods', ('method',))
+SHEET_LOAD_SECONDS = REGISTRY.histogram(
+    'fitlog_sheet_load_duration_seconds', 'Time spent loading a sheet that was not cached', ('table', 'source'))
+SHEET_READS = REGISTRY.counter(
+    'fitlog_sheet_reads_total', 'Sheets loaded from storage', ('table', 'source'))
+SHEET_READ_BYTES = REGISTRY.counter(
+    'fitlog_sheet_read_bytes_total', 'Bytes of files parsed to load sheets', ('table', 'source'))
+SHEET_WRITES = REGISTRY.counter(
+    'fitlog_sheet_writes_total', 'Sheets written to storage', ('table',))
+WORKBOOK_WRITE_BYTES = REGISTRY.counter(
+    'fitlog_workbook_write_bytes_total', 'Bytes of workbook files written by compaction')
+COMPACT_SECONDS = REGISTRY.histogram(
+    'fitlog_compact_duration_seconds', 'Time spent merging the journal into the workbook')
+JOURNAL_APPENDS = REGISTRY.counter(
+    'fitlog_journal_appends_total', 'Writes appended to the journal')
+JOURNAL_APPEND_BYTES = REGISTRY.counter(
+    'fitlog_journal_append_bytes_total', 'Bytes appended to the journal')
+STARTUP_SECONDS = REGISTRY.gauge(
+    'fitlog_startup_duration_seconds', 'Time spent in each start-up phase of this process', ('phase',))
+ERRORS = REGISTRY.counter(
+    'fitlog_errors_total', 'Errors reported by component', ('component',))
+
+
+def report_error(component, message):
+    """บันทึก error ลง log และนับใน fitlog_errors_total"""
+    ERRORS.inc(component=component)
+    logger.error(message)
+
+
+def instrument(exclude=()):
+    """class decorator จับเวลาทุกเมธอด public ลง fitlog_db_call_duration_seconds{method=...}
+
+    exclude: เมธอดที่คืนค่า generator หรือ context manager ซึ่งจับเวลาตอนเรียกไม่ได้ความหมาย
+    """
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not callable(method):
+                continue
+            setattr(cls, name, _timed(method, name))
+        return cls
+    return decorate
+
+
+def _timed(method, name):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with DB_SECONDS.time(method=name):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class ProfilerMiddleware:
+    """WSGI middleware ที่ profile เฉพาะ request ที่มี header X-Fitlog-Profile
+
+    ผลของ cProfile ถูกเขียนเป็นไฟล์ .prof ใน profile_dir (เปิดด้วย pstats หรือ snakeviz)
+    และชื่อไฟล์ถูกส่งกลับใน header X-Fitlog-Profile-File
+    """
+
+    header = 'HTTP_X_FITLOG_PROFILE'
+
+    def __init__(self, wsgi_app, profile_dir):
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+
+    def __call__(self, environ, start_response):
+        if not environ.get(self.header):
+            return self.wsgi_app(environ, start_response)
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = re.sub(r'[^A-Za-z0-9]+', '.', environ.get('PATH_INFO', '/')).strip('.') or 'root'
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{environ.get('REQUEST_METHOD', 'GET')}.{path}.{time.time_ns() % 10**6}.prof"
+
+        def profiled_start_response(status, headers, exc_info=None):
+            headers.append(('X-Fitlog-Profile-File', filename))
+            return start_response(status, headers, exc_info)
+
+        def run():
+            # อ่าน body ทั้งหมดภายใน profiler เพื่อรวมเวลาของ response แบบ streaming ด้วย
+            result = self.wsgi_app(environ, profiled_start_response)
+            try:
+                return list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        profiler = cProfile.Profile()
+        body = profiler.runcall(run)
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
+        return body
@@ -0,0 +1,90 @@
+import glob
+import os
+import tempfile
+import pandas as pd
+from metrics import SHEET_READ_BYTES, SHEET_READS, report_error
+
+try:
+    import pyarrow  # noqa: F401  (ใช้ผ่าน pandas.to_feather / read_feather)
+    DEFAULT_FORMAT = 'feather'
+except ImportError:
+    DEFAULT_FORMAT = 'pickle'
+
+EXTENSIONS = {'feather': '.feather', 'pickle': '.pkl'}
+
+
+class SheetMirror:
+    """สำเนาแบบอ่านเร็วของแต่ละ sheet ใน workbook (Feather ถ้ามี pyarrow ไม่เช่นนั้นใช้ pickle)
+
+    ชื่อไฟล์มีลายเซ็น (mtime, size) ของ workbook ที่สำเนานี้ตรงกัน เช่น
+    Activities-1718000000000000000-52341.feather สำเนาที่ลายเซ็นไม่ตรงกับ workbook
+    ปัจจุบันจะไม่ถูกใช้ workbook ยังเป็นไฟล์หลักเสมอ ลบโฟลเดอร์นี้ทิ้งได้ทุกเมื่อ
+    """
+
+    def __init__(self, directory, format=None):
+        self.directory = directory
+        self.format = format or DEFAULT_FORMAT
+        self.extension = EXTENSIONS[self.format]
+
+    def _path(self, table, signature):
+        mtime, size = signature
+        return os.path.join(self.directory, f'{table}-{mtime}-{size}{self.extension}')
+
+    def load(self, table, signature):
+        """DataFrame ของ sheet ถ้ามีสำเนาที่ตรงกับ signature (None ถ้าไม่มีหรืออ่านไม่ได้)"""
+        if signature is None:
+            return None
+        path = self._path(table, signature)
+        try:
+            size = os.path.getsize(path)
+            data = pd.read_feather(path) if self.format == 'feather' else pd.read_pickle(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            report_error('mirror', f"Error reading mirror of {table}: {e}")
+            return None
+        SHEET_READS.inc(table=table, source='mirror')
+        SHEET_READ_BYTES.inc(size, table=table, source='mirror')
+        return data
+
+    def save(self, table, signature, data):
+        """เขียนสำเนาของ sheet (เขียนไฟล์ชั่วคราวแล้วแทนที่) และลบสำเนาเก่า"""
+        if signature is None:
+            return False
+        path = self._path(table, signature)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=f'.{table}-', suffix=self.extension, dir=self.directory)
+            os.close(fd)
+            try:
+                if self.format == 'feather':
+                    data.reset_index(drop=True).to_feather(temp_path)
+                else:
+                    data.to_pickle(temp_path)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except Exception as e:
+            report_error('mirror', f"Error writing mirror of {table}: {e}")
+            return False
+        self._remove_stale(table, path)
+        return True
+
+    def restamp(self, table, old_signature, new_signature):
+        """ใช้สำเนาเดิมกับ workbook ใหม่ (sheet นี้ไม่ได้ถูกเขียนทับ)"""
+        if old_signature is None or new_signature is None:
+            return False
+        try:
+            os.replace(self._path(table, old_signature), self._path(table, new_signature))
+        except OSError:
+            return False
+        return True
+
+    def _remove_stale(self, table, keep):
+        for path in glob.glob(os.path.join(self.directory, f'{table}-*{self.extension}')):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
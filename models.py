@@ -1,27 +1,94 @@
-import pandas as pd
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from storage import TABLES, open_backend
+from aggregates import UserStats
+from metrics import instrument
+from schema import compact_float, memory_usage
+from utils.analytics import cohort_report
 
+@instrument(exclude=('batch', 'iter_rows'))
 class FitLogDB:
-    def __init__(self, db_path='data/fit_log_data.xlsx'):
+    def __init__(self, db_path='data/fit_log_data.xlsx', backend=None):
         self.db_path = db_path
+        self.backend = backend if backend is not None else open_backend(db_path)
+        # สถิติสะสมรายผู้ใช้ ใช้ได้ตราบที่ backend.version() ยังเท่ากับ _stats_version
+        # ทุกการอ่าน/แก้ไข _stats ทำภายใต้ _stats_lock (ถ้าต้องถือ lock ของ backend ด้วยให้ถือ lock ของ backend ก่อน)
+        self._stats = {}
+        self._stats_version = None
+        self._stats_lock = threading.RLock()
+        # รายงานรวมทุกผู้ใช้ล่าสุด: ((version, วันที่, weeks, top), รายงาน)
+        self._cohort = None
+        self._cohort_lock = threading.Lock()
 
     def read_sheet(self, sheet_name):
         """อ่านข้อมูลจาก sheet"""
-        try:
-            return pd.read_excel(self.db_path, sheet_name=sheet_name)
-        except Exception as e:
-            print(f"Error reading {sheet_name}: {e}")
-            return pd.DataFrame()
+        return self.backend.read(sheet_name)
 
     def write_sheet(self, sheet_name, data):
         """เขียนข้อมูลลง sheet"""
-        try:
-            with pd.ExcelWriter(self.db_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                data.to_excel(writer, sheet_name=sheet_name, index=False)
-            return True
-        except Exception as e:
-            print(f"Error writing to {sheet_name}: {e}")
-            return False
+        return self.backend.write(sheet_name, data)
+
+    def cache_info(self):
+        """สถิติการใช้ cache ของ backend"""
+        return self.backend.cache_info()
+
+    def compact(self):
+        """รวม journal ที่ค้างอยู่ลงไฟล์ฐานข้อมูล"""
+        return self.backend.compact()
+
+    def memory_usage(self, cached_only=False):
+        """หน่วยความจำของแต่ละ sheet {sheet: {'rows', 'bytes', 'columns'}} (ดู schema.memory_usage)
+
+        sheet ที่ยังไม่อยู่ใน cache (หรือ backend ที่ไม่มี cache เช่น SQLite) จะถูกอ่านมาวัด
+        เว้นแต่ cached_only=True
+        """
+        usage = self.backend.memory_usage()
+        if not cached_only:
+            for table in TABLES:
+                if table not in usage:
+                    usage[table] = memory_usage(self.backend.read(table))
+        return usage
+
+    def preload(self):
+        """โหลดทุก sheet เข้า cache ล่วงหน้า (ใช้ตอน warm-up ก่อนรับ request) คืนค่าจำนวนแถวของแต่ละ sheet"""
+        return {table: len(self.backend.read(table)) for table in TABLES}
+
+    @contextmanager
+    def batch(self):
+        """รวมการเปลี่ยนแปลงหลายรายการเป็นการเขียนครั้งเดียว โดยถือ lock ของฐานข้อมูลไว้ตลอด block
+
+        ข้อมูลที่เขียนใน block จะอ่านเห็นหลังจบ block (ดู StorageBackend.batch)
+        ถ้าบันทึกไม่สำเร็จจะ raise storage.WriteError และล้างสถิติสะสมที่อัพเดตไประหว่าง block
+        """
+        with self.backend.locked():
+            version = self.backend.version()
+            try:
+                with self.backend.batch():
+                    yield self
+            except BaseException:
+                with self._stats_lock:
+                    self._stats.clear()
+                raise
+            # สถิติสะสมถูกอัพเดตไปแล้วระหว่าง batch จึงใช้ต่อกับ version ใหม่ได้
+            with self._stats_lock:
+                if version == self._stats_version:
+                    self._stats_version = self.backend.version()
+
+    def _update_stats(self, version_before, user_id, update=None):
+        """อัพเดตสถิติสะสมหลังเขียนข้อมูล (update=None คือลบสถิติของผู้ใช้ทิ้ง)
+
+        ถ้าข้อมูลถูกแก้ไขจากที่อื่น (เช่น worker อื่น) ก่อนการเขียนครั้งนี้ ให้ล้างสถิติทั้งหมด
+        เรียกภายใต้ lock ของ backend หลังเขียนเสร็จ
+        """
+        with self._stats_lock:
+            if version_before != self._stats_version:
+                self._stats.clear()
+            elif update is None:
+                self._stats.pop(user_id, None)
+            elif user_id in self._stats:
+                update(self._stats[user_id])
+            self._stats_version = self.backend.version()
 
     # User Management
     def get_all_users(self):
@@ -30,8 +97,7 @@ class FitLogDB:
 
     def get_user_by_id(self, user_id):
         """ดึงข้อมูลผู้ใช้โดย ID"""
-        users = self.read_sheet('Users')
-        user_data = users[users['user_id'] == user_id]
+        user_data = self.backend.select('Users', 'user_id', user_id)
         
         if user_data.empty :
             return None
@@ -39,16 +105,8 @@ class FitLogDB:
             return user_data.iloc[0]
 
     def add_user(self, name, weight, height, age, target_weight):
-        """เพิ่มผู้ใช้ใหม่"""
-        users = self.read_sheet('Users')
-        
-        # สร้าง user_id ใหม่
-        user_id = 1
-        if not users.empty :   
-            user_id = users['user_id'].max() + 1
-        
+        """เพิ่มผู้ใช้ใหม่ คืนค่า user_id ใหม่ (None ถ้าไม่สำเร็จ)"""
         new_user = {
-            'user_id': user_id,
             'name': name,
             'weight': weight,
             'height': height,
@@ -58,16 +116,11 @@ class FitLogDB:
             'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        users = pd.concat([users, pd.DataFrame([new_user])], ignore_index=True)
-        return self.write_sheet('Users', users)
+        # backend สร้าง user_id ใหม่ให้ภายใต้ lock จึงไม่ชนกับ worker อื่น
+        return self.backend.insert('Users', new_user)
 
     def update_user(self, user_id, name=None, weight=None, height=None, age=None, target_weight=None):
         """อัพเดตข้อมูลผู้ใช้"""
-        users = self.read_sheet('Users')
-        user = users['user_id'] == user_id
-        if user.empty:
-            return None
-
         update = {
             'name': name,
             'weight': weight,
@@ -75,31 +128,51 @@ class FitLogDB:
             'age': age,
             'target_weight': target_weight
         }
-        for key, value in update.items():
-            if value is not None:
-                users.loc[user, key] = value
-        users.loc[user, 'last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(users)
-        return self.write_sheet('Users', users)
+        changes = {key: value for key, value in update.items() if value is not None}
+        changes['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        with self.backend.locked():
+            version = self.backend.version()
+            if not self.backend.update('Users', 'user_id', user_id, changes):
+                return False
+            self._update_stats(version, user_id, lambda stats: stats.update_user(changes))
+            return True
 
     def delete_user(self, user_id):
-        """ลบผู้ใช้"""
-        users = self.read_sheet('Users')
-        users = users[users['user_id'] != user_id]
-        
-        self.delete_weight_history(user_id)
-        return self.write_sheet('Users', users)
+        """ลบผู้ใช้ พร้อมกิจกรรมและประวัติน้ำหนัก (ดู purge_user)"""
+        return self.purge_user(user_id)
+
+    def purge_user(self, user_id):
+        """ลบผู้ใช้และข้อมูลทุกตารางของผู้ใช้ (กิจกรรม ประวัติน้ำหนัก) ในการเขียนครั้งเดียว
+
+        ไม่เหลือแถวกำพร้าที่ query ต่อ ๆ ไปต้องอ่านผ่าน หรือที่ผู้ใช้ใหม่ซึ่งได้ id เดิมจะรับไป
+        """
+        deletions = [(table, 'user_id', user_id) for table in ('Activities', 'Weight_History', 'Users')]
+        with self.backend.locked():
+            version = self.backend.version()
+            if not self.backend.delete_many(deletions):
+                return False
+            self._update_stats(version, user_id)
+            return True
+
+    def vacuum(self):
+        """ลบกิจกรรมและประวัติน้ำหนักของผู้ใช้ที่ไม่มีอยู่แล้ว และเขียนทุกตารางใหม่ให้กระชับ
+
+        คืนค่า {sheet: จำนวนแถวที่ลบ} (None ถ้าไม่สำเร็จ)
+        """
+        with self.backend.locked():
+            version = self.backend.version()
+            removed = self.backend.vacuum()
+            # แถวที่ลบไม่ได้เป็นของผู้ใช้คนใด สถิติสะสมจึงยังใช้ได้
+            with self._stats_lock:
+                if removed is not None and version == self._stats_version:
+                    self._stats_version = self.backend.version()
+            return removed
 
     # Activity Management
     def add_activity(self, user_id, date, activity_name, details, calories_burned, duration_minutes=0):
         """เพิ่มกิจกรรม"""
-        activities = self.read_sheet('Activities')
-        activity_id = 1  
-        if not activities.empty :
-            activity_id = activities['activity_id'].max() + 1
-        
         new_activity = {
-            'activity_id': activity_id,
             'user_id': user_id,
             'date': date,
             'activity_name': activity_name,
@@ -108,47 +181,101 @@ class FitLogDB:
             'duration_minutes': duration_minutes
         }
         
-        activities = pd.concat([activities, pd.DataFrame([new_activity])], ignore_index=True)
-        return self.write_sheet('Activities', activities)
+        with self.backend.locked():
+            version = self.backend.version()
+            activity_id = self.backend.insert('Activities', new_activity)
+            if activity_id is None:
+                return False
+            self._update_stats(version, user_id, lambda stats: stats.add_activity(activity_id, date, calories_burned, duration_minutes))
+            return True
 
-    def get_user_activities(self, user_id):
-        """ดึงกิจกรรมของผู้ใช้"""
-        activities = self.read_sheet('Activities')
-        user_activities = activities[activities['user_id'] == user_id]
-        
-        return user_activities.sort_values('date', ascending=False)
+    def add_activities(self, activities):
+        """เพิ่มกิจกรรมหลายรายการในการเขียนครั้งเดียว คืนค่ารายการ activity_id (None ถ้าไม่สำเร็จ)
+
+        activities: รายการ dict ที่มี user_id, date, activity_name, details, calories_burned, duration_minutes
+        """
+        return self._insert_many('Activities', activities)
+
+    def get_user_activities(self, user_id, start_date=None, end_date=None, limit=None, offset=0):
+        """ดึงกิจกรรมของผู้ใช้ (ใหม่สุดก่อน) กรองช่วงวันที่ YYYY-MM-DD และแบ่งหน้าได้"""
+        if start_date is None and end_date is None and limit is None and not offset:
+            return self.backend.select('Activities', 'user_id', user_id, order_by='date', ascending=False)
+        activities, _ = self.backend.select_range(
+            'Activities', user_id, start_date, end_date, ascending=False, limit=limit, offset=offset
+        )
+        return activities
+
+    def count_user_activities(self, user_id, start_date=None, end_date=None):
+        """จำนวนกิจกรรมของผู้ใช้ในช่วงวันที่"""
+        _, total = self.backend.select_range('Activities', user_id, start_date, end_date, limit=0)
+        return total
 
     def delete_activity(self, activity_id):
         """ลบกิจกรรม"""
-        activities = self.read_sheet('Activities')
-        activities = activities[activities['activity_id'] != activity_id]
-        return self.write_sheet('Activities', activities)
+        with self.backend.locked():
+            version = self.backend.version()
+            if not self.backend.delete('Activities', 'activity_id', activity_id):
+                return False
+
+            with self._stats_lock:
+                owner = next((user_id for user_id, stats in self._stats.items() if activity_id in stats.activities), None)
+            self._update_stats(version, owner, lambda stats: stats.remove_activity(activity_id))
+            return True
 
     # Weight History Management
     def add_weight_record(self, user_id, date, weight, notes=''):
         """เพิ่มบันทึกน้ำหนัก"""
-        weight_history = self.read_sheet('Weight_History')
-        
-        record_id = 1 
-        if not weight_history.empty:
-            record_id = weight_history['record_id'].max() + 1
-        
         new_record = {
-            'record_id': record_id,
             'user_id': user_id,
             'date': date,
             'weight': weight,
             'notes': notes
         }
         
-        weight_history = pd.concat([weight_history, pd.DataFrame([new_record])], ignore_index=True)
-        return self.write_sheet('Weight_History', weight_history)
+        with self.backend.locked():
+            version = self.backend.version()
+            record_id = self.backend.insert('Weight_History', new_record)
+            if record_id is None:
+                return False
+            self._update_stats(version, user_id, lambda stats: stats.add_weight(record_id, date, weight))
+            return True
+
+    def add_weight_records(self, records):
+        """เพิ่มบันทึกน้ำหนักหลายรายการในการเขียนครั้งเดียว คืนค่ารายการ record_id (None ถ้าไม่สำเร็จ)
+
+        records: รายการ dict ที่มี user_id, date, weight, notes
+        """
+        return self._insert_many('Weight_History', records)
+
+    def _insert_many(self, table, rows):
+        if not rows:
+            return []
+
+        with self.backend.locked():
+            version = self.backend.version()
+            ids = self.backend.insert_many(table, rows)
+            if ids is None:
+                return None
+
+            # สถิติสะสมของผู้ใช้ที่ได้รับผลกระทบจะถูกสร้างใหม่เมื่ออ่านครั้งถัดไป
+            for user_id in {row['user_id'] for row in rows}:
+                self._update_stats(version, user_id)
+                version = self._stats_version
+            return ids
 
-    def get_weight_history(self, user_id):
-        """ดึงประวัติน้ำหนัก"""
-        weight_history = self.read_sheet('Weight_History')
-        user_weights = weight_history[weight_history['user_id'] == user_id]
-        return user_weights.sort_values('date', ascending=True)
+    def get_weight_history(self, user_id, start_date=None, end_date=None, limit=None, offset=0, ascending=True):
+        """ดึงประวัติน้ำหนัก กรองช่วงวันที่ YYYY-MM-DD และแบ่งหน้าได้"""
+        if start_date is None and end_date is None and limit is None and not offset:
+            return self.backend.select('Weight_History', 'user_id', user_id, order_by='date', ascending=ascending)
+        weight_history, _ = self.backend.select_range(
+            'Weight_History', user_id, start_date, end_date, ascending=ascending, limit=limit, offset=offset
+        )
+        return weight_history
+
+    def count_weight_history(self, user_id, start_date=None, end_date=None):
+        """จำนวนบันทึกน้ำหนักของผู้ใช้ในช่วงวันที่"""
+        _, total = self.backend.select_range('Weight_History', user_id, start_date, end_date, limit=0)
+        return total
 
     def get_latest_weight(self, user_id):
         """ดึงน้ำหนักล่าสุด"""
@@ -156,43 +283,102 @@ class FitLogDB:
         if weight_history.empty:
            return None 
         else:
-            return weight_history.iloc[-1]['weight']
+            return compact_float(weight_history.iloc[-1]['weight'])
 
     def delete_weight_history(self, user_id):
         """ลบประวัติน้ำหนัก"""
-        weight_history = self.read_sheet('Weight_History')
-        user_weights = weight_history[weight_history['user_id'] != user_id]
-        return self.write_sheet('Weight_History', user_weights)
+        with self.backend.locked():
+            version = self.backend.version()
+            if not self.backend.delete('Weight_History', 'user_id', user_id):
+                return False
+            self._update_stats(version, user_id)
+            return True
     
+    def iter_rows(self, sheet_name, user_id=None, chunksize=1000):
+        """อ่านข้อมูลทีละชุด (ของผู้ใช้คนเดียวถ้าระบุ user_id) สำหรับ export"""
+        if user_id is None:
+            return self.backend.iter_rows(sheet_name, chunksize=chunksize)
+        return self.backend.iter_rows(sheet_name, 'user_id', user_id, order_by='date', chunksize=chunksize)
+
     # Statistics and Analytics
     def get_user_stats(self, user_id):
-        """ดึงสถิติของผู้ใช้"""
-        user = self.get_user_by_id(user_id)
-        if user is None:
-            return None
-        
-        activities = self.get_user_activities(user_id)
-        weight_history = self.get_weight_history(user_id)
-        
-        stats = {
-            'user': user,
-            'total_activities': len(activities),
-            'total_calories_burned': activities['calories_burned'].sum() if not activities.empty else 0,
-            'avg_daily_calories': activities['calories_burned'].mean() if not activities.empty else 0,
-            'initial_weight': float(weight_history['weight'].iloc[0]) if not weight_history.empty else float(user['weight']),
-            'current_weight': float(user['weight']),
-            'target_weight': float(user['target_weight']),
-            'weight_progress': 0
-        }
-        
-        # คำนวณความคืบหน้าน้ำหนัก
-        if stats['current_weight'] and stats['target_weight']:
-            initial_weight = stats['initial_weight']
-            current_weight = stats['current_weight']
-            target_weight = stats['target_weight']
-            
-            if initial_weight != target_weight:
-                progress =  abs(current_weight - initial_weight) / abs(target_weight - initial_weight) * 100
-                stats['weight_progress'] = round(max(0, min(100, progress)), 2)
-        
-        return stats
\ No newline at end of file
+        """ดึงสถิติของผู้ใช้ (จากสถิติสะสม สร้างใหม่เมื่อยังไม่มีหรือข้อมูลถูกแก้ไขจากที่อื่น)"""
+        return self._user_stats(user_id, lambda stats: stats.to_dict())
+
+    def get_daily_rollup(self, user_id, period='day'):
+        """แคลลอรี่ นาที และจำนวนกิจกรรมรวมรายวัน (period='week'/'month' รวมเป็นรายสัปดาห์/รายเดือน)
+
+        อ่านจาก rollup ที่อัพเดตพร้อมสถิติสะสม จึงไม่ต้อง groupby กิจกรรมทั้งหมด
+        คืนค่า None ถ้าไม่พบผู้ใช้
+        """
+        return self._user_stats(user_id, lambda stats: stats.daily.frame(period))
+
+    def get_cohort_report(self, weeks=12, top=10):
+        """leaderboard, streak, ความคืบหน้าสู่เป้าหมาย, ค่าเฉลี่ยตามกลุ่ม BMI และแนวโน้มรายสัปดาห์ของทุกผู้ใช้
+
+        คำนวณจากทั้งสาม sheet ในรอบเดียว (ดู utils.analytics) และเก็บผลไว้จนกว่าข้อมูลจะเปลี่ยนหรือขึ้นวันใหม่
+        """
+        # request ที่ขอพร้อมกันคำนวณเพียงครั้งเดียว ที่เหลือรอผลเดียวกัน
+        with self._cohort_lock:
+            version = self.backend.version()
+            key = (version, date.today(), weeks, top)
+            cached = self._cohort
+            if version is not None and cached is not None and cached[0] == key:
+                return cached[1]
+
+            report = cohort_report(
+                self.backend.read('Users'), self.backend.read('Activities'), self.backend.read('Weight_History'),
+                today=key[1], weeks=weeks, top=top
+            )
+            self._cohort = (key, report)
+            return report
+
+    def get_weight_trend(self, user_id, rate=0.5):
+        """EWMA และเส้นแนวโน้มน้ำหนัก พร้อมวันที่คาดว่าจะถึงเป้าหมาย (ดู UserStats.weight_forecast)
+
+        อัพเดตทีละบันทึกพร้อมสถิติสะสม จึงไม่ต้อง fit ประวัติน้ำหนักทั้งหมดใหม่ทุกครั้ง
+        คืนค่า None ถ้าไม่พบผู้ใช้หรือยังไม่มีบันทึกน้ำหนัก
+        """
+        return self._user_stats(user_id, lambda stats: stats.weight_forecast(rate))
+
+    def get_calculator_profile(self, user_id):
+        """BMI, BMR, TDEE, น้ำหนักที่เหมาะสม และไขมันของผู้ใช้ (None ถ้าไม่พบผู้ใช้)
+
+        คำนวณครั้งแรกที่ถูกขอแล้วเก็บไว้กับสถิติสะสม จนกว่า update_user หรือ add_weight_record
+        จะเปลี่ยนข้อมูลผู้ใช้
+        """
+        return self._user_stats(user_id, lambda stats: dict(stats.profile.metrics))
+
+    def _user_stats(self, user_id, read):
+        """read(สถิติสะสมของผู้ใช้) ภายใต้ lock ของสถิติ (None ถ้าไม่พบผู้ใช้)
+
+        read ทำภายใต้ lock เพื่อไม่ให้อ่านระหว่างที่ writer กำลังแก้ไขสถิติเดียวกัน
+        """
+        with self._stats_lock:
+            stats = self._cached_stats(user_id)
+            if stats is not None:
+                return read(stats)
+
+        # สร้างใหม่ภายใต้ lock ของ backend: writer ถือ lock นี้ตั้งแต่เขียนจนอัพเดตสถิติเสร็จ
+        # สถิติที่สร้างจึงไม่รวมแถวที่ writer จะนำไปบวกเพิ่มซ้ำภายหลัง
+        with self.backend.locked():
+            with self._stats_lock:
+                stats = self._cached_stats(user_id)
+                version = self._stats_version
+            if stats is None:
+                user = self.get_user_by_id(user_id)
+                if user is None:
+                    return None
+                stats = UserStats.build(user, self.get_user_activities(user_id), self.get_weight_history(user_id))
+            with self._stats_lock:
+                if self._stats_version == version:
+                    stats = self._stats.setdefault(user_id, stats)
+                return read(stats)
+
+    def _cached_stats(self, user_id):
+        """สถิติสะสมใน cache ถ้ายังตรงกับ version ของ backend (เรียกภายใต้ _stats_lock)"""
+        version = self.backend.version()
+        if version is None or version != self._stats_version:
+            self._stats.clear()
+            self._stats_version = version
+        return self._stats.get(user_id)
@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+# ชนิดข้อมูลในหน่วยความจำของแต่ละคอลัมน์
+#   int32: id และจำนวนเต็ม (ถ้ามีค่าว่างจะเก็บเป็น float64 แทน)
+#   float32 / float64: ตัวเลขทศนิยม
+#   date / datetime: datetime64 (ในไฟล์เก็บเป็นข้อความตาม DATE_FORMATS)
+#   category: ข้อความที่ซ้ำกันมาก เก็บแต่ละค่าครั้งเดียว
+#   text: ข้อความทั่วไป (ไม่แปลง)
+# Users มีแถวละผู้ใช้จึงไม่ต้องบีบ ส่วนน้ำหนัก/ส่วนสูงที่แสดงตรง ๆ ในฟอร์มยังเป็น float64
+SCHEMA = {
+    'Users': {
+        'user_id': 'int32',
+        'name': 'text',
+        'weight': 'float64',
+        'height': 'float64',
+        'age': 'int32',
+        'target_weight': 'float64',
+        'created_date': 'datetime',
+        'last_updated': 'datetime'
+    },
+    'Activities': {
+        'activity_id': 'int32',
+        'user_id': 'int32',
+        'date': 'date',
+        'activity_name': 'category',
+        'details': 'category',
+        'calories_burned': 'float32',
+        'duration_minutes': 'int32'
+    },
+    'Weight_History': {
+        'record_id': 'int32',
+        'user_id': 'int32',
+        'date': 'date',
+        'weight': 'float32',
+        'notes': 'category'
+    }
+}
+
+# คอลัมน์ที่แถวใหม่ต้องมีค่า (นอกจาก *_id ที่ต้องมีเสมอ)
+# แถวเก่าที่ไม่มีวันที่ยังอ่านและเขียนทับทั้งตารางได้ แต่จะไม่ถูกเพิ่มเข้ามาใหม่
+REQUIRED_ON_INSERT = {
+    'Activities': ('date',),
+    'Weight_History': ('date',)
+}
+
+# รูปแบบวันที่ตอนเขียนลงไฟล์/ส่งออก (เหมือนข้อความที่แอปเขียนมาตลอด)
+DATE_FORMATS = {
+    'date': '%Y-%m-%d',
+    'datetime': '%Y-%m-%d %H:%M:%S'
+}
+
+_INT32 = np.iinfo(np.int32)
+
+# รูปแบบวันที่ตามชื่อคอลัมน์ (ชื่อเดียวกันมีความหมายเดียวกันทุก sheet)
+_COLUMN_FORMATS = {
+    column: DATE_FORMATS[kind]
+    for columns in SCHEMA.values() for column, kind in columns.items() if kind in DATE_FORMATS
+}
+
+
+class SchemaError(ValueError):
+    """ข้อมูลที่จะเขียนไม่ตรงกับ SCHEMA"""
+
+
+def _required(column):
+    # primary key และ user_id ต้องมีค่าเสมอ
+    return column.endswith('_id')
+
+
+def _parse_dates(values):
+    return pd.to_datetime(values, format='ISO8601', errors='coerce')
+
+
+def _matches(values, kind):
+    """คอลัมน์มีชนิดข้อมูลตาม kind อยู่แล้วหรือไม่"""
+    if kind == 'int32':
+        return values.dtype == np.int32
+    if kind in ('float32', 'float64'):
+        return values.dtype == kind
+    if kind in DATE_FORMATS:
+        return pd.api.types.is_datetime64_dtype(values.dtype)
+    if kind == 'category':
+        return isinstance(values.dtype, pd.CategoricalDtype)
+    return True
+
+
+def _convert(values, kind):
+    if kind == 'int32':
+        numbers = values if pd.api.types.is_integer_dtype(values.dtype) else pd.to_numeric(values, errors='coerce')
+        if numbers.isna().any() or numbers.min() < _INT32.min or numbers.max() > _INT32.max:
+            return numbers.astype('float64')
+        return numbers.astype('int32')
+    if kind in ('float32', 'float64'):
+        numbers = values if pd.api.types.is_numeric_dtype(values.dtype) else pd.to_numeric(values, errors='coerce')
+        return numbers.astype(kind)
+    if kind in DATE_FORMATS:
+        return _parse_dates(values)
+    if kind == 'category':
+        return values.astype('category')
+    return values
+
+
+def conform(table, data, compact=True):
+    """DataFrame ที่ทุกคอลัมน์ใน SCHEMA มีชนิดข้อมูลแบบกระชับ (คอลัมน์ที่ตรงอยู่แล้วไม่ถูกแปลงซ้ำ)
+
+    compact=False แปลงเฉพาะวันที่ ใช้กับผลลัพธ์รายผู้ใช้จาก index ซึ่งเล็กและอยู่ไม่นาน
+    (การบีบชนิดข้อมูลไม่ช่วยประหยัดหน่วยความจำแต่เสียเวลาทุก request)
+    ค่าที่แปลงไม่ได้ (เช่นวันที่ที่อ่านไม่ออก) จะกลายเป็นค่าว่าง
+    """
+    columns = SCHEMA.get(table, {})
+    changes = {
+        column: _convert(data[column], kind)
+        for column, kind in columns.items()
+        if column in data and (compact or kind in DATE_FORMATS) and not _matches(data[column], kind)
+    }
+    return data.assign(**changes) if changes else data
+
+
+def validate(table, data, insert=False):
+    """ตรวจข้อมูลก่อนเขียน raise SchemaError ถ้ามีคอลัมน์ที่ไม่รู้จัก, id ว่าง หรือค่าที่แปลงตามชนิดไม่ได้
+
+    insert=True ตรวจแถวใหม่: คอลัมน์ใน REQUIRED_ON_INSERT ต้องมีและไม่ว่าง
+    """
+    columns = SCHEMA[table]
+    required = REQUIRED_ON_INSERT.get(table, ()) if insert else ()
+    problems = [f'unknown column {column}' for column in data.columns if column not in columns]
+    problems += [f'{column} is missing' for column in required if column not in data.columns and len(data)]
+    for column in data.columns.intersection(list(columns)):
+        kind, values = columns[column], data[column]
+        present = values.notna()
+        if (_required(column) or column in required) and not present.all():
+            problems.append(f'{column} is missing')
+        if _matches(values, kind) or not present.any():
+            continue
+
+        if kind in DATE_FORMATS:
+            bad = present & _parse_dates(values).isna()
+        elif kind in ('int32', 'float32', 'float64'):
+            numbers = pd.to_numeric(values, errors='coerce')
+            bad = present & numbers.isna()
+            if kind == 'int32':
+                bad |= present & ~bad & ((numbers % 1 != 0) | (numbers < _INT32.min) | (numbers > _INT32.max))
+        else:
+            continue
+        if bad.any():
+            problems.append(f'invalid {column} {values[bad].tolist()[0]!r}')
+    if problems:
+        raise SchemaError(', '.join(problems))
+
+
+def plain(data):
+    """DataFrame สำหรับเขียนลงไฟล์หรือส่งออก: วันที่เป็นข้อความ, category เป็นข้อความ,
+    float32 เป็น float ที่สั้นที่สุด (70.1 ไม่ใช่ 70.0999984741211)
+    """
+    changes = {}
+    for column in data.columns:
+        values = data[column]
+        if pd.api.types.is_datetime64_dtype(values.dtype):
+            changes[column] = values.dt.strftime(_COLUMN_FORMATS.get(column, DATE_FORMATS['datetime']))
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            changes[column] = values.astype(object)
+        elif values.dtype == np.float32:
+            changes[column] = _shortest(values)
+    return data.assign(**changes) if changes else data
+
+
+def widen(data):
+    """DataFrame ที่คอลัมน์ float32 เป็น float64 ค่าสั้นที่สุดแบบเดียวกับ plain() (ชนิดอื่นคงเดิม)
+
+    ใช้กับแถวที่ส่งออกไปเป็นค่าเดี่ยว ๆ (เช่น index รายผู้ใช้) ให้ได้ 79.8 ไม่ใช่ 79.80000305175781
+    """
+    changes = {column: _shortest(data[column]) for column in data.columns if data[column].dtype == np.float32}
+    return data.assign(**changes) if changes else data
+
+
+def _shortest(values):
+    # แคลลอรี่/น้ำหนักซ้ำกันมาก จึงแปลงเป็นข้อความเฉพาะค่าที่ไม่ซ้ำ
+    uniques, inverse = np.unique(values.to_numpy(), return_inverse=True)
+    return pd.Series(uniques.astype(str).astype('float64')[inverse], index=values.index, name=values.name)
+
+
+def compact_float(value):
+    """ค่าเดียวกับที่อ่านกลับจากคอลัมน์ float32 ในรูป float ที่สั้นที่สุด
+
+    ใช้กับค่าที่รับเข้ามาตรง ๆ ให้ได้ผลเท่ากับค่าที่อ่านจาก sheet (เช่นสถิติสะสม)
+    """
+    return float(str(np.float32(value)))
+
+
+def typed_entry(table, entry):
+    """entry จาก journal ที่วันที่ในแถว/การแก้ไขเป็น Timestamp เหมือนแถวที่อ่านจาก sheet
+
+    index รายผู้ใช้จึงเรียงแถวจาก sheet และจาก journal ด้วยค่าชนิดเดียวกัน
+    """
+    columns = SCHEMA.get(table, {})
+    field = 'row' if entry['op'] == 'insert' else 'changes'
+    values = entry.get(field)
+    if not values:
+        return entry
+    dates = {
+        column: _timestamp(value) for column, value in values.items()
+        if columns.get(column) in DATE_FORMATS and isinstance(value, str)
+    }
+    return dict(entry, **{field: dict(values, **dates)}) if dates else entry
+
+
+def _timestamp(value):
+    try:
+        return pd.Timestamp(value)
+    except (ValueError, OverflowError):
+        return pd.NaT
+
+
+def assign(data, mask, column, value):
+    """data.loc[mask, column] = value ที่รักษาชนิดข้อมูลของคอลัมน์ (เพิ่ม category ใหม่, แปลงวันที่)
+
+    ค่าที่คอลัมน์รับไม่ได้ (เช่นข้อความในคอลัมน์ตัวเลขจาก journal เก่า) ทำให้คอลัมน์กลายเป็น object
+    """
+    values = data[column] if column in data else None
+    if values is not None and not pd.isna(value):
+        if isinstance(values.dtype, pd.CategoricalDtype) and value not in values.cat.categories:
+            data[column] = values.cat.add_categories([value])
+        elif pd.api.types.is_datetime64_dtype(values.dtype):
+            value = _parse_dates(pd.Series([value])).iloc[0]
+    try:
+        data.loc[mask, column] = value
+    except (TypeError, ValueError):
+        data[column] = data[column].astype(object)
+        data.loc[mask, column] = value
+
+
+def align(rows, data):
+    """แปลงแถวใหม่ (DataFrame) ให้ชนิดข้อมูลตรงกับ data เพื่อให้ pd.concat ไม่ย้อนกลับเป็น object
+
+    category ของ data จะถูกขยายให้รวมค่าใหม่ คืนค่า (data, rows)
+    """
+    changes = {}
+    for column in rows.columns.intersection(data.columns):
+        values, target = rows[column], data[column].dtype
+        try:
+            if isinstance(target, pd.CategoricalDtype):
+                new = pd.Index(values.dropna().unique()).difference(target.categories)
+                if len(new):
+                    data = data.assign(**{column: data[column].cat.add_categories(new)})
+                changes[column] = pd.Categorical(values, categories=data[column].cat.categories)
+            elif pd.api.types.is_datetime64_dtype(target):
+                changes[column] = _parse_dates(values).astype(target)
+            elif target == np.int32:
+                numbers = pd.to_numeric(values, errors='coerce')
+                if not numbers.isna().any() and (numbers % 1 == 0).all():
+                    changes[column] = numbers.astype('int32')
+            elif target in (np.float32, np.float64):
+                changes[column] = pd.to_numeric(values, errors='coerce').astype(target)
+        except (TypeError, ValueError):
+            # ค่าที่ปนกันหลายชนิด: ปล่อยให้ concat เลือกชนิดเอง แล้ว conform แปลงทั้งคอลัมน์ภายหลัง
+            continue
+    return data, rows.assign(**changes) if changes else rows
+
+
+def memory_usage(data):
+    """หน่วยความจำของ DataFrame: {'rows', 'bytes', 'columns': {คอลัมน์: ไบต์}, 'dtypes': {คอลัมน์: ชนิด}}
+
+    นับขนาดข้อความจริงด้วย (deep)
+    """
+    usage = data.memory_usage(deep=True, index=False)
+    return {
+        'rows': len(data),
+        'bytes': int(usage.sum()),
+        'columns': {column: int(size) for column, size in usage.items()},
+        'dtypes': {column: str(dtype) for column, dtype in data.dtypes.items()}
+    }
@@ -0,0 +1,46 @@
+// วาดกราฟฝั่ง client จาก JSON series (/api/series/<kind>/<user_id>)
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('canvas[data-series-url]').forEach(renderSeriesChart);
+});
+
+function renderSeriesChart(canvas) {
+    fetch(canvas.dataset.seriesUrl)
+        .then(response => response.json())
+        .then(series => {
+            const datasets = [{
+                label: canvas.dataset.label,
+                data: series.values,
+                borderColor: '#0d6efd',
+                backgroundColor: '#0d6efd',
+                borderWidth: 2,
+                pointRadius: series.values.length > 60 ? 0 : 3,
+                tension: 0.2
+            }];
+
+            if (series.target_weight) {
+                datasets.push({
+                    label: `target (${series.target_weight} kg)`,
+                    data: series.dates.map(() => series.target_weight),
+                    borderColor: '#dc3545',
+                    borderDash: [6, 6],
+                    borderWidth: 2,
+                    pointRadius: 0
+                });
+            }
+
+            new Chart(canvas, {
+                type: 'line',
+                data: { labels: series.dates, datasets: datasets },
+                options: {
+                    responsive: true,
+                    interaction: { mode: 'index', intersect: false },
+                    scales: {
+                        x: { ticks: { maxRotation: 45, minRotation: 45 } },
+                        y: { title: { display: true, text: canvas.dataset.label } }
+                    }
+                }
+            });
+        })
+        .catch(error => console.error('Error loading chart series:', error));
+}
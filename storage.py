@@ -0,0 +1,927 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing, contextmanager, nullcontext
+import pandas as pd
+from indexes import UserIndex
+from journal import Journal, apply_entries
+from locking import FileLock, lock_path
+from metrics import (
+    COMPACT_SECONDS, SHEET_LOAD_SECONDS, SHEET_READ_BYTES, SHEET_READS, SHEET_WRITES, WORKBOOK_WRITE_BYTES,
+    report_error
+)
+from mirror import SheetMirror
+from schema import SchemaError, assign, conform, memory_usage, plain, typed_entry, validate, widen
+
+# โครงสร้างตารางทั้งหมด: primary key และคอลัมน์ (ชนิดข้อมูลสำหรับ SQLite)
+TABLES = {
+    'Users': {
+        'key': 'user_id',
+        'columns': {
+            'user_id': 'INTEGER',
+            'name': 'TEXT',
+            'weight': 'REAL',
+            'height': 'REAL',
+            'age': 'INTEGER',
+            'target_weight': 'REAL',
+            'created_date': 'TEXT',
+            'last_updated': 'TEXT'
+        }
+    },
+    'Activities': {
+        'key': 'activity_id',
+        'columns': {
+            'activity_id': 'INTEGER',
+            'user_id': 'INTEGER',
+            'date': 'TEXT',
+            'activity_name': 'TEXT',
+            'details': 'TEXT',
+            'calories_burned': 'REAL',
+            'duration_minutes': 'INTEGER'
+        }
+    },
+    'Weight_History': {
+        'key': 'record_id',
+        'columns': {
+            'record_id': 'INTEGER',
+            'user_id': 'INTEGER',
+            'date': 'TEXT',
+            'weight': 'REAL',
+            'notes': 'TEXT'
+        }
+    }
+}
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+class WriteError(RuntimeError):
+    """การเปลี่ยนแปลงที่รวมไว้ใน batch เขียนลงที่เก็บไม่สำเร็จ (ไม่มีรายการใดถูกบันทึก)"""
+
+
+class StorageBackend:
+    """interface ของที่เก็บข้อมูล (อ่าน/เพิ่ม/แก้ไข/ลบ ต่อตาราง)
+
+    backend ใหม่ต้อง implement อย่างน้อย read และ write ส่วนเมธอดอื่น
+    มี implementation พื้นฐานที่ทำงานผ่าน read/write ทั้งตาราง
+    """
+
+    # FileLock ที่กันการเขียนพร้อมกันจากหลาย process (None = backend จัดการเอง)
+    lock = None
+
+    def locked(self):
+        """context ที่ถือ lock การเขียนไว้ เพื่อให้ อ่าน-แก้ไข-เขียน หลายขั้นตอนเป็นหนึ่งเดียว"""
+        return self.lock if self.lock is not None else nullcontext()
+
+    def batch(self):
+        """context ที่รวมการเปลี่ยนแปลงหลายรายการเป็นการเขียนครั้งเดียว (พื้นฐาน: แค่ถือ lock)"""
+        return self.locked()
+
+    def read(self, table):
+        """อ่านข้อมูลทั้งตาราง (ชนิดข้อมูลตาม schema.SCHEMA)"""
+        raise NotImplementedError
+
+    def write(self, table, data):
+        """เขียนทับข้อมูลทั้งตาราง"""
+        raise NotImplementedError
+
+    def _valid(self, table, data, insert=False):
+        """ตรวจแถว (DataFrame หรือรายการ dict) ตาม schema ก่อนเขียน รายงาน error และคืนค่า False ถ้าไม่ผ่าน
+
+        insert=True สำหรับแถวใหม่ (ต้องมีวันที่ ดู schema.REQUIRED_ON_INSERT)
+        """
+        try:
+            validate(table, data if isinstance(data, pd.DataFrame) else pd.DataFrame(data), insert=insert)
+        except SchemaError as e:
+            report_error('storage', f"Invalid data for {table}: {e}")
+            return False
+        return True
+
+    def select(self, table, column, value, order_by=None, ascending=True):
+        """ดึงแถวที่ column == value"""
+        data = self.read(table)
+        if data.empty:
+            return data
+        rows = data[data[column] == value]
+        if order_by is not None:
+            rows = rows.sort_values(order_by, ascending=ascending)
+        return rows
+
+    def select_range(self, table, user_id, start_date=None, end_date=None, ascending=True, limit=None, offset=0):
+        """แถวของผู้ใช้ในช่วงวันที่ เรียงตามวันที่ แบ่งหน้าด้วย limit/offset
+
+        คืนค่า (DataFrame, จำนวนแถวทั้งหมดในช่วงวันที่)
+        """
+        rows = self.select(table, 'user_id', user_id, order_by='date', ascending=ascending)
+        if not rows.empty and (start_date or end_date):
+            dates = rows['date'].astype(str)
+            if start_date:
+                rows = rows[dates >= start_date]
+                dates = dates[dates >= start_date]
+            if end_date:
+                rows = rows[dates.str[:10] <= end_date]
+        end = None if limit is None else offset + limit
+        return rows.iloc[offset:end], len(rows)
+
+    def iter_rows(self, table, column=None, value=None, order_by=None, chunksize=1000):
+        """อ่านข้อมูลเป็นชุดละ chunksize แถว (generator ของ DataFrame)"""
+        if column is None:
+            data = self.read(table)
+            if order_by is not None and not data.empty:
+                data = data.sort_values(order_by)
+        else:
+            data = self.select(table, column, value, order_by=order_by)
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start:start + chunksize]
+
+    def insert(self, table, row):
+        """เพิ่มแถวใหม่ สร้าง primary key ให้อัตโนมัติ คืนค่า id ใหม่ (None ถ้าไม่สำเร็จ)"""
+        if not self._valid(table, [row], insert=True):
+            return None
+        with self.locked():
+            key = TABLES[table]['key']
+            data = self.read(table)
+
+            new_id = 1
+            if not data.empty:
+                new_id = int(data[key].max()) + 1
+
+            row = dict(row, **{key: new_id})
+            data = pd.concat([data, pd.DataFrame([row])], ignore_index=True)
+            if self.write(table, data):
+                return new_id
+            return None
+
+    def insert_many(self, table, rows):
+        """เพิ่มหลายแถวในการเขียนครั้งเดียว คืนค่ารายการ id ใหม่ (None ถ้าไม่สำเร็จ)"""
+        if not self._valid(table, rows, insert=True):
+            return None
+        with self.locked():
+            key = TABLES[table]['key']
+            data = self.read(table)
+
+            first_id = 1
+            if not data.empty:
+                first_id = int(data[key].max()) + 1
+
+            ids = list(range(first_id, first_id + len(rows)))
+            rows = [dict(row, **{key: new_id}) for row, new_id in zip(rows, ids)]
+            data = pd.concat([data, pd.DataFrame(rows)], ignore_index=True)
+            if self.write(table, data):
+                return ids
+            return None
+
+    def update(self, table, column, value, changes):
+        """แก้ไขแถวที่ column == value"""
+        with self.locked():
+            data = self.read(table)
+            if data.empty:
+                return False
+            mask = data[column] == value
+            if not mask.any():
+                return False
+            data = data.copy()
+            for key, new_value in changes.items():
+                assign(data, mask, key, new_value)
+            return self.write(table, data)
+
+    def delete(self, table, column, value):
+        """ลบแถวที่ column == value"""
+        with self.locked():
+            data = self.read(table)
+            if data.empty:
+                return True
+            return self.write(table, data[data[column] != value])
+
+    def delete_many(self, deletions):
+        """ลบจากหลายตารางเป็นการเขียนครั้งเดียว deletions: [(table, column, value), ...]"""
+        with self.batch():
+            return all([self.delete(table, column, value) for table, column, value in deletions])
+
+    def vacuum(self):
+        """ลบแถวกำพร้า (user_id ที่ไม่มีใน Users) และเขียนตารางใหม่
+
+        คืนค่า {table: จำนวนแถวที่ลบ} (None ถ้าไม่สำเร็จ)
+        """
+        with self.locked():
+            sheets, removed = remove_orphans({table: self.read(table) for table in TABLES})
+            for table, data in sheets.items():
+                if removed.get(table) and not self.write(table, data):
+                    return None
+            return removed
+
+    def compact(self):
+        """รวมการเปลี่ยนแปลงที่ค้างอยู่ลงที่เก็บหลัก (backend ที่ไม่มี journal ไม่ต้องทำอะไร)"""
+        return True
+
+    def version(self):
+        """ค่าที่เปลี่ยนทุกครั้งที่ข้อมูลถูกแก้ไข (None = ไม่รองรับ)"""
+        return None
+
+    def cache_info(self):
+        """สถิติการใช้ cache (backend ที่ไม่มี cache คืนค่าว่าง)"""
+        return {}
+
+    def memory_usage(self):
+        """หน่วยความจำของ sheet ที่ backend เก็บไว้ {table: schema.memory_usage} (ไม่มี cache คืนค่าว่าง)"""
+        return {}
+
+
+class ExcelBackend(StorageBackend):
+    """เก็บข้อมูลในไฟล์ xlsx หนึ่ง sheet ต่อหนึ่งตาราง
+
+    การเพิ่ม/แก้ไข/ลบจะถูกเขียนต่อท้าย journal ทันที (ไม่ต้องเขียน workbook ใหม่ทั้งไฟล์)
+    การอ่านจะรวม workbook กับ journal และ compact() จะรวม journal ลง workbook
+    ซึ่งเกิดขึ้นอัตโนมัติใน thread เบื้องหลังเมื่อ journal ใหญ่เกิน compact_threshold ไบต์
+    (request ที่ทำให้ journal เกินขนาดจึงไม่ต้องรอเขียน workbook)
+
+    การเขียนทั้งหมด (สร้าง id, ต่อท้าย journal, compact) ทำภายใต้ lock ไฟล์ร่วมกัน
+    จึงใช้ไฟล์เดียวกันจากหลาย worker ได้ และ compact เขียน workbook ใหม่ลงไฟล์ชั่วคราว
+    ก่อนแทนที่ไฟล์เดิมด้วย os.replace ผู้อ่านจึงไม่เห็น workbook ที่เขียนไม่เสร็จ
+
+    ถ้า mirror=True แต่ละ sheet จะมีสำเนาแบบอ่านเร็ว (ดู SheetMirror) ในโฟลเดอร์
+    <ชื่อไฟล์>.mirror ซึ่งเขียนใหม่ทุกครั้งที่ compact การอ่านที่ไม่มีใน cache
+    จึงไม่ต้อง parse xlsx ด้วย openpyxl
+    """
+
+    def __init__(self, path, journal_path=None, compact_threshold=256 * 1024, mirror=True):
+        self.path = path
+        self.journal = Journal(journal_path or os.path.splitext(path)[0] + '.journal.jsonl')
+        self.compact_threshold = compact_threshold
+        self.lock = FileLock(lock_path(path))
+        self.mirror = SheetMirror(os.path.splitext(path)[0] + '.mirror') if mirror else None
+        # entry ที่รอเขียนระหว่าง batch() (None = ไม่ได้อยู่ใน batch)
+        self._queue = None
+        # cache ของแต่ละ sheet: {sheet_name: {'signature', 'offset', 'data', 'next_id'}}
+        # signature คือ (mtime, size) ของ workbook และ offset คือตำแหน่งใน journal ที่รวมแล้ว
+        self._sheet_cache = {}
+        # กันไม่ให้หลาย thread อัพเดต cache ของ sheet พร้อมกัน (เช่น entry จาก journal ถูกใช้ซ้ำหรือหาย)
+        self._cache_lock = threading.RLock()
+        # thread ที่กำลัง compact เบื้องหลัง (ครั้งละหนึ่ง thread)
+        self._compactor = None
+        self._compactor_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _file_signature(self):
+        """ลายเซ็นของไฟล์ (mtime, size) ใช้ตรวจว่าไฟล์ถูกแก้ไขหรือไม่"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def version(self):
+        """ข้อมูลเปลี่ยนเมื่อ workbook หรือ journal เปลี่ยน"""
+        return (self._file_signature(), self.journal.size())
+
+    def _read_workbook(self, table, signature):
+        """อ่าน sheet จากสำเนาอ่านเร็วถ้าตรงกับ signature ไม่เช่นนั้นอ่านจาก workbook แล้วสร้างสำเนา"""
+        if self.mirror is not None:
+            with SHEET_LOAD_SECONDS.time(table=table, source='mirror'):
+                data = self.mirror.load(table, signature)
+            if data is not None:
+                # สำเนาเก็บชนิดข้อมูลตาม schema ไว้แล้ว conform จึงไม่ต้องแปลงอะไร
+                return conform(table, data)
+        try:
+            with SHEET_LOAD_SECONDS.time(table=table, source='xlsx'):
+                data = conform(table, pd.read_excel(self.path, sheet_name=table))
+            SHEET_READS.inc(table=table, source='xlsx')
+            if signature is not None:
+                SHEET_READ_BYTES.inc(signature[1], table=table, source='xlsx')
+        except Exception as e:
+            report_error('storage', f"Error reading {table}: {e}")
+            return pd.DataFrame()
+        # ถ้า workbook ถูกแทนที่ระหว่างอ่าน ข้อมูลอาจไม่ตรงกับ signature จึงไม่สร้างสำเนา
+        if self.mirror is not None and signature is not None and signature == self._file_signature():
+            self.mirror.save(table, signature, data)
+        return data
+
+    def _view(self, table, count=True):
+        """ข้อมูลล่าสุดของ sheet (workbook + journal) จาก cache
+
+        entry ใหม่จาก journal จะถูกนำไปใช้กับ index ทันที ส่วน DataFrame
+        ทั้งตารางจะรวม entry ที่ค้าง (pending) เมื่อมีการอ่านทั้งตารางเท่านั้น
+        count=False ไม่นับเป็น cache hit/miss (ใช้กับการอ่านเพื่อรายงาน เช่น memory_usage)
+        """
+        with self._cache_lock:
+            signature = self._file_signature()
+            journal_size = self.journal.size()
+            view = self._sheet_cache.get(table)
+
+            if view is None or signature is None or view['signature'] != signature or journal_size < view['offset']:
+                self.cache_misses += count
+                view = {
+                    'signature': signature,
+                    'offset': 0,
+                    'data': self._read_workbook(table, signature),
+                    'pending': [],
+                    'next_id': None,
+                    'index': None
+                }
+                if signature is not None:
+                    self._sheet_cache[table] = view
+            else:
+                self.cache_hits += count
+
+            if journal_size > view['offset']:
+                entries, view['offset'] = self.journal.read(view['offset'])
+                entries = [typed_entry(table, entry) for entry in entries if entry['table'] == table]
+                if entries:
+                    key = TABLES[table]['key']
+                    view['pending'].extend(entries)
+                    if view['index'] is not None and not all(view['index'].apply(entry) for entry in entries):
+                        view['index'] = None
+                    if view['next_id'] is not None:
+                        inserted = [entry['row'][key] for entry in entries if entry['op'] == 'insert']
+                        view['next_id'] = max([view['next_id']] + [i + 1 for i in inserted])
+            return view
+
+    def _data(self, view, table):
+        """DataFrame ทั้งตารางหลังรวม entry ที่ค้างอยู่"""
+        with self._cache_lock:
+            if view['pending']:
+                view['data'] = conform(table, apply_entries(view['data'], view['pending'], TABLES[table]['key']))
+                view['pending'] = []
+            return view['data']
+
+    def _index(self, view, table):
+        """index รายผู้ใช้ของ sheet (สร้างเมื่อใช้ครั้งแรก)"""
+        with self._cache_lock:
+            if view['index'] is None:
+                columns = TABLES[table]['columns']
+                # แถวใน index ถูกส่งออกเป็นค่าเดี่ยว ๆ (DataFrame รายผู้ใช้, สถิติ, กราฟ) จึงเก็บ float32 เป็นค่าสั้นที่สุด
+                view['index'] = UserIndex.build(
+                    widen(self._data(view, table)),
+                    TABLES[table]['key'],
+                    sort_column='date' if 'date' in columns else None
+                )
+            return view['index']
+
+    def read(self, table):
+        """อ่านข้อมูลจาก sheet"""
+        return self._data(self._view(table), table).copy()
+
+    def select(self, table, column, value, order_by=None, ascending=True):
+        """ดึงแถวที่ column == value (ใช้ index รายผู้ใช้เมื่อค้นด้วย user_id)"""
+        view = self._view(table)
+        index = None
+        if column == 'user_id':
+            index = self._index(view, table)
+        if index is None or order_by not in (None, index.sort_column):
+            return super().select(table, column, value, order_by, ascending)
+
+        columns = list(view['data'].columns) or list(TABLES[table]['columns'])
+        with self._cache_lock:
+            rows = index.get(value, ascending)
+        return conform(table, pd.DataFrame(rows, columns=columns), compact=False)
+
+    def select_range(self, table, user_id, start_date=None, end_date=None, ascending=True, limit=None, offset=0):
+        """แถวของผู้ใช้ในช่วงวันที่ผ่าน index (ค้นช่วงด้วย bisect)"""
+        view = self._view(table)
+        with self._cache_lock:
+            rows, total = self._index(view, table).range(user_id, start_date, end_date, ascending, limit, offset)
+        columns = list(view['data'].columns) or list(TABLES[table]['columns'])
+        return conform(table, pd.DataFrame(rows, columns=columns), compact=False), total
+
+    def iter_rows(self, table, column=None, value=None, order_by=None, chunksize=1000):
+        """อ่านข้อมูลเป็นชุด โดยไม่คัดลอกทั้งตาราง (ค้นด้วย user_id ผ่าน index)"""
+        view = self._view(table)
+        columns = list(view['data'].columns) or list(TABLES[table]['columns'])
+        if column == 'user_id' and order_by in (None, 'date'):
+            with self._cache_lock:
+                rows = self._index(view, table).get(value)
+            for start in range(0, len(rows), chunksize):
+                yield conform(table, pd.DataFrame(rows[start:start + chunksize], columns=columns), compact=False)
+            return
+
+        if column is not None or order_by is not None:
+            yield from super().iter_rows(table, column, value, order_by, chunksize)
+            return
+
+        data = self._data(view, table)
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start:start + chunksize].copy()
+
+    def write(self, table, data):
+        """เขียนข้อมูลลง sheet (journal ที่ค้างอยู่จะถูก compact ไปพร้อมกัน)"""
+        if not self._valid(table, data):
+            return False
+        return self.compact({table: conform(table, data)})
+
+    def _next_id(self, table):
+        """view ล่าสุดของ sheet และ id ถัดไป (เรียกภายใต้ lock เพื่อรวม insert จาก process อื่นก่อน)"""
+        key = TABLES[table]['key']
+        view = self._view(table)
+        if view['next_id'] is None:
+            data = self._data(view, table)
+            view['next_id'] = 1 if data.empty else int(data[key].max()) + 1
+        return view, view['next_id']
+
+    def insert(self, table, row):
+        """เพิ่มแถวใหม่ลง journal คืนค่า id ใหม่"""
+        key = TABLES[table]['key']
+        if not self._valid(table, [row], insert=True):
+            return None
+        with self.lock:
+            view, new_id = self._next_id(table)
+            if not self._log({'op': 'insert', 'table': table, 'row': dict(row, **{key: new_id})}):
+                return None
+            view['next_id'] = new_id + 1
+            return new_id
+
+    def insert_many(self, table, rows):
+        """เพิ่มหลายแถวลง journal ในการเขียนครั้งเดียว"""
+        key = TABLES[table]['key']
+        if not self._valid(table, rows, insert=True):
+            return None
+        with self.lock:
+            view, first_id = self._next_id(table)
+            ids = list(range(first_id, first_id + len(rows)))
+            entries = [
+                {'op': 'insert', 'table': table, 'row': dict(row, **{key: new_id})}
+                for row, new_id in zip(rows, ids)
+            ]
+            if not self._log(*entries):
+                return None
+            view['next_id'] = first_id + len(rows)
+            return ids
+
+    def update(self, table, column, value, changes):
+        """บันทึกการแก้ไขลง journal"""
+        if not self._valid(table, [changes]):
+            return False
+        with self.lock:
+            view = self._view(table)
+            if column == 'user_id':
+                exists = value in self._index(view, table)
+            else:
+                data = self._data(view, table)
+                exists = not data.empty and (data[column] == value).any()
+            if not exists:
+                return False
+            return self._log({'op': 'update', 'table': table, 'column': column, 'value': value, 'changes': changes})
+
+    def delete(self, table, column, value):
+        """บันทึกการลบลง journal"""
+        return self._log({'op': 'delete', 'table': table, 'column': column, 'value': value})
+
+    def delete_many(self, deletions):
+        """บันทึกการลบจากหลายตารางลง journal ในการเขียนครั้งเดียว"""
+        return self._log(*(
+            {'op': 'delete', 'table': table, 'column': column, 'value': value}
+            for table, column, value in deletions
+        ))
+
+    def vacuum(self):
+        """ลบแถวกำพร้าแล้วเขียนทุก sheet ใหม่ในการ compact ครั้งเดียว (รวม journal ที่ค้างอยู่ด้วย)"""
+        with self.lock:
+            sheets = {table: self._data(self._view(table), table) for table in TABLES}
+            sheets, removed = remove_orphans(sheets)
+            return removed if self.compact(replace=sheets) else None
+
+    @contextmanager
+    def batch(self):
+        """รวมการเพิ่ม/แก้ไข/ลบภายใน block เป็นการเขียน journal ครั้งเดียว
+
+        ถือ lock ตลอด block และการเปลี่ยนแปลงจะอ่านเห็นหลังจบ block
+        (update ของแถวที่เพิ่งเพิ่มใน batch เดียวกันจะหาแถวไม่พบ)
+        ถ้าเกิด exception ใน block การเปลี่ยนแปลงทั้งหมดจะถูกยกเลิก
+        และถ้าเขียน journal ตอนจบ block ไม่สำเร็จจะ raise WriteError
+        """
+        with self.lock:
+            if self._queue is not None:
+                yield self
+                return
+            self._queue = []
+            try:
+                yield self
+                queue = self._queue
+            except BaseException:
+                # id ที่จองไว้ใน batch ถูกยกเลิก ให้คำนวณใหม่จากข้อมูลจริง
+                self.clear_cache()
+                raise
+            finally:
+                self._queue = None
+            if queue and not self._log(*queue):
+                self.clear_cache()
+                raise WriteError(f"{len(queue)} change(s) to {', '.join(sorted({entry['table'] for entry in queue}))} were not saved")
+
+    def _log(self, *entries):
+        with self.lock:
+            if self._queue is not None:
+                self._queue.extend(entries)
+                return True
+            try:
+                self.journal.append(*entries)
+            except Exception as e:
+                report_error('storage', f"Error writing journal for {entries[0]['table']}: {e}")
+                return False
+            if self.journal.size() > self.compact_threshold:
+                self._compact_later()
+            return True
+
+    def _compact_later(self):
+        """เริ่ม compact ใน thread เบื้องหลัง ถ้ายังไม่มี thread ที่ทำอยู่
+
+        thread รอ lock จน writer ปัจจุบันปล่อย และไม่ใช่ daemon: process จะรอให้ compact เสร็จก่อนจบ
+        """
+        with self._compactor_lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self._compact_in_background, name='fitlog-compact')
+            self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            report_error('storage', f"Error compacting {self.path}: {e}")
+
+    def wait_for_compaction(self, timeout=None):
+        """รอ compact เบื้องหลังที่กำลังทำอยู่ให้เสร็จ"""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join(timeout)
+
+    def compact(self, replace=None):
+        """รวม journal ลง workbook ในการเขียนครั้งเดียว แล้วล้าง journal
+
+        replace: {sheet_name: DataFrame} สำหรับเขียนทับทั้ง sheet ไปพร้อมกัน
+        """
+        with self.lock:
+            if self._queue:
+                # compact ระหว่าง batch: เขียน entry ที่รออยู่ลง journal ก่อน
+                queue, self._queue = self._queue, []
+                self.journal.append(*queue)
+
+            replace = replace or {}
+            entries, _ = self.journal.read()
+            tables = {entry['table'] for entry in entries} | set(replace)
+            if not tables:
+                return True
+
+            sheets = {}
+            for table in tables:
+                sheets[table] = replace[table] if table in replace else self._data(self._view(table), table)
+            old_signature = self._file_signature()
+            try:
+                with COMPACT_SECONDS.time():
+                    self._write_workbook(sheets)
+            except Exception as e:
+                report_error('storage', f"Error writing to {', '.join(sorted(tables))}: {e}")
+                self.clear_cache()
+                return False
+            self.journal.clear()
+            for table in sheets:
+                SHEET_WRITES.inc(table=table)
+            WORKBOOK_WRITE_BYTES.inc(os.path.getsize(self.path))
+            return self._restamp(old_signature, sheets, replace)
+
+    def _write_workbook(self, sheets):
+        """เขียน sheet ลงสำเนาของ workbook แล้วแทนที่ไฟล์เดิมทีเดียว (atomic)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        name, extension = os.path.splitext(os.path.basename(self.path))
+        # openpyxl เลือกรูปแบบไฟล์จากนามสกุล ไฟล์ชั่วคราวจึงต้องใช้นามสกุลเดิม
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix=extension or '.xlsx', dir=directory)
+        os.close(fd)
+        try:
+            if os.path.exists(self.path):
+                shutil.copyfile(self.path, temp_path)
+                shutil.copymode(self.path, temp_path)
+                writer = pd.ExcelWriter(temp_path, engine='openpyxl', mode='a', if_sheet_exists='replace')
+            else:
+                writer = pd.ExcelWriter(temp_path, engine='openpyxl')
+            with writer:
+                for table, data in sheets.items():
+                    plain(data).to_excel(writer, sheet_name=table, index=False)
+            with open(temp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _restamp(self, old_signature, sheets, replace):
+        """ปรับ cache และสำเนาอ่านเร็วหลัง compact"""
+        new_signature = self._file_signature()
+        if self.mirror is not None:
+            for table in TABLES:
+                if table not in sheets:
+                    self.mirror.restamp(table, old_signature, new_signature)
+            # สร้างสำเนาจาก DataFrame ที่เพิ่งเขียน ไม่ต้อง parse workbook ใหม่
+            for table, data in sheets.items():
+                self.mirror.save(table, new_signature, as_written(table, data))
+
+        # sheet ที่ไม่ได้ถูกเขียนทับยังตรงกับข้อมูลในไฟล์ใหม่ จึงใช้ cache (และ index) ต่อได้
+        for name, view in list(self._sheet_cache.items()):
+            if view['signature'] == old_signature and not view['pending'] and name not in replace:
+                view['signature'] = new_signature
+                view['offset'] = 0
+            else:
+                del self._sheet_cache[name]
+        return True
+
+    def clear_cache(self):
+        """ล้าง cache ของทุก sheet"""
+        with self._cache_lock:
+            self._sheet_cache.clear()
+
+    def cache_info(self):
+        """สถิติการใช้ cache"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': round(self.cache_hits / total, 4) if total else 0,
+            'cached_sheets': sorted(self._sheet_cache),
+            'journal_bytes': self.journal.size()
+        }
+
+    def memory_usage(self):
+        """หน่วยความจำของ sheet ที่อยู่ใน cache (รวม entry จาก journal ที่ยังไม่ได้อ่าน)"""
+        with self._cache_lock:
+            return {
+                table: memory_usage(self._data(self._view(table, count=False), table))
+                for table in list(self._sheet_cache)
+            }
+
+
+class SQLiteBackend(StorageBackend):
+    """เก็บข้อมูลใน SQLite พร้อม index สำหรับ query รายผู้ใช้"""
+
+    def __init__(self, path):
+        self.path = path
+        # SQLite กันการเขียนชนกันเองอยู่แล้ว lock นี้ใช้ให้ FitLogDB อ่าน version และเขียนเป็นขั้นตอนเดียว
+        self.lock = FileLock(lock_path(path))
+        self.create_tables()
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path))
+
+    def version(self):
+        """ข้อมูลเปลี่ยนเมื่อไฟล์ฐานข้อมูลถูกเขียน"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def create_tables(self):
+        """สร้างตารางและ index ถ้ายังไม่มี"""
+        with self._connect() as conn, conn:
+            for table, schema in TABLES.items():
+                columns = []
+                for column, column_type in schema['columns'].items():
+                    if column == schema['key']:
+                        columns.append(f'{column} INTEGER PRIMARY KEY')
+                    else:
+                        columns.append(f'{column} {column_type}')
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({", ".join(columns)})')
+
+                if 'user_id' in schema['columns'] and table != 'Users':
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_user_date ON {table} (user_id, date)')
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table} (date)')
+
+    def read(self, table):
+        """อ่านข้อมูลทั้งตาราง"""
+        try:
+            with SHEET_LOAD_SECONDS.time(table=table, source='sqlite'), self._connect() as conn:
+                data = pd.read_sql_query(f'SELECT * FROM {table}', conn)
+            SHEET_READS.inc(table=table, source='sqlite')
+            return conform(table, data)
+        except Exception as e:
+            report_error('storage', f"Error reading {table}: {e}")
+            return pd.DataFrame()
+
+    def write(self, table, data):
+        """เขียนทับข้อมูลทั้งตาราง"""
+        columns = list(TABLES[table]['columns'])
+        if not self._valid(table, data):
+            return False
+        try:
+            with self._connect() as conn, conn:
+                conn.execute(f'DELETE FROM {table}')
+                if not data.empty:
+                    rows = plain(data).reindex(columns=columns).astype(object)
+                    rows = rows.where(pd.notna(rows), None)
+                    placeholders = ', '.join('?' for _ in columns)
+                    conn.executemany(
+                        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})',
+                        rows.itertuples(index=False, name=None)
+                    )
+            SHEET_WRITES.inc(table=table)
+            return True
+        except Exception as e:
+            report_error('storage', f"Error writing to {table}: {e}")
+            return False
+
+    def select(self, table, column, value, order_by=None, ascending=True):
+        """ดึงแถวที่ column == value ผ่าน index"""
+        query = f'SELECT * FROM {table} WHERE {column} = ?'
+        if order_by is not None:
+            query += f' ORDER BY {order_by} {"ASC" if ascending else "DESC"}'
+        try:
+            with self._connect() as conn:
+                data = pd.read_sql_query(query, conn, params=(_to_sql_value(value),))
+            # วันที่เป็น Timestamp เหมือน ExcelBackend (ไม่บีบชนิดข้อมูลเพราะเป็นผลรายผู้ใช้)
+            return conform(table, data, compact=False)
+        except Exception as e:
+            report_error('storage', f"Error reading {table}: {e}")
+            return pd.DataFrame()
+
+    def select_range(self, table, user_id, start_date=None, end_date=None, ascending=True, limit=None, offset=0):
+        """แถวของผู้ใช้ในช่วงวันที่ผ่าน index (user_id, date)"""
+        where = 'user_id = ?'
+        params = [_to_sql_value(user_id)]
+        if start_date:
+            where += ' AND date >= ?'
+            params.append(start_date)
+        if end_date:
+            where += ' AND date <= ?'
+            params.append(end_date + '\uffff')
+
+        query = f'SELECT * FROM {table} WHERE {where} ORDER BY date {"ASC" if ascending else "DESC"}'
+        if limit is not None or offset:
+            query += ' LIMIT ? OFFSET ?'
+        page_params = params + ([-1 if limit is None else limit, offset] if limit is not None or offset else [])
+        try:
+            with self._connect() as conn:
+                total = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE {where}', params).fetchone()[0]
+                data = pd.read_sql_query(query, conn, params=page_params)
+            return conform(table, data, compact=False), total
+        except Exception as e:
+            report_error('storage', f"Error reading {table}: {e}")
+            return pd.DataFrame(), 0
+
+    def iter_rows(self, table, column=None, value=None, order_by=None, chunksize=1000):
+        """อ่านข้อมูลเป็นชุดจาก cursor โดยไม่โหลดทั้งตาราง"""
+        query = f'SELECT * FROM {table}'
+        params = ()
+        if column is not None:
+            query += f' WHERE {column} = ?'
+            params = (_to_sql_value(value),)
+        if order_by is not None:
+            query += f' ORDER BY {order_by}'
+        with self._connect() as conn:
+            for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunksize):
+                yield conform(table, chunk, compact=False)
+
+    def insert(self, table, row):
+        """เพิ่มแถวใหม่ (SQLite สร้าง primary key ให้)"""
+        if not self._valid(table, [row], insert=True):
+            return None
+        columns = [column for column in row if column != TABLES[table]['key']]
+        placeholders = ', '.join('?' for _ in columns)
+        try:
+            with self._connect() as conn, conn:
+                cursor = conn.execute(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})',
+                    [_to_sql_value(row[column]) for column in columns]
+                )
+                return cursor.lastrowid
+        except Exception as e:
+            report_error('storage', f"Error inserting into {table}: {e}")
+            return None
+
+    def insert_many(self, table, rows):
+        """เพิ่มหลายแถวใน transaction เดียว"""
+        if not self._valid(table, rows, insert=True):
+            return None
+        key = TABLES[table]['key']
+        columns = [key] + list(rows[0]) if rows else [key]
+        placeholders = ', '.join('?' for _ in columns)
+        try:
+            with self._connect() as conn, conn:
+                conn.execute('BEGIN IMMEDIATE')
+                first_id = conn.execute(f'SELECT COALESCE(MAX({key}), 0) + 1 FROM {table}').fetchone()[0]
+                ids = list(range(first_id, first_id + len(rows)))
+                conn.executemany(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})',
+                    ([new_id] + [_to_sql_value(row[column]) for column in columns[1:]] for row, new_id in zip(rows, ids))
+                )
+                return ids
+        except Exception as e:
+            report_error('storage', f"Error inserting into {table}: {e}")
+            return None
+
+    def update(self, table, column, value, changes):
+        """แก้ไขแถวที่ column == value"""
+        if not self._valid(table, [changes]):
+            return False
+        assignments = ', '.join(f'{key} = ?' for key in changes)
+        params = [_to_sql_value(v) for v in changes.values()] + [_to_sql_value(value)]
+        try:
+            with self._connect() as conn, conn:
+                cursor = conn.execute(f'UPDATE {table} SET {assignments} WHERE {column} = ?', params)
+                return cursor.rowcount > 0
+        except Exception as e:
+            report_error('storage', f"Error updating {table}: {e}")
+            return False
+
+    def delete(self, table, column, value):
+        """ลบแถวที่ column == value"""
+        try:
+            with self._connect() as conn, conn:
+                conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (_to_sql_value(value),))
+            return True
+        except Exception as e:
+            report_error('storage', f"Error deleting from {table}: {e}")
+            return False
+
+    def delete_many(self, deletions):
+        """ลบจากหลายตารางใน transaction เดียว"""
+        try:
+            with self._connect() as conn, conn:
+                for table, column, value in deletions:
+                    conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (_to_sql_value(value),))
+            return True
+        except Exception as e:
+            report_error('storage', f"Error deleting from {', '.join(table for table, _, _ in deletions)}: {e}")
+            return False
+
+    def vacuum(self):
+        """ลบแถวกำพร้าใน transaction เดียว แล้ว VACUUM ไฟล์ฐานข้อมูล"""
+        removed = {table: 0 for table in TABLES}
+        try:
+            with self._connect() as conn:
+                with conn:
+                    for table in _child_tables():
+                        cursor = conn.execute(
+                            f'DELETE FROM {table} WHERE user_id IS NULL OR user_id NOT IN (SELECT user_id FROM Users)'
+                        )
+                        removed[table] = cursor.rowcount
+                conn.execute('VACUUM')
+        except Exception as e:
+            report_error('storage', f"Error vacuuming {self.path}: {e}")
+            return None
+        return removed
+
+
+def _child_tables():
+    """ตารางที่อ้างถึงผู้ใช้ผ่าน user_id"""
+    return [table for table, schema in TABLES.items() if table != 'Users' and 'user_id' in schema['columns']]
+
+
+def remove_orphans(sheets):
+    """ตัดแถวที่ user_id ไม่มีใน Users ออก และเรียงทุกตารางตาม primary key
+
+    คืนค่า (sheets ใหม่, {table: จำนวนแถวที่ตัดออก})
+    """
+    users = sheets['Users']
+    user_ids = users['user_id'] if 'user_id' in users else pd.Series(dtype=float)
+    cleaned, removed = {}, {}
+    for table, data in sheets.items():
+        removed[table] = 0
+        if table in _child_tables() and not data.empty:
+            orphans = ~data['user_id'].isin(user_ids)
+            removed[table] = int(orphans.sum())
+            data = data[~orphans]
+        key = TABLES[table]['key']
+        if key in data and not data.empty:
+            data = data.sort_values(key)
+        cleaned[table] = data.reset_index(drop=True)
+    return cleaned, removed
+
+
+def as_written(table, data):
+    """sheet ตามที่จะอ่านกลับจาก workbook: ชนิดข้อมูลตาม schema และข้อความว่างเป็นค่าว่าง
+    (xlsx เก็บข้อความว่างเป็น cell ว่าง)
+    """
+    data = conform(table, data)
+    changes = {}
+    for column in data.columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if '' in values.cat.categories:
+                changes[column] = values.cat.remove_categories([''])
+        elif pd.api.types.is_string_dtype(values.dtype) and (values == '').any():
+            changes[column] = values.mask(values == '')
+    return data.assign(**changes) if changes else data
+
+
+def _to_sql_value(value):
+    """แปลงค่า numpy/pandas ให้ sqlite3 รับได้"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def open_backend(path):
+    """เลือก backend ตามนามสกุลไฟล์"""
+    if os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS:
+        return SQLiteBackend(path)
+    return ExcelBackend(path)
+
+
+def copy_tables(source, target):
+    """คัดลอกข้อมูลทุกตารางจาก backend หนึ่งไปอีก backend หนึ่ง (เขียนทับข้อมูลเดิมของปลายทาง)
+
+    ใช้ย้ายข้อมูลเมื่อเปลี่ยน FITLOG_DB เช่นจาก workbook ไป SQLite (flask --app app migrate-db)
+    """
+    for table in TABLES:
+        if not target.write(table, source.read(table)):
+            return False
+    return True
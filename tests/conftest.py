@@ -0,0 +1,51 @@
+"""shared fixtures: every test works on its own copy of the empty workbook (or a fresh SQLite file)
+
+run from the repository root with `python -m pytest`
+"""
+import os
+import shutil
+
+import pytest
+
+from models import FitLogDB
+
+EMPTY_WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'fit_log_data.xlsx')
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """path of a copy of the empty workbook"""
+    path = tmp_path / 'fit_log_data.xlsx'
+    shutil.copyfile(EMPTY_WORKBOOK, path)
+    return str(path)
+
+
+@pytest.fixture(params=['xlsx', 'sqlite'])
+def db_path(request, tmp_path, workbook):
+    """database path for each backend"""
+    if request.param == 'xlsx':
+        return workbook
+    return str(tmp_path / 'fit_log.db')
+
+
+@pytest.fixture
+def db(db_path):
+    return FitLogDB(db_path)
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """serve(db) -> Flask test client of the app backed by db"""
+    import app as web
+
+    def serve(db):
+        monkeypatch.setattr(web, 'db', db)
+        monkeypatch.setattr(web, 'chart_cache', web.ChartCache(web.chart_cache.max_bytes))
+        web.app.config['TESTING'] = True
+        return web.app.test_client()
+    return serve
+
+
+@pytest.fixture
+def client(serve, db):
+    return serve(db)
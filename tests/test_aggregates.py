@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from aggregates import DailyRollup, UserStats
+from models import FitLogDB
+
+
+def legacy_rows(db, table, rows):
+    """append rows as older versions of the app could have stored them (no insert validation)"""
+    data = pd.concat([db.backend.read(table), pd.DataFrame(rows)], ignore_index=True)
+    assert db.backend.write(table, data)
+
+
+@pytest.fixture
+def user_id(db):
+    return db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+
+
+def test_inserts_without_a_date_are_rejected(db, user_id):
+    assert not db.add_activity(user_id, None, 'Running', '', 300.0, 30)
+    assert not db.add_weight_record(user_id, None, 79.0)
+    assert db.add_activities([{'user_id': user_id, 'activity_name': 'Running', 'details': '',
+                               'calories_burned': 300.0, 'duration_minutes': 30}]) is None
+    assert db.count_user_activities(user_id) == 0
+    assert db.count_weight_history(user_id) == 0
+
+
+def test_rows_without_a_date_are_left_out_of_rollups_and_charts(db, db_path, user_id, serve):
+    legacy_rows(db, 'Activities', [
+        {'activity_id': 1, 'user_id': user_id, 'date': '2024-01-01', 'activity_name': 'Running', 'details': 'easy',
+         'calories_burned': 300.0, 'duration_minutes': 30},
+        {'activity_id': 2, 'user_id': user_id, 'date': None, 'activity_name': 'Yoga', 'details': 'easy',
+         'calories_burned': 100.0, 'duration_minutes': 20},
+    ])
+    legacy_rows(db, 'Weight_History', [
+        {'record_id': 1, 'user_id': user_id, 'date': None, 'weight': 81.0, 'notes': 'old'},
+        {'record_id': 2, 'user_id': user_id, 'date': '2024-01-01', 'weight': 79.5, 'notes': 'new'},
+    ])
+    db = FitLogDB(db_path)
+
+    for period in ('day', 'week', 'month'):
+        assert db.get_daily_rollup(user_id, period)['calories_burned'].tolist() == [300.0]
+    stats = db.get_user_stats(user_id)
+    assert stats['total_activities'] == 2
+    assert stats['total_calories_burned'] == 400.0
+    assert stats['initial_weight'] == 79.5
+
+    client = serve(db)
+    for kind in ('activity', 'weight'):
+        assert client.get(f'/api/series/{kind}/{user_id}').status_code == 200
+        assert client.get(f'/chart/{kind}/{user_id}.png').status_code == 200
+    assert client.get(f'/api/series/activity/{user_id}').get_json()['values'] == [300.0]
+
+    # deleting an undated activity keeps the rollup and the totals in step
+    assert db.delete_activity(2)
+    assert db.get_user_stats(user_id)['total_calories_burned'] == 300.0
+    assert db.get_daily_rollup(user_id)['calories_burned'].tolist() == [300.0]
+
+
+def test_daily_rollup_skips_missing_days():
+    rollup = DailyRollup()
+    rollup.add('2024-01-01', 300.0, 30)
+    rollup.add(None, 100.0, 20)
+    rollup.remove(None, 100.0, 20)
+    assert rollup.frame()['date'].tolist() == ['2024-01-01']
+
+
+@pytest.mark.parametrize('missing', [None, pd.NaT, float('nan'), 'NaT', 'yesterday'])
+def test_user_stats_accept_activities_and_weights_without_a_date(missing):
+    stats = UserStats(pd.Series({'weight': 80.0, 'height': 175.0, 'age': 30, 'target_weight': 70.0}))
+    stats.add_activity(1, missing, 100.0, 20)
+    stats.add_activity(2, pd.Timestamp('2024-01-02'), 200.0, 30)
+    stats.add_weight(1, missing, 81.0)
+    stats.add_weight(2, '2024-01-02', 79.0)
+
+    assert stats.daily.frame()['date'].tolist() == ['2024-01-02']
+    assert stats.weights.frame()['date'].tolist() == ['2024-01-02']
+    assert stats.initial_weight == ('2024-01-02', 2, 79.0)
+    stats.remove_activity(1)
+    assert stats.total_calories == 200.0
@@ -0,0 +1,48 @@
+from datetime import date
+
+import pandas as pd
+
+from utils.analytics import cohort_report
+
+USERS = pd.DataFrame({
+    'user_id': [1, 2],
+    'name': ['Somchai', 'Somsri'],
+    'weight': [80.0, 60.0],
+    'height': [175.0, 160.0],
+    'age': [30, 28],
+    'target_weight': [70.0, 55.0]
+})
+WEIGHTS = pd.DataFrame(columns=['record_id', 'user_id', 'date', 'weight', 'notes'])
+
+
+def activities(rows):
+    return pd.DataFrame(
+        [(i, user_id, day, 'Running', '', calories, 30) for i, (user_id, day, calories) in enumerate(rows, 1)],
+        columns=['activity_id', 'user_id', 'date', 'activity_name', 'details', 'calories_burned', 'duration_minutes'])
+
+
+def test_average_weekly_calories_cover_each_users_own_active_weeks():
+    # user 1 is active in one week, user 2 in three (two sessions in the last one)
+    report = cohort_report(USERS, activities([
+        (1, '2024-01-02', 50.0),
+        (2, '2024-01-02', 100.0),
+        (2, '2024-01-09', 200.0),
+        (2, '2024-01-16', 250.0),
+        (2, '2024-01-17', 50.0),
+    ]), WEIGHTS, today=date(2024, 1, 18))
+
+    averages = report['leaderboard'].set_index('user_id')['avg_weekly_calories']
+    assert averages[1] == 50.0
+    assert averages[2] == 200.0
+
+
+def test_weeks_with_zero_calorie_sessions_still_count():
+    report = cohort_report(USERS, activities([
+        (1, '2024-01-02', 90.0),
+        (1, '2024-01-09', 0.0),
+        (2, '2024-01-16', 70.0),
+    ]), WEIGHTS, today=date(2024, 1, 18))
+
+    averages = report['leaderboard'].set_index('user_id')['avg_weekly_calories']
+    assert averages[1] == 45.0
+    assert averages[2] == 70.0
@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils import batch_calculations, calculations
+
+
+@pytest.fixture
+def client(serve, workbook):
+    from models import FitLogDB
+    return serve(FitLogDB(workbook))
+
+
+def test_profiles_match_the_scalar_calculators(client):
+    response = client.post('/calculate_batch', json={'people': [
+        {'weight': 80, 'height': 175, 'age': 30},
+        {'weight': 55, 'height': 160, 'age': 28, 'gender': 'female', 'activity_level': 'very_active'},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['count'] == 2
+    bmi = calculations.calculate_bmi(55, 160)
+    assert data['results'][1]['bmi'] == bmi
+    assert data['results'][1]['bmi_category'] == calculations.get_bmi_category(bmi)
+    assert data['results'][1]['tdee'] == calculations.calculate_tdee(
+        calculations.calculate_bmr(55, 160, 28, 'female'), 'very_active')
+
+
+@pytest.mark.parametrize('payload', [{'people': []}, {'weight': [], 'height': [], 'age': []}])
+def test_no_people_gives_no_results(client, payload):
+    response = client.post('/calculate_batch', json=payload)
+    assert response.status_code == 200
+    assert response.get_json() == {'count': 0, 'results': []}
+
+
+@pytest.mark.parametrize('person', [
+    {'weight': None, 'height': 175, 'age': 30},
+    {'height': 175, 'age': 30},
+    {'weight': 80, 'height': 'tall', 'age': 30},
+    {'weight': 80, 'height': 175, 'age': float('nan')},
+    {'weight': float('inf'), 'height': 175, 'age': 30},
+])
+def test_missing_or_non_finite_values_are_rejected_with_the_row(client, person):
+    response = client.post('/calculate_batch', json={'people': [{'weight': 80, 'height': 175, 'age': 30}, person]})
+    assert response.status_code == 400
+    assert response.get_json()['row'] == 1
+    # the body is valid JSON without NaN
+    assert 'NaN' not in response.get_data(as_text=True)
+
+
+def test_missing_bmi_has_no_category():
+    categories = batch_calculations.get_bmi_category([17.0, np.nan, 31.0])
+    assert categories.tolist() == ['น้ำหนักน้อย', None, 'อ้วน']
+    assert batch_calculations.get_bmi_category(np.nan) is None
+    assert batch_calculations.get_bmi_category(22.0) == 'น้ำหนักปกติ'
+    assert math.isnan(batch_calculations.calculate_bmi(np.nan, 175))
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from models import FitLogDB
+
+
+@pytest.fixture
+def runner(db, serve):
+    import app as web
+    serve(db)
+    return web.app.test_cli_runner()
+
+
+@pytest.fixture
+def user_id(db):
+    return db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+
+
+def test_warmup(runner, monkeypatch):
+    import app as web
+    monkeypatch.setattr(web, '_startup_report', None)
+    monkeypatch.setitem(web.app.config, 'WARMUP', 'sheets,templates')
+    result = runner.invoke(args=['warmup'])
+    assert result.exit_code == 0
+    phases = [line.split(': ')[0] for line in result.output.splitlines()]
+    assert phases == ['import', 'sheets', 'templates', 'total']
+
+
+def test_compact(runner, db, user_id):
+    result = runner.invoke(args=['compact'])
+    assert result.exit_code == 0
+    assert result.output == 'compact สำเร็จ\n'
+
+
+def test_vacuum(runner, db, user_id):
+    db.add_activity(user_id, '2024-01-01', 'Running', 'easy', 300.0, 30)
+    db.add_activity(user_id + 1, '2024-01-01', 'Running', 'easy', 300.0, 30)
+    result = runner.invoke(args=['vacuum'])
+    assert result.exit_code == 0
+    assert result.output.splitlines() == ['Users: ลบ 0 แถว', 'Activities: ลบ 1 แถว', 'Weight_History: ลบ 0 แถว']
+
+
+def test_memory(runner, user_id):
+    result = runner.invoke(args=['memory'])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].startswith('Users: 1 แถว ')
+    assert any(line.split()[0] == 'user_id' and line.split()[-1] == 'int32' for line in lines)
+    assert any(line.startswith('Activities: 0 แถว') for line in lines)
+
+
+def test_import_data(runner, db, user_id, tmp_path):
+    path = tmp_path / 'activities.csv'
+    path.write_text('date,activity_name,duration_minutes,calories_burned\n'
+                    '2024-01-01,Running,30,300\n'
+                    'not a date,Running,30,300\n', encoding='utf-8')
+    result = runner.invoke(args=['import-data', 'activities', str(path), '--user-id', str(user_id)])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[-1] == 'นำเข้า 1 รายการ'
+    assert lines[0].startswith('แถว 2: ')
+    assert db.count_user_activities(user_id) == 1
+
+
+def test_migrate_db_copies_every_table(runner, db, db_path, user_id, tmp_path):
+    db.add_activity(user_id, '2024-01-01', 'Running', 'easy', 300.0, 30)
+    db.add_weight_record(user_id, '2024-01-01', 79.8, 'morning')
+    # to the other backend: xlsx -> SQLite or SQLite -> xlsx
+    target = str(tmp_path / ('copy.db' if db_path.endswith('.xlsx') else 'copy.xlsx'))
+
+    result = runner.invoke(args=['migrate-db', '--from', db_path, '--to', target])
+    assert result.exit_code == 0
+    assert result.output.splitlines() == ['Users: 1 แถว', 'Activities: 1 แถว', 'Weight_History: 1 แถว']
+    copy = FitLogDB(target)
+    for table in ('Users', 'Activities', 'Weight_History'):
+        pd.testing.assert_frame_equal(copy.backend.read(table), db.backend.read(table))
+    assert copy.get_weight_history(user_id)['weight'].tolist() == [79.8]
+
+    # a target that already holds data is only replaced with --overwrite
+    db.add_user('Somsri', 60.0, 160.0, 28, 55.0)
+    result = runner.invoke(args=['migrate-db', '--from', db_path, '--to', target])
+    assert result.output.startswith('ปลายทางมีข้อมูลอยู่แล้ว')
+    assert len(FitLogDB(target).get_all_users()) == 1
+    result = runner.invoke(args=['migrate-db', '--from', db_path, '--to', target, '--overwrite'])
+    assert result.output.splitlines()[0] == 'Users: 2 แถว'
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from models import FitLogDB
+
+
+@pytest.fixture
+def stored(db, db_path):
+    """one user with a 79.8 kg record, merged into the main file and read back by a fresh FitLogDB"""
+    user_id = db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+    assert db.add_weight_record(user_id, '2024-01-01', 79.8, 'morning')
+    assert db.compact()
+    return FitLogDB(db_path), user_id
+
+
+def test_weight_round_trips_through_select(stored):
+    db, user_id = stored
+    assert db.get_weight_history(user_id)['weight'].tolist() == [79.8]
+    assert db.get_weight_history(user_id, limit=10)['weight'].tolist() == [79.8]
+    assert db.get_latest_weight(user_id) == 79.8
+    assert db.get_user_stats(user_id)['current_weight'] == 80.0
+    assert db.get_user_stats(user_id)['initial_weight'] == 79.8
+
+
+@pytest.mark.parametrize('url', ['/export/{user_id}/weights.csv', '/export/all/weights.csv'])
+def test_weight_round_trips_through_csv_export(stored, serve, url):
+    db, user_id = stored
+    response = serve(db).get(url.format(user_id=user_id))
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'record_id,user_id,date,weight,notes'
+    assert lines[1] == f'1,{user_id},2024-01-01,79.8,morning'
+
+
+@pytest.mark.parametrize('url', ['/export/{user_id}/weights.ndjson', '/export/all/weights.ndjson'])
+def test_weight_round_trips_through_ndjson_export(stored, serve, url):
+    db, user_id = stored
+    response = serve(db).get(url.format(user_id=user_id))
+    assert response.status_code == 200
+    row = json.loads(response.get_data(as_text=True).splitlines()[0])
+    assert row == {'record_id': 1, 'user_id': user_id, 'date': '2024-01-01', 'weight': 79.8, 'notes': 'morning'}
@@ -0,0 +1,39 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from utils import importer
+
+RECORDS = [{'date': '2024-01-01', 'weight': 79.8}, {'date': '2024-01-02', 'weight': 79.5}]
+
+
+@pytest.mark.parametrize('filename, content', [
+    ('weights.json', json.dumps(RECORDS)),
+    ('weights.json', json.dumps({'records': RECORDS})),
+    ('weights.jsonl', '\n'.join(json.dumps(record) for record in RECORDS)),
+    ('weights.csv', 'date,weight\n2024-01-01,79.8\n2024-01-02,79.5\n'),
+])
+def test_read_records_from_a_path_or_an_upload(tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_text(content, encoding='utf-8')
+    for source in (str(path), io.BytesIO(content.encode('utf-8'))):
+        data = importer.read_records(source, filename)
+        # JSON-lines dates come back parsed
+        assert pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d').tolist() == ['2024-01-01', '2024-01-02']
+        assert data['weight'].tolist() == [79.8, 79.5]
+
+
+def test_read_records_closes_the_json_file(tmp_path, monkeypatch):
+    path = tmp_path / 'weights.json'
+    path.write_text(json.dumps(RECORDS), encoding='utf-8')
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr(importer, 'open', tracking_open, raising=False)
+
+    assert len(importer.read_records(str(path), 'weights.json')) == 2
+    assert opened and all(f.closed for f in opened)
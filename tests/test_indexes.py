@@ -0,0 +1,107 @@
+import random
+
+import pandas as pd
+import pytest
+
+from indexes import UserIndex
+from storage import ExcelBackend
+
+USERS = [1, 2, 3]
+RANGES = [
+    (None, None, True, None, 0),
+    (None, None, False, None, 0),
+    ('2024-01-05', None, True, None, 0),
+    (None, '2024-01-20', False, None, 0),
+    ('2024-01-03', '2024-01-12', True, 3, 1),
+    ('2024-01-03', '2024-01-12', False, 2, 2),
+    (None, None, False, 5, 0),
+    ('2024-02-01', None, True, 10, 0),
+]
+
+
+def day(rng):
+    return f'2024-01-{rng.randint(1, 28):02d}'
+
+
+def scan(data, user_id, start_date=None, end_date=None, ascending=True, limit=None, offset=0):
+    """reference result from a full scan of the sheet: (activity ids, total)"""
+    rows = data[data['user_id'] == user_id]
+    days = pd.to_datetime(rows['date']).dt.strftime('%Y-%m-%d')
+    if start_date:
+        rows, days = rows[days >= start_date], days[days >= start_date]
+    if end_date:
+        rows = rows[days <= end_date]
+    rows = rows.sort_values(['date', 'activity_id'], ascending=ascending)
+    end = None if limit is None else offset + limit
+    return rows['activity_id'].tolist()[offset:end], len(rows)
+
+
+def assert_matches_scan(backend):
+    data = backend.read('Activities')
+    for user_id in USERS:
+        assert backend.select('Activities', 'user_id', user_id)['activity_id'].tolist() == scan(data, user_id)[0]
+        for args in RANGES:
+            rows, total = backend.select_range('Activities', user_id, *args)
+            assert (rows['activity_id'].tolist(), total) == scan(data, user_id, *args), (user_id, args)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_index_matches_a_full_scan_after_inserts_updates_and_deletes(workbook, seed):
+    rng = random.Random(seed)
+    backend = ExcelBackend(workbook)
+
+    def activity():
+        return {'user_id': rng.choice(USERS), 'date': day(rng), 'activity_name': 'Running', 'details': 'easy',
+                'calories_burned': float(rng.randint(50, 500)), 'duration_minutes': 30}
+
+    backend.insert_many('Activities', [activity() for _ in range(30)])
+    assert_matches_scan(backend)
+
+    for step in range(40):
+        ids = backend.read('Activities')['activity_id'].tolist()
+        operation = rng.random()
+        if operation < 0.4 or not ids:
+            backend.insert('Activities', activity())
+        elif operation < 0.7:
+            changes = {'date': day(rng)} if rng.random() < 0.5 else {'calories_burned': 1.0, 'date': day(rng)}
+            backend.update('Activities', 'activity_id', rng.choice(ids), changes)
+        elif operation < 0.95:
+            backend.delete('Activities', 'activity_id', rng.choice(ids))
+        else:
+            backend.delete('Activities', 'user_id', rng.choice(USERS))
+        if step % 10 == 9:
+            assert_matches_scan(backend)
+            # the merged workbook gives the same answers as the journal
+            assert backend.compact()
+            assert_matches_scan(backend)
+    assert_matches_scan(ExcelBackend(workbook))
+
+
+def test_user_index_get_and_range():
+    data = pd.DataFrame({
+        'activity_id': [1, 2, 3, 4, 5],
+        'user_id': [1, 1, 2, 1, 1],
+        'date': pd.to_datetime(['2024-01-03', '2024-01-01', '2024-01-02', '2024-01-03', '2024-01-10']),
+    })
+    index = UserIndex.build(data, 'activity_id', sort_column='date')
+
+    def ids(rows):
+        return [row['activity_id'] for row in rows]
+
+    assert ids(index.get(1)) == [2, 1, 4, 5]
+    assert ids(index.get(1, ascending=False)) == [5, 4, 1, 2]
+    assert index.range(1, '2024-01-02', '2024-01-03') == ([data.loc[0].to_dict(), data.loc[3].to_dict()], 2)
+    assert ids(index.range(1, ascending=False, limit=2, offset=1)[0]) == [4, 1]
+
+    assert index.apply({'op': 'insert', 'table': 'Activities',
+                        'row': {'activity_id': 6, 'user_id': 2, 'date': pd.Timestamp('2024-01-01')}})
+    assert index.apply({'op': 'update', 'table': 'Activities', 'column': 'activity_id', 'value': 5,
+                        'changes': {'date': pd.Timestamp('2023-12-31')}})
+    assert index.apply({'op': 'delete', 'table': 'Activities', 'column': 'activity_id', 'value': 1})
+    assert ids(index.get(1)) == [5, 2, 4]
+    assert ids(index.get(2)) == [6, 3]
+
+    assert index.apply({'op': 'delete', 'table': 'Activities', 'column': 'user_id', 'value': 2})
+    assert 2 not in index
+    # deletes by other columns cannot be applied to the index
+    assert not index.apply({'op': 'delete', 'table': 'Activities', 'column': 'date', 'value': '2024-01-03'})
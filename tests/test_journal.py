@@ -0,0 +1,119 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import storage
+from journal import apply_entries
+from storage import ExcelBackend
+
+
+def same_rows(left, right):
+    pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True))
+
+
+def activity(user_id, day, calories=100.0):
+    return {'user_id': user_id, 'date': day, 'activity_name': 'Running', 'details': 'easy',
+            'calories_burned': calories, 'duration_minutes': 30}
+
+
+@pytest.fixture
+def backend(workbook):
+    """backend with inserts, updates and deletes still in the journal"""
+    backend = ExcelBackend(workbook)
+    backend.insert_many('Activities', [activity(1 + i % 2, f'2024-01-{i + 1:02d}', 10.0 * i) for i in range(6)])
+    backend.update('Activities', 'activity_id', 2, {'calories_burned': 999.0, 'date': '2024-02-01'})
+    backend.delete('Activities', 'activity_id', 3)
+    backend.insert('Activities', activity(2, '2024-01-15'))
+    backend.delete('Activities', 'user_id', 1)
+    return backend
+
+
+def test_changes_wait_in_the_journal(backend, workbook):
+    assert backend.journal.size() > 0
+    assert pd.read_excel(workbook, sheet_name='Activities').empty
+
+
+@pytest.mark.parametrize('mirror', [True, False])
+def test_replaying_the_journal_after_a_restart_gives_the_same_rows(backend, workbook, mirror):
+    before = backend.read('Activities')
+    assert before['activity_id'].tolist() == [2, 4, 6, 7]
+    assert before.set_index('activity_id').loc[2, 'calories_burned'] == 999.0
+
+    after = ExcelBackend(workbook, mirror=mirror).read('Activities')
+    same_rows(after, before)
+
+
+def test_replaying_entries_twice_is_harmless(backend):
+    entries, _ = backend.journal.read()
+    entries = [entry for entry in entries if entry['table'] == 'Activities']
+    once = apply_entries(pd.DataFrame(), entries, 'activity_id')
+    twice = apply_entries(once, entries, 'activity_id')
+    same_rows(twice, once)
+
+
+def test_compaction_merges_and_removes_the_journal(backend, workbook):
+    before = backend.read('Activities')
+    assert backend.compact()
+    assert backend.journal.size() == 0
+
+    written = pd.read_excel(workbook, sheet_name='Activities')
+    assert written['activity_id'].tolist() == before['activity_id'].tolist()
+    for reader in (backend, ExcelBackend(workbook), ExcelBackend(workbook, mirror=False)):
+        same_rows(reader.read('Activities'), before)
+
+
+def test_failed_compaction_leaves_the_workbook_and_journal_untouched(backend, workbook, monkeypatch):
+    before = backend.read('Activities')
+    with open(workbook, 'rb') as f:
+        original = f.read()
+    journal_size = backend.journal.size()
+
+    def broken(data):
+        raise OSError('disk full')
+    monkeypatch.setattr(storage, 'plain', broken)
+    assert not backend.compact()
+    monkeypatch.undo()
+
+    with open(workbook, 'rb') as f:
+        assert f.read() == original
+    assert backend.journal.size() == journal_size
+    # the half-written copy is removed
+    assert not [name for name in os.listdir(os.path.dirname(workbook)) if name.startswith('.fit_log_data.')]
+    same_rows(backend.read('Activities'), before)
+    same_rows(ExcelBackend(workbook).read('Activities'), before)
+
+
+def test_journal_over_the_threshold_is_compacted_in_the_background(workbook, monkeypatch):
+    backend = ExcelBackend(workbook, compact_threshold=1)
+    threads = []
+    compact = backend.compact
+
+    def record_thread():
+        threads.append(threading.current_thread())
+        return compact()
+    monkeypatch.setattr(backend, 'compact', record_thread)
+
+    assert backend.insert('Activities', activity(1, '2024-01-01')) == 1
+    backend.wait_for_compaction()
+    assert threads and threading.current_thread() not in threads
+    assert backend.journal.size() == 0
+    assert pd.read_excel(workbook, sheet_name='Activities')['activity_id'].tolist() == [1]
+    assert backend.read('Activities')['activity_id'].tolist() == [1]
+
+
+def test_mirror_written_by_compaction_matches_the_workbook(workbook):
+    backend = ExcelBackend(workbook)
+    backend.insert('Users', {'name': 'Somchai', 'weight': 80.0, 'height': 175.0, 'age': 30, 'target_weight': 70.0,
+                             'created_date': '2024-01-01 08:30:00', 'last_updated': '2024-01-02 09:00:00'})
+    backend.insert_many('Activities', [activity(1, '2024-01-01'), dict(activity(1, '2024-01-02'), details='')])
+    backend.insert_many('Weight_History', [
+        {'user_id': 1, 'date': '2024-01-01', 'weight': 79.8, 'notes': ''},
+        {'user_id': 1, 'date': '2024-01-02', 'weight': 79.5, 'notes': 'after run'},
+    ])
+    assert backend.compact()
+
+    for table in ('Users', 'Activities', 'Weight_History'):
+        pd.testing.assert_frame_equal(
+            ExcelBackend(workbook).read(table), ExcelBackend(workbook, mirror=False).read(table))
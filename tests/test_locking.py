@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import time
+
+from locking import FileLock, lock_path
+from storage import ExcelBackend
+
+
+def activity(user_id, day='2024-01-01'):
+    return {'user_id': user_id, 'date': day, 'activity_name': 'Running', 'details': 'easy',
+            'calories_burned': 100.0, 'duration_minutes': 30}
+
+
+def test_two_instances_allocate_distinct_ids_and_see_each_others_writes(workbook):
+    first, second = ExcelBackend(workbook), ExcelBackend(workbook)
+    # both caches are warm before the other instance writes
+    assert first.read('Activities').empty and second.read('Activities').empty
+
+    ids = []
+    for _ in range(3):
+        ids.append(first.insert('Activities', activity(1)))
+        ids.append(second.insert('Activities', activity(2)))
+    ids += second.insert_many('Activities', [activity(2), activity(2)])
+    ids.append(first.insert('Activities', activity(1)))
+    assert ids == list(range(1, 10))
+
+    for backend in (first, second):
+        assert backend.read('Activities')['activity_id'].tolist() == ids
+        assert backend.select('Activities', 'user_id', 1)['activity_id'].tolist() == [1, 3, 5, 9]
+
+
+def test_compaction_by_one_instance_invalidates_the_others_cache(workbook):
+    first, second = ExcelBackend(workbook), ExcelBackend(workbook)
+    first.insert('Activities', activity(1))
+    assert second.read('Activities')['activity_id'].tolist() == [1]
+
+    second.insert('Activities', activity(2))
+    second.update('Activities', 'activity_id', 1, {'calories_burned': 250.0})
+    assert second.compact()
+
+    assert first.read('Activities')['activity_id'].tolist() == [1, 2]
+    assert first.read('Activities').set_index('activity_id').loc[1, 'calories_burned'] == 250.0
+    assert first.select('Activities', 'user_id', 2)['activity_id'].tolist() == [2]
+    assert first.insert('Activities', activity(1)) == 3
+
+
+def insert_rows(path, user_id, count):
+    # a small threshold makes the workers also compact while the others are writing
+    backend = ExcelBackend(path, compact_threshold=2048)
+    for i in range(count):
+        assert backend.insert('Activities', activity(user_id, f'2024-01-{i + 1:02d}')) is not None
+
+
+def test_processes_writing_the_same_workbook_never_reuse_an_id(workbook):
+    workers = [
+        multiprocessing.Process(target=insert_rows, args=(workbook, user_id, 15))
+        for user_id in range(1, 5)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    data = ExcelBackend(workbook).read('Activities')
+    assert sorted(data['activity_id'].tolist()) == list(range(1, 61))
+    assert data.groupby('user_id').size().tolist() == [15, 15, 15, 15]
+    # the workbook and journal agree with a fresh parse of the xlsx plus journal
+    assert len(ExcelBackend(workbook, mirror=False).read('Activities')) == 60
+
+
+def hold_lock(path, acquired, seconds):
+    with FileLock(path):
+        acquired.set()
+        time.sleep(seconds)
+
+
+def test_file_lock_excludes_other_processes(tmp_path):
+    path = lock_path(str(tmp_path / 'fit_log_data.xlsx'))
+    acquired = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_lock, args=(path, acquired, 0.5))
+    holder.start()
+    assert acquired.wait(timeout=30)
+
+    started = time.perf_counter()
+    with FileLock(path):
+        waited = time.perf_counter() - started
+    holder.join()
+    assert waited > 0.3
+    assert os.path.exists(path)
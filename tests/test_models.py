@@ -0,0 +1,78 @@
+import threading
+
+from models import FitLogDB
+
+
+def totals(stats):
+    """get_user_stats without the user row (a Series)"""
+    return {key: value for key, value in stats.items() if key != 'user'}
+
+
+def test_stats_built_during_a_write_are_not_updated_twice(db, db_path):
+    user_id = db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+    building, appended = threading.Event(), threading.Event()
+    get_user_by_id, insert = db.get_user_by_id, db.backend.insert
+
+    def slow_get_user_by_id(user_id):
+        # the reader has checked the version and now reads the rows, after the writer has stored its row
+        building.set()
+        appended.wait(timeout=0.5)
+        return get_user_by_id(user_id)
+
+    def insert_then_wait(table, row):
+        # ...but before the writer updates the cached stats
+        new_id = insert(table, row)
+        appended.set()
+        reader.join(timeout=0.5)
+        return new_id
+
+    db.get_user_by_id = slow_get_user_by_id
+    db.backend.insert = insert_then_wait
+    reader = threading.Thread(target=db.get_user_stats, args=(user_id,))
+    reader.start()
+    assert building.wait(timeout=5)
+    assert db.add_activity(user_id, '2024-01-01', 'Running', '', 300.0, 30)
+    reader.join()
+    db.get_user_by_id, db.backend.insert = get_user_by_id, insert
+
+    stats = db.get_user_stats(user_id)
+    assert stats['total_activities'] == 1
+    assert stats['total_calories_burned'] == 300.0
+    assert totals(stats) == totals(FitLogDB(db_path).get_user_stats(user_id))
+
+
+def test_concurrent_reads_and_deletes_keep_stats_consistent(db, db_path):
+    user_ids = [db.add_user(f'user{i}', 70.0, 170.0, 30, 65.0) for i in range(4)]
+    rows = [
+        {'user_id': user_id, 'date': f'2024-01-{day:02d}', 'activity_name': 'Running', 'details': '',
+         'calories_burned': 100.0, 'duration_minutes': 10}
+        for user_id in user_ids for day in range(1, 11)
+    ]
+    activity_ids = db.add_activities(rows)
+    errors = []
+
+    def read():
+        try:
+            for _ in range(20):
+                for user_id in user_ids:
+                    db.get_user_stats(user_id)
+        except Exception as e:
+            errors.append(e)
+
+    def delete():
+        try:
+            for activity_id in activity_ids[::3]:
+                db.delete_activity(activity_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(3)] + [threading.Thread(target=delete)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    fresh = FitLogDB(db_path)
+    for user_id in user_ids:
+        assert totals(db.get_user_stats(user_id)) == totals(fresh.get_user_stats(user_id))
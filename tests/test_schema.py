@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from journal import apply_entries
+from schema import SchemaError, align, assign, compact_float, conform, plain, validate, widen
+
+
+def activities(**columns):
+    data = {
+        'activity_id': [1, 2],
+        'user_id': [1, 2],
+        'date': ['2024-01-01', '2024-01-02'],
+        'activity_name': ['Running', 'Yoga'],
+        'details': ['easy', ''],
+        'calories_burned': [300.5, 70.1],
+        'duration_minutes': [30, 45]
+    }
+    data.update(columns)
+    return pd.DataFrame(data)
+
+
+def test_conform_gives_compact_dtypes():
+    data = conform('Activities', activities())
+    assert data['activity_id'].dtype == np.int32
+    assert data['user_id'].dtype == np.int32
+    assert data['date'].dtype.kind == 'M'
+    assert isinstance(data['activity_name'].dtype, pd.CategoricalDtype)
+    assert data['calories_burned'].dtype == np.float32
+    assert data['duration_minutes'].dtype == np.int32
+    # already conformed frames are returned as they are
+    assert conform('Activities', data) is data
+
+
+def test_conform_falls_back_to_float_for_missing_or_out_of_range_integers():
+    data = conform('Activities', activities(duration_minutes=[30, None], user_id=[1, 2 ** 40]))
+    assert data['duration_minutes'].dtype == np.float64
+    assert data['user_id'].dtype == np.float64
+    assert data['user_id'].tolist() == [1, 2 ** 40]
+
+
+def test_conform_turns_unreadable_dates_into_nat():
+    data = conform('Activities', activities(date=['2024-01-01', 'yesterday']))
+    assert data['date'].isna().tolist() == [False, True]
+
+
+def test_conform_without_compaction_only_parses_dates():
+    data = conform('Activities', activities(), compact=False)
+    assert data['date'].dtype.kind == 'M'
+    assert data['activity_id'].dtype == np.int64
+    assert data['calories_burned'].dtype == np.float64
+    assert data['activity_name'].dtype == activities()['activity_name'].dtype
+
+
+@pytest.mark.parametrize('columns, message', [
+    ({'colour': ['red', 'blue']}, 'unknown column colour'),
+    ({'user_id': [1, None]}, 'user_id is missing'),
+    ({'date': ['2024-01-01', 'yesterday']}, "invalid date 'yesterday'"),
+    ({'calories_burned': [300.0, 'lots']}, "invalid calories_burned 'lots'"),
+    ({'duration_minutes': [30, 2.5]}, 'invalid duration_minutes 2.5'),
+    ({'duration_minutes': [30, 2 ** 40]}, f'invalid duration_minutes {2 ** 40}'),
+])
+def test_validate_rejects_bad_input(columns, message):
+    with pytest.raises(SchemaError, match=message):
+        validate('Activities', activities(**columns))
+
+
+def test_validate_requires_dates_on_new_rows():
+    with pytest.raises(SchemaError, match='date is missing'):
+        validate('Activities', activities(date=[None, '2024-01-02']), insert=True)
+    with pytest.raises(SchemaError, match='date is missing'):
+        validate('Weight_History', pd.DataFrame([{'user_id': 1, 'weight': 80.0}]), insert=True)
+    # rewriting a sheet that already holds undated rows is still allowed
+    validate('Activities', activities(date=[None, '2024-01-02']))
+    validate('Activities', activities().iloc[:0], insert=True)
+
+
+def test_validate_accepts_good_input():
+    validate('Activities', activities())
+    validate('Activities', conform('Activities', activities()))
+    # missing values are fine outside the id columns
+    validate('Activities', activities(calories_burned=[None, 70.1], date=[None, '2024-01-02']))
+
+
+def test_align_keeps_dtypes_across_concat():
+    data = conform('Activities', activities())
+    rows = pd.DataFrame([{
+        'activity_id': 3, 'user_id': 1, 'date': '2024-01-03', 'activity_name': 'Swimming',
+        'details': 'easy', 'calories_burned': 400.0, 'duration_minutes': 60
+    }])
+    data, rows = align(rows, data)
+    combined = pd.concat([data, rows], ignore_index=True)
+
+    assert combined.dtypes.to_dict() == data.dtypes.to_dict()
+    assert list(combined['activity_name'].cat.categories) == ['Running', 'Yoga', 'Swimming']
+    assert combined['date'].tolist()[-1] == pd.Timestamp('2024-01-03')
+
+
+def test_journal_inserts_and_updates_keep_dtypes():
+    data = conform('Activities', activities())
+    data = apply_entries(data, [
+        {'op': 'insert', 'table': 'Activities', 'row': {
+            'activity_id': 3, 'user_id': 1, 'date': '2024-01-03', 'activity_name': 'Swimming',
+            'details': 'easy', 'calories_burned': 400.0, 'duration_minutes': 60}},
+        {'op': 'update', 'table': 'Activities', 'column': 'activity_id', 'value': 1,
+         'changes': {'activity_name': 'Cycling', 'date': '2024-02-01', 'calories_burned': 123.4}},
+    ], 'activity_id')
+    expected = conform('Activities', activities()).dtypes
+    assert data['activity_id'].dtype == np.int32
+    assert data['calories_burned'].dtype == np.float32
+    assert data['date'].dtype == expected['date']
+    assert isinstance(data['activity_name'].dtype, pd.CategoricalDtype)
+    assert data['activity_name'].tolist() == ['Cycling', 'Yoga', 'Swimming']
+    assert data['date'].tolist()[0] == pd.Timestamp('2024-02-01')
+
+
+def test_assign_falls_back_to_object_for_values_the_column_cannot_hold():
+    data = conform('Activities', activities())
+    assign(data, data['activity_id'] == 1, 'duration_minutes', 'n/a')
+    assert data['duration_minutes'].tolist() == ['n/a', 45]
+
+
+def test_plain_writes_text_dates_and_shortest_floats():
+    data = plain(conform('Activities', activities()))
+    assert data['date'].tolist() == ['2024-01-01', '2024-01-02']
+    assert data['calories_burned'].tolist() == [300.5, 70.1]
+    assert data['calories_burned'].dtype == np.float64
+    assert data['activity_name'].dtype == object
+
+    users = plain(conform('Users', pd.DataFrame({'user_id': [1], 'created_date': ['2024-01-01 08:30:00']})))
+    assert users['created_date'].tolist() == ['2024-01-01 08:30:00']
+
+
+def test_widen_matches_plain_and_keeps_other_dtypes():
+    data = conform('Weight_History', pd.DataFrame({
+        'record_id': [1, 2, 3], 'user_id': [1, 1, 1], 'date': ['2024-01-01'] * 3,
+        'weight': [79.8, None, 79.8], 'notes': ['', '', '']
+    }))
+    widened = widen(data)
+    assert widened['weight'].dtype == np.float64
+    assert widened['weight'].tolist()[::2] == [79.8, 79.8]
+    assert widened['weight'].isna().tolist() == [False, True, False]
+    assert widened['date'].dtype == data['date'].dtype
+    assert compact_float(data['weight'].iloc[0]) == 79.8
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from models import FitLogDB
+from storage import WriteError
+
+
+def failing_journal(monkeypatch, backend):
+    def append(*entries):
+        raise OSError('disk full')
+    monkeypatch.setattr(backend.journal, 'append', append)
+
+
+def test_failed_batch_raises_and_keeps_nothing(workbook, monkeypatch):
+    db = FitLogDB(workbook)
+    user_id = db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+    assert db.get_user_stats(user_id)['current_weight'] == 80.0
+
+    failing_journal(monkeypatch, db.backend)
+    with pytest.raises(WriteError):
+        with db.batch():
+            assert db.add_weight_record(user_id, '2024-01-01', 79.0)
+            assert db.update_user(user_id, weight=79.0)
+    assert db._stats == {}
+    monkeypatch.undo()
+
+    for reader in (db, FitLogDB(workbook)):
+        stats = reader.get_user_stats(user_id)
+        assert stats['current_weight'] == 80.0
+        assert stats['initial_weight'] == 80.0
+        assert reader.count_weight_history(user_id) == 0
+    # ids reserved by the failed batch are handed out again
+    assert db.add_user('Somsri', 60.0, 160.0, 28, 55.0) == user_id + 1
+
+
+@pytest.mark.parametrize('form, url, message', [
+    ({'name': 'Somsri', 'weight': '60', 'height': '160', 'age': '28', 'target_weight': '55'},
+     '/add_user', 'เกิดข้อผิดพลาดในการเพิ่มผู้ใช้'),
+    ({'date': '2024-01-01', 'weight': '79'}, '/add_weight', 'เกิดข้อผิดพลาดในการบันทึกน้ำหนัก'),
+])
+def test_failed_batch_is_reported_to_the_user(workbook, serve, monkeypatch, form, url, message):
+    db = FitLogDB(workbook)
+    user_id = db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+    client = serve(db)
+    with client.session_transaction() as session:
+        session['current_user_id'] = user_id
+
+    failing_journal(monkeypatch, db.backend)
+    response = client.post(url, data=form, follow_redirects=True)
+    assert message in response.get_data(as_text=True)
+    assert len(db.get_all_users()) == 1
+    assert db.count_weight_history(user_id) == 0
+
+
+
+def test_memory_usage_counts_rows_still_in_the_journal(db):
+    user_id = db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+    db.add_weight_record(user_id, '2024-01-01', 79.8)
+    usage = db.memory_usage()
+    assert usage['Users']['rows'] == 1
+    assert usage['Weight_History']['rows'] == 1
+    assert usage['Weight_History']['dtypes']['weight'] == 'float32'
+
+
+def test_cached_memory_usage_counts_rows_still_in_the_journal(workbook):
+    db = FitLogDB(workbook)
+    db.preload()
+    db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+    assert db.memory_usage(cached_only=True)['Users']['rows'] == 1
+
+
+def test_backends_return_the_same_per_user_types(workbook, tmp_path):
+    backends = [FitLogDB(workbook), FitLogDB(str(tmp_path / 'fit_log.db'))]
+    for db in backends:
+        user_id = db.add_user('Somchai', 80.0, 175.0, 30, 70.0)
+        db.add_activity(user_id, '2024-01-02', 'Running', 'easy', 300.0, 30)
+        db.add_weight_record(user_id, '2024-01-01', 79.8, 'morning')
+
+    for table in ('Activities', 'Weight_History'):
+        rows = [
+            (db.backend.select(table, 'user_id', user_id),
+             db.backend.select_range(table, user_id, '2024-01-01', '2024-01-31')[0],
+             next(db.backend.iter_rows(table, 'user_id', user_id, order_by='date')))
+            for db in backends
+        ]
+        for excel_rows, sqlite_rows in zip(*rows):
+            assert excel_rows['date'].dtype.kind == sqlite_rows['date'].dtype.kind == 'M'
+            pd.testing.assert_frame_equal(excel_rows, sqlite_rows, check_dtype=False)
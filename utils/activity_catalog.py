@@ -0,0 +1,95 @@
+"""activity catalog: MET values from the Compendium of Physical Activities
+
+the catalog is loaded once at import time from utils/data/compendium.csv into an
+immutable table with an index of normalized names, so exact lookups are O(1)
+however many entries the file holds. names that are not in the index (typos,
+"Basket Ball", "bassketball") go through a fuzzy matcher whose results are cached
+"""
+import csv
+import difflib
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'data', 'compendium.csv')
+
+# minimum difflib similarity for a fuzzy match
+FUZZY_CUTOFF = 0.8
+
+Activity = namedtuple('Activity', ['key', 'met', 'category', 'code', 'description'])
+
+
+def normalize(name):
+    """canonical form of an activity name: 'Walking  Fast' -> 'walking_fast'"""
+    return re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_')
+
+
+class ActivityCatalog:
+    """read-only table of activities indexed by normalized key and description"""
+
+    def __init__(self, activities, cutoff=FUZZY_CUTOFF):
+        self.activities = tuple(activities)
+        self.cutoff = cutoff
+
+        index = {}
+        for activity in self.activities:
+            index[normalize(activity.key)] = activity
+        # descriptions are indexed too but never shadow a key
+        for activity in self.activities:
+            index.setdefault(normalize(activity.description), activity)
+        self._index = MappingProxyType(index)
+        self._names = tuple(index)
+
+        self.met_values = MappingProxyType({activity.key: activity.met for activity in self.activities})
+        # one cache per catalog, sized for the distinct names users actually type
+        self._fuzzy = lru_cache(maxsize=4096)(self._closest)
+
+    def __len__(self):
+        return len(self.activities)
+
+    def __iter__(self):
+        return iter(self.activities)
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def get(self, key):
+        """exact lookup by normalized name, None if missing"""
+        return self._index.get(normalize(key))
+
+    def find(self, name):
+        """the activity for name, falling back to the closest fuzzy match (None if nothing is close)"""
+        normalized = normalize(name)
+        activity = self._index.get(normalized)
+        if activity is None and normalized:
+            activity = self._fuzzy(normalized)
+        return activity
+
+    def met(self, name):
+        """MET value for name, raising KeyError for unknown activities"""
+        activity = self.find(name)
+        if activity is None:
+            raise KeyError(name)
+        return activity.met
+
+    def _closest(self, normalized):
+        matches = difflib.get_close_matches(normalized, self._names, n=1, cutoff=self.cutoff)
+        return self._index[matches[0]] if matches else None
+
+    def cache_info(self):
+        return self._fuzzy.cache_info()
+
+
+def load_catalog(path=CATALOG_PATH):
+    """ActivityCatalog from a CSV with code, key, met, category and description columns"""
+    with open(path, newline='', encoding='utf-8') as f:
+        activities = [
+            Activity(row['key'], float(row['met']), row['category'], row['code'], row['description'])
+            for row in csv.DictReader(f)
+        ]
+    return ActivityCatalog(activities)
+
+
+CATALOG = load_catalog()
@@ -0,0 +1,174 @@
+"""cohort analytics: leaderboards, streaks, BMI groups and weekly trends for all users
+
+everything is computed with vectorized pandas operations over whole sheets, so the
+cost is one pass over Users, Activities and Weight_History however many users there are
+"""
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from utils.batch_calculations import BMI_CATEGORIES, calculate_bmi, get_bmi_category
+
+LEADERBOARD_COLUMNS = ['user_id', 'name', 'calories_7d', 'activities_7d', 'avg_weekly_calories']
+STREAK_COLUMNS = ['user_id', 'name', 'current_streak', 'longest_streak', 'last_active']
+PROGRESS_COLUMNS = ['user_id', 'name', 'initial_weight', 'current_weight', 'target_weight', 'weight_progress']
+BMI_COLUMNS = ['bmi_category', 'users', 'avg_bmi', 'avg_weekly_calories', 'avg_weight_progress']
+TREND_COLUMNS = ['week', 'calories_burned', 'activities', 'active_users', 'avg_weight']
+
+
+def _days(values):
+    """dates (str / Timestamp) as datetime64 days, NaT for unparseable values"""
+    values = pd.Series(values)
+    # sheets are loaded with datetime64 dates (see schema.py), so there is nothing to parse
+    if pd.api.types.is_datetime64_dtype(values.dtype):
+        return values.dt.normalize()
+    return pd.to_datetime(values.astype(str).str[:10], errors='coerce')
+
+
+def _week_start(days):
+    return days - pd.to_timedelta(days.dt.weekday, unit='D')
+
+
+def _with_names(frame, users, columns):
+    names = users.set_index('user_id')['name']
+    return frame.assign(name=frame['user_id'].map(names))[columns].reset_index(drop=True)
+
+
+def initial_weights(users, weights):
+    """first recorded weight of each user (by date, then record_id), else the profile weight"""
+    first = pd.Series(dtype=float)
+    if not weights.empty:
+        ordered = weights.assign(day=_days(weights['date'])).sort_values(['day', 'record_id'])
+        first = ordered.drop_duplicates('user_id').set_index('user_id')['weight'].astype(float)
+    return users['user_id'].map(first).fillna(users['weight'].astype(float))
+
+
+def goal_progress(users, weights):
+    """progress towards target weight in percent, same rule as get_user_stats"""
+    initial = initial_weights(users, weights).to_numpy(dtype=float)
+    current = users['weight'].to_numpy(dtype=float)
+    target = users['target_weight'].to_numpy(dtype=float)
+    span = np.abs(target - initial)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        progress = np.abs(current - initial) / span * 100
+    valid = (current != 0) & (target != 0) & (span != 0)
+    progress = np.where(valid, np.clip(progress, 0, 100), 0.0)
+    return pd.DataFrame({
+        'user_id': users['user_id'].to_numpy(),
+        'initial_weight': initial,
+        'current_weight': current,
+        'target_weight': target,
+        'weight_progress': np.round(progress, 2)
+    })
+
+
+def streaks(activities, today):
+    """current and longest run of consecutive active days per user
+
+    the current streak still counts if the user has not been active yet today
+    """
+    days = pd.DataFrame({'user_id': activities['user_id'], 'day': _days(activities['date'])}).dropna()
+    days = days.drop_duplicates().sort_values(['user_id', 'day'])
+    if days.empty:
+        return pd.DataFrame(columns=['user_id', 'current_streak', 'longest_streak', 'last_active'])
+
+    # a new run starts when the user changes or the gap to the previous day is not one day
+    gap = days['day'].diff().dt.days
+    new_run = (days['user_id'] != days['user_id'].shift()) | (gap != 1)
+    runs = days.assign(run=new_run.cumsum()).groupby('run').agg(
+        user_id=('user_id', 'first'), end=('day', 'last'), length=('day', 'size'))
+
+    per_user = runs.groupby('user_id').agg(longest_streak=('length', 'max'), last_active=('end', 'max'))
+    latest = runs.loc[runs.groupby('user_id')['end'].idxmax()].set_index('user_id')
+    alive = latest['end'] >= pd.Timestamp(today - timedelta(days=1))
+    per_user['current_streak'] = latest['length'].where(alive, 0)
+    per_user['last_active'] = per_user['last_active'].dt.strftime('%Y-%m-%d')
+    return per_user.reset_index()
+
+
+def weekly_calories(activities):
+    """calories burned per user per week (index: user_id, columns: week start)
+
+    weeks in which a user logged nothing are NaN, so row means cover that user's active weeks only
+    """
+    data = activities.assign(week=_week_start(_days(activities['date'])))
+    return data.pivot_table(index='user_id', columns='week', values='calories_burned', aggfunc='sum')
+
+
+def weekly_trend(activities, weights, today, weeks):
+    """totals per week for the last `weeks` weeks, oldest first"""
+    this_week = pd.Timestamp(today) - pd.Timedelta(days=today.weekday())
+    index = pd.date_range(end=this_week, periods=weeks, freq='7D')
+
+    data = activities.assign(week=_week_start(_days(activities['date'])))
+    data = data[data['week'] >= index[0]]
+    totals = data.groupby('week').agg(
+        calories_burned=('calories_burned', 'sum'),
+        activities=('calories_burned', 'size'),
+        active_users=('user_id', 'nunique'))
+
+    logged = weights.assign(week=_week_start(_days(weights['date'])))
+    avg_weight = logged[logged['week'] >= index[0]].groupby('week')['weight'].mean()
+
+    trend = totals.reindex(index, fill_value=0).assign(avg_weight=avg_weight.reindex(index).round(2))
+    trend = trend.rename_axis('week').reset_index()
+    trend['week'] = trend['week'].dt.strftime('%Y-%m-%d')
+    return trend[TREND_COLUMNS]
+
+
+def cohort_report(users, activities, weights, today=None, weeks=12, top=10):
+    """every cohort metric for the dashboard as a dict of DataFrames"""
+    today = today or date.today()
+    # float32 columns are summed and averaged in float64
+    activities = activities.assign(
+        calories_burned=pd.to_numeric(activities['calories_burned'], errors='coerce').astype(float).fillna(0))
+    weights = weights.assign(weight=pd.to_numeric(weights['weight'], errors='coerce').astype(float)).dropna(subset=['weight'])
+    # rows of users that no longer exist do not belong to any cohort
+    activities = activities[activities['user_id'].isin(users['user_id'])]
+    weights = weights[weights['user_id'].isin(users['user_id'])]
+
+    report = {
+        'users': len(users),
+        'leaderboard': pd.DataFrame(columns=LEADERBOARD_COLUMNS),
+        'streaks': pd.DataFrame(columns=STREAK_COLUMNS),
+        'goal_progress': pd.DataFrame(columns=PROGRESS_COLUMNS),
+        'bmi_categories': pd.DataFrame(columns=BMI_COLUMNS),
+        'weekly_trend': weekly_trend(activities, weights, today, weeks)
+    }
+    if users.empty:
+        return report
+
+    # calories in the last 7 days (today included) and the average over each user's active weeks
+    days = _days(activities['date'])
+    recent = activities[days > pd.Timestamp(today - timedelta(days=7))]
+    per_week = weekly_calories(activities)
+    board = pd.DataFrame({'user_id': users['user_id'].to_numpy()})
+    board['calories_7d'] = board['user_id'].map(recent.groupby('user_id')['calories_burned'].sum()).fillna(0)
+    board['activities_7d'] = board['user_id'].map(recent.groupby('user_id').size()).fillna(0).astype(int)
+    board['avg_weekly_calories'] = board['user_id'].map(per_week.mean(axis=1)).fillna(0).round(2)
+    board = board.sort_values(['calories_7d', 'avg_weekly_calories'], ascending=False)
+    report['leaderboard'] = _with_names(board.head(top), users, LEADERBOARD_COLUMNS)
+
+    runs = streaks(activities, today)
+    if not runs.empty:
+        runs = runs.sort_values(['current_streak', 'longest_streak'], ascending=False)
+        report['streaks'] = _with_names(runs.head(top), users, STREAK_COLUMNS)
+
+    progress = goal_progress(users, weights)
+    report['goal_progress'] = _with_names(
+        progress.sort_values('weight_progress', ascending=False).head(top), users, PROGRESS_COLUMNS)
+
+    bmi = calculate_bmi(users['weight'], users['height'])
+    groups = pd.DataFrame({
+        'bmi_category': get_bmi_category(bmi),
+        'bmi': bmi,
+        'weekly_calories': board.set_index('user_id')['avg_weekly_calories'].reindex(users['user_id']).to_numpy(),
+        'weight_progress': progress['weight_progress'].to_numpy()
+    }).groupby('bmi_category').agg(
+        users=('bmi', 'size'),
+        avg_bmi=('bmi', 'mean'),
+        avg_weekly_calories=('weekly_calories', 'mean'),
+        avg_weight_progress=('weight_progress', 'mean'))
+    # keep the usual underweight -> obese order, skipping empty categories
+    groups = groups.reindex([category for category in BMI_CATEGORIES if category in groups.index])
+    report['bmi_categories'] = groups.round(2).rename_axis('bmi_category').reset_index()[BMI_COLUMNS]
+    return report
@@ -0,0 +1,128 @@
+"""vectorized versions of utils.calculations
+
+every function accepts scalars, lists, NumPy arrays or pandas Series and
+returns NumPy arrays with the same rounding as the scalar versions
+"""
+import numpy as np
+import pandas as pd
+from utils.activity_catalog import CATALOG
+from utils.calculations import ACTIVITY_MULTIPLIERS
+
+PROFILE_COLUMNS = ('weight', 'height', 'age')
+BMI_BINS = [18.5, 25, 30]
+BMI_CATEGORIES = np.array(["น้ำหนักน้อย", "น้ำหนักปกติ", "น้ำหนักเกิน", "อ้วน"], dtype=object)
+
+
+def _array(values, dtype=float):
+    return np.asarray(values, dtype=dtype)
+
+
+def _is_male(gender):
+    return np.asarray(gender, dtype=object) == 'male'
+
+
+def _lookup(table, keys):
+    """map keys to table values, raising KeyError for unknown keys like the scalar versions
+
+    table may also be a function, called once per distinct key
+    """
+    keys = pd.Series(np.atleast_1d(np.asarray(keys, dtype=object)))
+    if callable(table):
+        table = {key: _or_nan(table, key) for key in keys.unique()}
+    values = keys.map(table)
+    if values.isna().any():
+        raise KeyError(keys[values.isna()].iloc[0])
+    return values.to_numpy(dtype=float)
+
+
+def _or_nan(lookup, key):
+    try:
+        return lookup(key)
+    except KeyError:
+        return np.nan
+
+
+def calculate_bmi(weight, height):
+    """calculate BMI"""
+    weight, height = np.broadcast_arrays(_array(weight), _array(height))
+    height_m = height / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bmi = np.where(height > 0, weight / height_m**2, 0.0)
+    return np.round(bmi, 2)
+
+
+def get_bmi_category(bmi):
+    """categories of BMI (None where the BMI is missing)"""
+    bmi = _array(bmi)
+    categories = BMI_CATEGORIES[np.digitize(bmi, BMI_BINS)]
+    if np.ndim(bmi) == 0:
+        return None if np.isnan(bmi) else categories
+    categories[np.isnan(bmi)] = None
+    return categories
+
+
+def calculate_bmr(weight, height, age, gender='male'):
+    """calculate BMR"""
+    weight, height, age = _array(weight), _array(height), _array(age)
+    male = 88.362 + 13.397*weight + 4.799*height - 5.677*age
+    female = 447.593 + 9.247*weight + 3.098*height - 4.330*age
+    return np.round(np.where(_is_male(gender), male, female), 2)
+
+
+def calculate_tdee(bmr, activity_level='sedentary'):
+    """calculate TDEE"""
+    multipliers = _lookup(ACTIVITY_MULTIPLIERS, activity_level)
+    if np.ndim(activity_level) == 0:
+        multipliers = multipliers[0]
+    return np.round(_array(bmr) * multipliers, 2)
+
+
+def estimate_calories_burned(activity_type, duration_minutes, weight):
+    """estimate calories burned"""
+    met = _lookup(CATALOG.met, activity_type)
+    if np.ndim(activity_type) == 0:
+        met = met[0]
+    return np.round(met * 3.5 * _array(weight) * _array(duration_minutes) / 200, 2)
+
+
+def calculate_ideal_weight_range(height):
+    """calculate proper weight range as (min, max) arrays"""
+    height_m = _array(height) / 100
+    return np.round(18.5 * height_m**2, 1), np.round(24.9 * height_m**2, 1)
+
+
+def calculate_body_fat_percentage(bmi, age, gender='male'):
+    """estimate body fat percentage"""
+    bmi, age = _array(bmi), _array(age)
+    offset = np.where(_is_male(gender), 16.2, 5.4)
+    return np.maximum(0, np.round(1.2*bmi + 0.23*age - offset, 1))
+
+
+def invalid_rows(people, columns=PROFILE_COLUMNS):
+    """(row position, column) pairs whose value is missing, not a number or not finite"""
+    invalid = []
+    for column in columns:
+        values = pd.to_numeric(people[column], errors='coerce').to_numpy(dtype=float)
+        invalid += [(int(position), column) for position in np.flatnonzero(~np.isfinite(values))]
+    return sorted(invalid)
+
+
+def calculate_profiles(people):
+    """all calculator metrics for a DataFrame with weight, height, age
+    and optional gender / activity_level columns"""
+    gender = people['gender'].fillna('male') if 'gender' in people else 'male'
+    activity_level = people['activity_level'].fillna('sedentary') if 'activity_level' in people else 'sedentary'
+
+    bmi = calculate_bmi(people['weight'], people['height'])
+    bmr = calculate_bmr(people['weight'], people['height'], people['age'], gender)
+    ideal_min, ideal_max = calculate_ideal_weight_range(people['height'])
+
+    return pd.DataFrame({
+        'bmi': bmi,
+        'bmi_category': get_bmi_category(bmi),
+        'bmr': bmr,
+        'tdee': calculate_tdee(bmr, activity_level),
+        'ideal_weight_min': ideal_min,
+        'ideal_weight_max': ideal_max,
+        'body_fat': calculate_body_fat_percentage(bmi, people['age'], gender)
+    }, index=people.index)
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from utils.activity_catalog import CATALOG
+
 def calculate_bmi(weight, height):
     """calculate BMI"""
     bmi = 0
@@ -27,17 +30,17 @@ def calculate_bmr(weight, height, age, gender='male'):
         
     return round(bmr,2)
 
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'lightly_active': 1.375,
+    'moderately_active': 1.55,
+    'very_active': 1.725,
+    'extremely_active': 1.9
+}
+
 def calculate_tdee(bmr, activity_level='sedentary'):
     """calculate TDEE"""
-    multipliers = {
-        'sedentary': 1.2,
-        'lightly_active': 1.375,
-        'moderately_active': 1.55,
-        'very_active': 1.725,
-        'extremely_active': 1.9
-    }
-    
-    tdee = bmr * multipliers[activity_level]
+    tdee = bmr * ACTIVITY_MULTIPLIERS[activity_level]
     
     return round(tdee,2)
 
@@ -55,29 +58,11 @@ def calculate_daily_calories_for_goal(tdee, goal='maintain', rate=0.5):
     else:  # maintain
         return tdee
     
+MET_VALUES = CATALOG.met_values
+
 def estimate_calories_burned(activity_type, duration_minutes, weight):
     """estimate calories burned"""
-    met_values = {
-        'walking_slow': 2.0,
-        'walking_moderate': 5.0,
-        'walking_fast': 6.5,
-        'jogging': 8.0,
-        'running': 10.0,
-        'cycling_leisure': 3.5,
-        'cycling_moderate':  5.5,
-        'cycling_fast':  8.0,
-        'swimming': 7.0,
-        'weight_training':6.0,
-        'yoga': 2.5,
-        'aerobics': 6.5,
-        'bassketball': 8.0,
-        'soccer': 8.0,
-        'tennis': 4.0,
-        'badminton': 4.5,
-        'dancing': 6.0
-    }
-    
-    calories = (met_values[activity_type] * 3.5 * weight * duration_minutes)/200
+    calories = (CATALOG.met(activity_type) * 3.5 * weight * duration_minutes)/200
     
     return round(calories,2)
 
@@ -149,4 +134,22 @@ def get_activity_recommendations(bmi_category, goal):
         }
     }
     
-    return recommendations[bmi_category][goal]
\ No newline at end of file
+    return recommendations[bmi_category][goal]
+
+
+@lru_cache(maxsize=1024)
+def calculate_profile(weight, height, age, gender='male', activity_level='sedentary'):
+    """BMI, BMR, TDEE, ideal weight and body fat for one person
+
+    results are cached on the arguments, so treat the returned dict as read-only
+    """
+    bmi = calculate_bmi(weight, height)
+    bmr = calculate_bmr(weight, height, age, gender)
+    return {
+        'bmi': bmi,
+        'bmi_category': get_bmi_category(bmi),
+        'bmr': bmr,
+        'tdee': calculate_tdee(bmr, activity_level),
+        'ideal_weight': calculate_ideal_weight_range(height),
+        'body_fat': calculate_body_fat_percentage(bmi, age, gender)
+    }
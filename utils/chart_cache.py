@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import pandas as pd
+
+
+def data_version(data, columns, *extra):
+    """hash of the rows (and extra values) a chart is drawn from"""
+    digest = hashlib.sha1()
+    if not data.empty:
+        digest.update(pd.util.hash_pandas_object(data[columns], index=False).values.tobytes())
+    digest.update(repr(extra).encode())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """LRU cache of rendered charts, one entry per (kind, user_id), bounded by total bytes"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (version, image)
+        self._rendering = {}  # (key, version) -> Future of a render in progress
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """cached image for key if it was rendered from the same data version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, image):
+        """store image, evicting least recently used entries over the budget"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old[1])
+            if len(image) > self.max_bytes:
+                return
+            self._entries[key] = (version, image)
+            self.total_bytes += len(image)
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def get_or_render(self, key, version, render):
+        """cached image, or render() it once even when several threads ask for it at the same time"""
+        image = self.get(key, version)
+        if image is not None:
+            return image
+
+        with self._lock:
+            future = self._rendering.get((key, version))
+            owner = future is None
+            if owner:
+                future = self._rendering[(key, version)] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            image = render()
+            if image is not None:
+                self.put(key, version, image)
+            future.set_result(image)
+            return image
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._rendering[(key, version)]
+
+    def info(self):
+        """cache usage"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'rendering': len(self._rendering),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
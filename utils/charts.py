@@ -0,0 +1,207 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from types import SimpleNamespace
+import pandas as pd
+
+FIGSIZE = (12, 6)
+DPI = 100
+
+# the longest range (in days) that still gets one tick per day
+DAILY_TICKS_MAX_DAYS = 31
+
+_local = threading.local()
+
+
+def activity_series(activities):
+    """daily calories burned (dates, values) from activity rows"""
+    if activities.empty:
+        return [], []
+    daily_calories = (
+        activities.assign(date=pd.to_datetime(activities['date']))
+        .groupby('date')['calories_burned']
+        .sum()
+    )
+    return list(daily_calories.index), daily_calories.values.tolist()
+
+
+def rollup_series(daily):
+    """daily calories burned (dates, values) from a daily rollup (FitLogDB.get_daily_rollup)"""
+    if daily.empty:
+        return [], []
+    return list(pd.to_datetime(daily['date'])), daily['calories_burned'].astype(float).tolist()
+
+
+def weight_series(weight_history):
+    """weight over time (dates, values) from weight records, leaving out records without a date"""
+    if weight_history.empty:
+        return [], []
+    dates = pd.to_datetime(weight_history['date'], errors='coerce')
+    dated = dates.notna()
+    return list(dates[dated]), weight_history['weight'][dated].astype(float).tolist()
+
+
+# bucket sizes tried in order until a series fits into max_points
+BUCKETS = [('day', 'D'), ('week', 'W'), ('month', 'M'), ('year', 'Y')]
+
+
+def bucket_series(dates, values, how='sum', max_points=120):
+    """date-bucketed series for client-side charts
+
+    starts with one point per day and widens the bucket to week, month, then year
+    until the series has at most max_points points; how is 'sum' or 'mean'
+    """
+    if not dates:
+        return {'bucket': 'day', 'dates': [], 'values': []}
+    series = pd.Series(values, index=pd.DatetimeIndex(dates), dtype=float)
+    for bucket, period in BUCKETS:
+        grouped = series.groupby(series.index.to_period(period)).agg(how)
+        if len(grouped) <= max_points:
+            break
+    return {
+        'bucket': bucket,
+        'dates': [p.start_time.strftime('%Y-%m-%d') for p in grouped.index],
+        'values': [round(v, 2) for v in grouped.tolist()]
+    }
+
+
+@lru_cache(maxsize=None)
+def _matplotlib():
+    """matplotlib, imported on the first render so processes that never draw a chart skip its start-up cost"""
+    import matplotlib
+    import matplotlib.dates as mdates
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # rcParams are only read while rendering, so setting them once here is thread safe
+    matplotlib.rcParams['font.family'] = ['DejaVu Sans']
+    return SimpleNamespace(rcParams=matplotlib.rcParams, dates=mdates, FigureCanvasAgg=FigureCanvasAgg, Figure=Figure)
+
+
+def _figure():
+    """per-thread figure template, cleared and reused for every render"""
+    figure = getattr(_local, 'figure', None)
+    if figure is None:
+        mpl = _matplotlib()
+        figure = mpl.Figure(figsize=FIGSIZE, dpi=DPI)
+        mpl.FigureCanvasAgg(figure)
+        figure.add_subplot(111)
+        _local.figure = figure
+    ax = figure.axes[0]
+    ax.clear()
+    # tight_layout starts from the current subplot params, so reset them to keep renders independent
+    figure.subplots_adjust(**{
+        side: _matplotlib().rcParams[f'figure.subplot.{side}']
+        for side in ('left', 'right', 'bottom', 'top')
+    })
+    return figure, ax
+
+
+def _format_date_axis(ax, dates):
+    """one tick per day for short ranges, automatic ticks for long ones"""
+    mdates = _matplotlib().dates
+    if len(set(dates)) == 1:
+        ax.set_xticks([dates[0]])
+    elif (max(dates) - min(dates)).days <= DAILY_TICKS_MAX_DAYS:
+        ax.xaxis.set_major_locator(mdates.DayLocator())
+    else:
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def _to_png(figure):
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=DPI, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def render_activity_chart(dates, calories):
+    """line chart of daily calories burned as PNG bytes"""
+    if not dates:
+        return None
+    figure, ax = _figure()
+    ax.plot(dates, calories, marker='o', linewidth=2, markersize=6)
+    ax.set_xlabel('Date', fontsize=12)
+    ax.set_ylabel('Calories (kcal)', fontsize=12)
+    ax.grid(True, alpha=0.3)
+    _format_date_axis(ax, dates)
+    return _to_png(figure)
+
+
+def render_weight_chart(dates, weights, target_weight):
+    """line chart of weight against the target weight as PNG bytes"""
+    if not dates:
+        return None
+    figure, ax = _figure()
+    ax.plot(dates, weights, marker='o', linewidth=2, markersize=6, label='current weight')
+    if target_weight:
+        ax.axhline(y=target_weight, color='r', linestyle='--', linewidth=2, label=f'target ({target_weight} kg)')
+    ax.set_xlabel('Date', fontsize=12)
+    ax.set_ylabel('Weight (kg)', fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    _format_date_axis(ax, dates)
+    return _to_png(figure)
+
+
+RENDERERS = {
+    'activity': render_activity_chart,
+    'weight': render_weight_chart
+}
+
+
+def render_chart(kind, *args):
+    """render a chart by kind; module level so it can run in a worker process"""
+    return RENDERERS[kind](*args)
+
+
+def preload():
+    """import matplotlib and draw one throwaway chart in this thread (loads fonts and the Agg backend)"""
+    day = pd.Timestamp('2024-01-01')
+    render_activity_chart([day, day + pd.Timedelta(days=1)], [0.0, 1.0])
+
+
+def create_activity_chart(activities):
+    """daily calories chart from activity rows as PNG bytes"""
+    return render_activity_chart(*activity_series(activities))
+
+
+def create_weight_chart(weight_history, target_weight):
+    """weight chart from weight records as PNG bytes"""
+    return render_weight_chart(*weight_series(weight_history), target_weight)
+
+
+class ChartRenderer:
+    """renders charts in the calling thread, or in a process pool when processes > 0"""
+
+    def __init__(self, processes=0):
+        self.processes = processes
+        self._pool = None
+        if processes:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._pool = ProcessPoolExecutor(processes, mp_context=context)
+
+    def render(self, kind, *args):
+        """PNG bytes of the chart"""
+        if self._pool is None:
+            return render_chart(kind, *args)
+        return self._pool.submit(render_chart, kind, *args).result()
+
+    def preload(self):
+        """warm the renderer up: in this thread, or in every worker process of the pool"""
+        if self._pool is None:
+            preload()
+            return
+        # one task per process; tasks that land on an already warm process just redraw the dummy chart
+        for future in [self._pool.submit(preload) for _ in range(self.processes)]:
+            future.result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
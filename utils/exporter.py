@@ -0,0 +1,60 @@
+"""streaming CSV / JSON-lines encoders over chunks of rows"""
+import pandas as pd
+from schema import plain
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def stream_csv(chunks):
+    """CSV text per chunk, header only before the first one"""
+    header = True
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        yield chunk.to_csv(index=False, header=header)
+        header = False
+
+
+def stream_ndjson(chunks):
+    """one JSON object per line per row"""
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        yield chunk.to_json(orient='records', lines=True, force_ascii=False, date_format='iso').rstrip('\n') + '\n'
+
+
+def stream(fmt, chunks):
+    """encoder for fmt ('csv' or 'ndjson')
+
+    typed columns are written the way they are stored: text dates, 70.1 rather than 70.0999984741211
+    """
+    chunks = (plain(chunk) for chunk in chunks)
+    if fmt == 'csv':
+        return stream_csv(chunks)
+    return stream_ndjson(chunks)
+
+
+def stats_row(stats):
+    """flat row of get_user_stats output for export"""
+    user = stats['user']
+    row = {'user_id': int(user['user_id']), 'name': user['name']}
+    row.update({key: value for key, value in stats.items() if key != 'user'})
+    return row
+
+
+def stats_chunks(db, user_ids, chunksize=100):
+    """get_user_stats of each user as DataFrame chunks"""
+    rows = []
+    for user_id in user_ids:
+        stats = db.get_user_stats(user_id)
+        if stats is None:
+            continue
+        rows.append(stats_row(stats))
+        if len(rows) == chunksize:
+            yield pd.DataFrame(rows)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows)
@@ -0,0 +1,133 @@
+"""parse and validate bulk imports of activities and weight records"""
+import json
+import os
+import numpy as np
+import pandas as pd
+from utils.activity_catalog import CATALOG
+from utils.batch_calculations import estimate_calories_burned
+
+IMPORT_KINDS = ('activities', 'weights')
+
+
+def read_records(source, filename):
+    """DataFrame from a CSV, JSON array or JSON-lines file (path or file object)"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(source)
+    if extension in ('.jsonl', '.ndjson'):
+        return pd.read_json(source, lines=True)
+    if extension == '.json':
+        if hasattr(source, 'read'):
+            records = json.load(source)
+        else:
+            with open(source, encoding='utf-8') as f:
+                records = json.load(f)
+        if isinstance(records, dict):
+            records = records.get('records', [records])
+        return pd.DataFrame(records)
+    raise ValueError(f'unsupported file type: {extension or filename}')
+
+
+def _errors(data, mask, message):
+    return [(int(row) + 1, message) for row in data.index[mask]]
+
+
+def _common(data, users, default_user_id):
+    """validate user_id and date columns shared by both kinds of import"""
+    data = data.copy()
+    if 'user_id' not in data:
+        data['user_id'] = default_user_id
+    elif default_user_id is not None:
+        data['user_id'] = data['user_id'].fillna(default_user_id)
+
+    errors = []
+    user_id = pd.to_numeric(data['user_id'], errors='coerce')
+    bad_user = user_id.isna() | ~user_id.isin(list(users))
+    errors += _errors(data, bad_user, 'unknown user_id')
+
+    dates = pd.to_datetime(data['date'], errors='coerce') if 'date' in data else pd.Series(pd.NaT, index=data.index)
+    bad_date = dates.isna()
+    errors += _errors(data, bad_date & ~bad_user, 'invalid date')
+
+    data['user_id'] = user_id
+    data['date'] = dates.dt.strftime('%Y-%m-%d')
+    return data, bad_user | bad_date, errors
+
+
+def prepare_activities(data, users, default_user_id=None):
+    """validated activity rows and (row number, message) errors
+
+    users maps user_id to the weight used for rows without calories_burned
+    """
+    data, invalid, errors = _common(data, users, default_user_id)
+
+    for column in ('activity_name', 'details'):
+        if column not in data:
+            data[column] = ''
+        data[column] = data[column].fillna('').astype(str)
+    for column in ('calories_burned', 'duration_minutes'):
+        data[column] = pd.to_numeric(data[column], errors='coerce') if column in data else np.nan
+    data['duration_minutes'] = data['duration_minutes'].fillna(0)
+
+    bad_name = data['activity_name'].str.strip() == ''
+    errors += _errors(data, bad_name & ~invalid, 'missing activity_name')
+    invalid |= bad_name
+
+    # estimate missing calories from the activity catalog like the activity form does
+    activity_type = data['activity_name']
+    missing = data['calories_burned'].isna() & ~invalid
+    known = [name for name in activity_type[missing].unique() if name in CATALOG]
+    unknown = missing & ~activity_type.isin(known)
+    errors += _errors(data, unknown, 'missing calories_burned for unknown activity')
+    invalid |= unknown
+
+    estimate = missing & ~unknown
+    if estimate.any():
+        weights = data.loc[estimate, 'user_id'].map(users).astype(float)
+        data.loc[estimate, 'calories_burned'] = estimate_calories_burned(
+            activity_type[estimate], data.loc[estimate, 'duration_minutes'], weights
+        )
+
+    valid = data[~invalid]
+    rows = [
+        {
+            'user_id': int(row.user_id),
+            'date': row.date,
+            'activity_name': row.activity_name,
+            'details': row.details,
+            'calories_burned': float(row.calories_burned),
+            'duration_minutes': int(row.duration_minutes)
+        }
+        for row in valid.itertuples(index=False)
+    ]
+    return rows, sorted(errors)
+
+
+def prepare_weights(data, users, default_user_id=None):
+    """validated weight rows and (row number, message) errors"""
+    data, invalid, errors = _common(data, users, default_user_id)
+
+    data['weight'] = pd.to_numeric(data['weight'], errors='coerce') if 'weight' in data else np.nan
+    bad_weight = data['weight'].isna() | (data['weight'] <= 0)
+    errors += _errors(data, bad_weight & ~invalid, 'invalid weight')
+    invalid |= bad_weight
+
+    if 'notes' not in data:
+        data['notes'] = ''
+    data['notes'] = data['notes'].fillna('').astype(str)
+
+    valid = data[~invalid]
+    rows = [
+        {'user_id': int(row.user_id), 'date': row.date, 'weight': float(row.weight), 'notes': row.notes}
+        for row in valid.itertuples(index=False)
+    ]
+    return rows, sorted(errors)
+
+
+def prepare(kind, data, users, default_user_id=None):
+    """dispatch to prepare_activities / prepare_weights"""
+    if kind == 'activities':
+        return prepare_activities(data, users, default_user_id)
+    if kind == 'weights':
+        return prepare_weights(data, users, default_user_id)
+    raise ValueError(f'unknown import kind: {kind}')
@@ -0,0 +1,16 @@
+"""entry point สำหรับ WSGI server ที่ใช้งานจริง
+
+    gunicorn -w 4 -k gthread --threads 8 wsgi:app
+
+แต่ละ worker รับหลาย request พร้อมกันด้วย thread การ render กราฟที่ช้าจึงไม่บล็อก
+request อื่น (ตั้ง FITLOG_CHART_PROCESSES เพื่อ render ใน process แยก) การเขียนข้อมูล
+จากหลาย worker ปลอดภัยเพราะใช้ lock ไฟล์ร่วมกัน
+
+worker จะ warm-up (โหลด sheet เข้า cache, compile template, โหลด matplotlib) ก่อนเริ่มรับ
+request ตาม FITLOG_WARMUP และบันทึกเวลา startup ลง log กับ /metrics
+"""
+from app import app, startup
+
+startup()
+
+application = app